@@ -2,6 +2,9 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Run it with ``uvicorn backend.asgi:application`` and ``GRAPHQL_ASYNC=True`` to
+serve /graphql/ with the async view. WebSocket connections to /graphql/ are
+GraphQL subscriptions (``feed.consumers.GraphQLConsumer``).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +16,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from feed.consumers import GraphQLConsumer  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": django_application,
+    "websocket": URLRouter([path("graphql/", GraphQLConsumer.as_asgi())]),
+})
@@ -0,0 +1,181 @@
+"""
+Static cost and depth analysis for GraphQL operations.
+
+Runs on the validated document before execution, so a request such as
+``posts(first: 100000) { author { ... } }`` is rejected without touching a
+resolver. Each composite field costs 1 (override per field with
+``GRAPHQL_FIELD_COSTS = {"Query.posts": 2}``), scalars cost nothing, and the
+cost of a field's selection is multiplied by how many items it can return:
+
+* its ``first``/``last`` argument when given; on a Relay connection the
+  page size multiplies the ``edges`` selection rather than ``pageInfo``;
+* ``FEED_DEFAULT_PAGE_SIZE`` when a field that takes ``first`` is called
+  without it, since its resolver then returns a default page;
+* ``GRAPHQL_DEFAULT_LIST_SIZE`` for lists without a page limit (such as
+  ``CommentType.thread``): the most rows they are assumed to return.
+
+Limits come from ``GRAPHQL_MAX_DEPTH`` and ``GRAPHQL_MAX_COST``.
+"""
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNonNull,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    OperationType,
+    is_composite_type,
+)
+from graphql.execution.values import get_argument_values
+
+from feed.pagination import default_page_size
+
+
+def max_depth():
+    return getattr(settings, "GRAPHQL_MAX_DEPTH", 10)
+
+
+def max_cost():
+    return getattr(settings, "GRAPHQL_MAX_COST", 5000)
+
+
+def default_list_size():
+    return getattr(settings, "GRAPHQL_DEFAULT_LIST_SIZE", 1000)
+
+
+def field_costs():
+    return getattr(settings, "GRAPHQL_FIELD_COSTS", {})
+
+
+def _unwrap(type_):
+    is_list = False
+    while isinstance(type_, (GraphQLNonNull, GraphQLList)):
+        if isinstance(type_, GraphQLList):
+            is_list = True
+        type_ = type_.of_type
+    return type_, is_list
+
+
+class CostAnalysis:
+    def __init__(self, schema, document, variables=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            d.name.value: d for d in document.definitions if isinstance(d, FragmentDefinitionNode)
+        }
+        self.costs = field_costs()
+
+    def root_type(self, operation):
+        return {
+            OperationType.QUERY: self.schema.query_type,
+            OperationType.MUTATION: self.schema.mutation_type,
+            OperationType.SUBSCRIPTION: self.schema.subscription_type,
+        }[operation.operation]
+
+    def page_size(self, field_def, node):
+        try:
+            args = get_argument_values(field_def, node, self.variables)
+        except GraphQLError:
+            args = {}
+        for name in ("first", "last"):
+            if isinstance(args.get(name), int):
+                return max(args[name], 0)
+        if "first" in field_def.args:
+            return default_page_size()
+        return None
+
+    def fields(self, parent_type, selection_set):
+        """Yield the field nodes of ``selection_set`` with the type they are selected on."""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                type_ = parent_type
+                if selection.type_condition is not None:
+                    type_ = self.schema.get_type(selection.type_condition.name.value)
+                yield from self.fields(type_, selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is not None:
+                    type_ = self.schema.get_type(fragment.type_condition.name.value)
+                    yield from self.fields(type_, fragment.selection_set)
+
+    def selection(self, parent_type, selection_set, depth, edges=None):
+        """
+        Return ``(cost, depth)`` of a selection set nested ``depth`` levels
+        deep; ``edges`` is the page size of the enclosing connection.
+        """
+        total, deepest = 0, depth
+        for type_, node in self.fields(parent_type, selection_set):
+            name = node.name.value
+            if name.startswith("__"):
+                # introspection is bounded by the schema itself
+                continue
+            field_def = getattr(type_, "fields", {}).get(name)
+            if field_def is None:
+                continue
+            named, is_list = _unwrap(field_def.type)
+            field_depth = depth + 1
+            if not is_composite_type(named) or node.selection_set is None:
+                deepest = max(deepest, field_depth)
+                total += self.costs.get(f"{type_.name}.{name}", 0)
+                continue
+            size = self.page_size(field_def, node)
+            if name == "edges" and edges is not None:
+                size = edges
+            elif size is None and is_list:
+                size = default_list_size()
+            if "edges" in getattr(named, "fields", {}):
+                child_cost, child_depth = self.selection(named, node.selection_set, field_depth, size)
+                size = 1
+            else:
+                child_cost, child_depth = self.selection(named, node.selection_set, field_depth)
+            total += self.costs.get(f"{type_.name}.{name}", 1)
+            total += (1 if size is None else size) * child_cost
+            deepest = max(deepest, child_depth)
+        return total, deepest
+
+    def run(self, operation):
+        return self.selection(self.root_type(operation), operation.selection_set, 0)
+
+
+def get_operation(document, operation_name=None):
+    operations = [d for d in document.definitions if isinstance(d, OperationDefinitionNode)]
+    if operation_name:
+        operations = [o for o in operations if o.name and o.name.value == operation_name]
+    return operations[0] if len(operations) == 1 else None
+
+
+def analyze(schema, document, operation_name=None, variables=None):
+    """Return ``{"requested": cost, "depth": depth}`` for the operation, or ``None``."""
+    operation = get_operation(document, operation_name)
+    if operation is None:
+        return None
+    cost, depth = CostAnalysis(schema, document, variables).run(operation)
+    return {"requested": cost, "depth": depth}
+
+
+def check(schema, document, operation_name=None, variables=None):
+    """
+    Analyze the operation and return ``(extension, errors)``: the cost report
+    for ``extensions.cost`` and any limit violations as ``GraphQLError``s.
+    """
+    report = analyze(schema, document, operation_name, variables)
+    if report is None:
+        return None, []
+    report.update({"maximum": max_cost(), "maxDepth": max_depth()})
+    errors = []
+    if report["depth"] > max_depth():
+        errors.append(GraphQLError(
+            f"Query depth {report['depth']} exceeds the maximum of {max_depth()}",
+            extensions={"code": "QUERY_TOO_DEEP", "cost": report},
+        ))
+    if report["requested"] > max_cost():
+        errors.append(GraphQLError(
+            f"Query cost {report['requested']} exceeds the maximum of {max_cost()}",
+            extensions={"code": "QUERY_TOO_COMPLEX", "cost": report},
+        ))
+    return report, errors
@@ -0,0 +1,77 @@
+"""
+Routing between the primary database and read replicas.
+
+Replicas come from ``DATABASE_REPLICA_URLS`` and are registered by
+``settings`` as ``replica0``, ``replica1``... (``DATABASE_REPLICAS``).
+
+Reads go to a replica only inside ``replica_reads``, which the GraphQL views
+enter for query operations; one replica is picked per request so a response
+never mixes two replication positions. Mutations, subscriptions, the admin
+and management commands stay on the primary.
+
+After a mutation its user is pinned to the primary for
+``DATABASE_REPLICA_PIN_SECONDS``, so they read their own writes despite
+replication lag. Pins are kept in the ``DATABASE_REPLICA_PIN_CACHE`` Django
+cache, which has to be shared (e.g. Redis) for the pin to hold across workers.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pin_seconds():
+    return getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10)
+
+
+def _pins():
+    return caches[getattr(settings, "DATABASE_REPLICA_PIN_CACHE", "default")]
+
+
+def _pin_key(user):
+    return f"db:primary-pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    """Send ``user``'s reads to the primary for the next ``pin_seconds()``."""
+    if replicas() and user is not None and user.is_authenticated:
+        _pins().set(_pin_key(user), True, pin_seconds())
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and bool(_pins().get(_pin_key(user)))
+
+
+@contextmanager
+def replica_reads(user=None):
+    """Route the reads made in this block to one replica, unless ``user`` is pinned."""
+    aliases = replicas()
+    alias = random.choice(aliases) if aliases and not is_pinned(user) else None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
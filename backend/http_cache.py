@@ -0,0 +1,174 @@
+"""
+HTTP caching of GraphQL queries sent with GET.
+
+A query sent with GET by an anonymous client is cacheable when every root
+field it selects is listed in ``ROOT_FIELDS`` with the data versions it reads
+(``feed.cache.data_changed`` bumps them after mutations). Its response gets:
+
+* an ``ETag``: the SHA-256 of the body, which only changes with the data;
+* ``Cache-Control``: ``GRAPHQL_CACHE_CONTROL[operation name]``, or
+  ``GRAPHQL_CACHE_CONTROL_DEFAULT``, which has shared caches revalidate
+  every time;
+* ``Vary: Authorization, Cookie``, since a signed-in client is not served
+  from the cache.
+
+The ETag is remembered in the feed cache backend under the request URL and
+the versions read before executing, plus ``feed.cache.ALL_VERSION``, which
+``feed.cache.everything_changed`` bumps when all the data may have changed.
+A request whose ``If-None-Match`` matches it gets a ``304 Not Modified``
+without any resolver running; after a mutation the versions differ, the
+lookup misses and the query executes.
+Entries live for ``GRAPHQL_ETAG_TTL`` seconds. ``GRAPHQL_HTTP_CACHE = False``
+turns this off.
+
+Versions must be shared by every worker, or one that did not see a mutation
+would keep answering 304 for data it changed. So ETags are only sent when
+the backend is ``shared`` (``feed.cache.RedisCacheBackend``); with the
+in-process default, every query is treated as not cacheable.
+
+Other GET responses are sent with ``Cache-Control: private, no-store``.
+"""
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from graphql import FieldNode, OperationType
+from graphql.utilities import value_from_ast_untyped
+from graphql_jwt.utils import get_credentials
+
+from feed import cache as feed_cache
+from feed.tracing import tracing_header
+
+
+def _feed(args):
+    return [feed_cache.FEED_VERSION]
+
+
+def _post(args):
+    # the post and the counters of its author and commenters
+    return [feed_cache.post_version(args.get("postId")), feed_cache.USERS_VERSION]
+
+
+# root field -> function of its arguments returning the versions it reads
+ROOT_FIELDS = {
+    "__typename": lambda args: [],
+    "posts": _feed,
+    "postsConnection": _feed,
+    "trendingPosts": _feed,
+    "searchPosts": _feed,
+    "post": _post,
+}
+
+
+def enabled():
+    return getattr(settings, "GRAPHQL_HTTP_CACHE", True) and feed_cache.get_cache_backend().shared
+
+
+def etag_ttl():
+    return getattr(settings, "GRAPHQL_ETAG_TTL", 300)
+
+
+def cache_control(operation_name):
+    overrides = getattr(settings, "GRAPHQL_CACHE_CONTROL", {})
+    if operation_name in overrides:
+        return overrides[operation_name]
+    return getattr(settings, "GRAPHQL_CACHE_CONTROL_DEFAULT", "public, max-age=0, must-revalidate")
+
+
+class Policy:
+    __slots__ = ("key", "cache_control")
+
+    def __init__(self, key, cache_control):
+        self.key = key
+        self.cache_control = cache_control
+
+
+class NotModified(Exception):
+    """Raised before execution when the client's copy of the response is current."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+def _versions_read(operation_ast, variables):
+    names = []
+    for selection in operation_ast.selection_set.selections:
+        if not isinstance(selection, FieldNode) or selection.name.value not in ROOT_FIELDS:
+            return None
+        args = {arg.name.value: value_from_ast_untyped(arg.value, variables) for arg in selection.arguments}
+        names.extend(ROOT_FIELDS[selection.name.value](args))
+    return names
+
+
+def _anonymous(request):
+    user = getattr(request, "user", None)
+    return get_credentials(request) is None and not (user is not None and user.is_authenticated)
+
+
+def policy(request, operation_ast, variables):
+    """The ``Policy`` of a request, or ``None`` when its response must not be cached."""
+    if (
+        not enabled()
+        or request.method != "GET"
+        or operation_ast is None
+        or operation_ast.operation != OperationType.QUERY
+        # a trace differs on every request
+        or request.headers.get(tracing_header())
+        or not _anonymous(request)
+    ):
+        return None
+    names = _versions_read(operation_ast, variables or {})
+    if names is None:
+        return None
+    names.append(feed_cache.ALL_VERSION)
+    versions = ".".join(str(version) for version in feed_cache.data_versions(names))
+    key = "etag:" + hashlib.sha256(f"{request.get_full_path()}|{versions}".encode()).hexdigest()
+    name = operation_ast.name.value if operation_ast.name else None
+    return Policy(key, cache_control(name))
+
+
+def _matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # compression turns the ETag weak
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in parse_etags(header)}
+
+
+def _tag(response, etag, policy):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = policy.cache_control
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
+
+
+def check(request, operation_ast, variables):
+    """
+    Attach the request's ``Policy`` as ``request.http_cache`` and raise
+    ``NotModified`` if the client sent the ETag of the current response.
+    """
+    request.http_cache = policy(request, operation_ast, variables)
+    if request.http_cache is None:
+        return
+    etag = feed_cache.get_cache_backend().get_many([request.http_cache.key]).get(request.http_cache.key)
+    if etag is not None and _matches(request, etag):
+        raise NotModified(_tag(HttpResponseNotModified(), etag, request.http_cache))
+
+
+def finish(request, response):
+    """Tag the response of ``request``; returns a 304 if the client already has the body."""
+    policy = getattr(request, "http_cache", None)
+    if policy is None or response.status_code != 200:
+        if request.method == "GET" and not response.has_header("Cache-Control"):
+            response.headers["Cache-Control"] = "private, no-store"
+        return response
+    etag = '"{}"'.format(hashlib.sha256(response.content).hexdigest())
+    feed_cache.get_cache_backend().set_many({policy.key: etag}, etag_ttl())
+    if _matches(request, etag):
+        return _tag(HttpResponseNotModified(), etag, policy)
+    return _tag(response, etag, policy)
@@ -0,0 +1,42 @@
+"""
+Response compression.
+
+``CompressionMiddleware`` is Django's ``GZipMiddleware`` that prefers Brotli
+when the client accepts ``br`` and the optional ``brotli`` package is
+installed. GraphQL responses are repetitive JSON and shrink several times
+either way.
+"""
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    min_length = 200
+
+    def process_response(self, request, response):
+        accepts_brotli = re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if brotli is None or not accepts_brotli or response.streaming:
+            return super().process_response(request, response)
+        if response.has_header("Content-Encoding") or len(response.content) < self.min_length:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(response.content))
+        # the body is no longer the one the strong ETag was computed from
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
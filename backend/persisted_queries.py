@@ -0,0 +1,195 @@
+"""
+Automatic persisted queries and a parsed-document cache for ``/graphql/``.
+
+Clients following the Apollo APQ protocol send
+``extensions.persistedQuery.sha256Hash`` instead of the query text; the text
+is registered the first time it is sent alongside its hash. Independently of
+APQ, every query string is parsed and validated once per process and the
+resulting ``DocumentNode`` is reused from an LRU keyed by its SHA-256.
+
+Settings:
+
+* ``GRAPHQL_DOCUMENT_CACHE_SIZE``: documents kept per process;
+* ``GRAPHQL_PERSISTED_QUERY_BACKEND``: ``backend.persisted_queries.MemoryQueryStore``
+  or ``backend.persisted_queries.RedisQueryStore`` to share registrations;
+* ``GRAPHQL_PERSISTED_QUERIES_ALLOWLIST``: optional JSON file mapping hashes to
+  query text, loaded at startup;
+* ``GRAPHQL_PERSISTED_QUERIES_STRICT``: only execute allow-listed queries.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from graphql import GraphQLError, parse, validate
+
+NOT_FOUND = "PersistedQueryNotFound"
+NOT_ALLOWED = "PersistedQueryNotAllowed"
+
+
+def sha256(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class LRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MemoryQueryStore:
+    """Per-process hash -> query text registry."""
+
+    def __init__(self):
+        self._queries = LRU(getattr(settings, "GRAPHQL_PERSISTED_QUERY_MAX_ENTRIES", 10000))
+
+    def get(self, query_hash):
+        return self._queries.get(query_hash)
+
+    def set(self, query_hash, query):
+        self._queries.set(query_hash, query)
+
+    def clear(self):
+        self._queries.clear()
+
+
+class RedisQueryStore:
+    """Hash -> query text registry shared by every worker through Redis."""
+
+    prefix = "apq:"
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.ttl = getattr(settings, "GRAPHQL_PERSISTED_QUERY_TTL", 7 * 24 * 3600)
+
+    def get(self, query_hash):
+        value = self.client.get(self.prefix + query_hash)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, query_hash, query):
+        self.client.set(self.prefix + query_hash, query, ex=self.ttl)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_query_store():
+    return _load_store(getattr(settings, "GRAPHQL_PERSISTED_QUERY_BACKEND", "backend.persisted_queries.MemoryQueryStore"))
+
+
+@lru_cache(maxsize=None)
+def _load_allowlist(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        entries = json.load(f)
+    for query_hash, query in entries.items():
+        if sha256(query) != query_hash:
+            raise ValueError(f"Allow-list entry {query_hash} does not match its query text")
+    return entries
+
+
+def get_allowlist():
+    return _load_allowlist(getattr(settings, "GRAPHQL_PERSISTED_QUERIES_ALLOWLIST", None))
+
+
+def strict():
+    return getattr(settings, "GRAPHQL_PERSISTED_QUERIES_STRICT", False)
+
+
+def _error(message, code):
+    return GraphQLError(message, extensions={"code": code})
+
+
+def resolve_query(query, extensions):
+    """
+    Return ``(query, query_hash)`` for a request, resolving persisted-query
+    hashes to their text. Raises ``GraphQLError`` for unknown or disallowed
+    queries; ``query`` is ``None`` when there was nothing to resolve.
+    """
+    persisted = (extensions or {}).get("persistedQuery") if isinstance(extensions, dict) else None
+    query_hash = persisted.get("sha256Hash") if isinstance(persisted, dict) else None
+    allowlist = get_allowlist()
+
+    if query_hash is None:
+        if not query:
+            return None, None
+        query_hash = sha256(query)
+        if strict() and query_hash not in allowlist:
+            raise _error(NOT_ALLOWED, "PERSISTED_QUERY_NOT_ALLOWED")
+        return query, query_hash
+
+    if strict() and query_hash not in allowlist:
+        raise _error(NOT_ALLOWED, "PERSISTED_QUERY_NOT_ALLOWED")
+    if query:
+        if sha256(query) != query_hash:
+            raise _error("provided sha does not match query", "INVALID_PERSISTED_QUERY")
+        if query_hash not in allowlist:
+            get_query_store().set(query_hash, query)
+        return query, query_hash
+    query = allowlist.get(query_hash) or get_query_store().get(query_hash)
+    if query is None:
+        raise _error(NOT_FOUND, "PERSISTED_QUERY_NOT_FOUND")
+    return query, query_hash
+
+
+_documents = None
+
+
+def _document_cache():
+    global _documents
+    if _documents is None:
+        _documents = LRU(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 1000))
+    return _documents
+
+
+def get_document(schema, query, query_hash, validation_rules=None, max_errors=None):
+    """
+    Return ``(document, errors)`` for ``query``, parsing and validating it only
+    the first time its hash is seen in this process. Syntax errors are raised.
+    """
+    cache = _document_cache()
+    key = (id(schema), query_hash, tuple(validation_rules or ()))
+    entry = cache.get(key)
+    if entry is None:
+        document = parse(query)
+        errors = validate(schema, document, validation_rules, max_errors)
+        entry = (document, errors)
+        cache.set(key, entry)
+    return entry
+
+
+def clear():
+    _document_cache().clear()
+    get_query_store().clear()
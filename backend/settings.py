@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware", 
     "django.middleware.security.SecurityMiddleware",
+    # gzip, or Brotli when the optional `brotli` package is installed
+    "backend.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -68,6 +70,21 @@ DATABASES = {
     "default": env.db()  # Reads DATABASE_URL from .env
 }
 
+# Read replicas (comma-separated URLs), used by GraphQL queries; see backend/db_router.py
+DATABASE_REPLICAS = []
+for index, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[])):
+    DATABASES[f"replica{index}"] = {**env.db_url_config(url), "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{index}")
+DATABASE_ROUTERS = ["backend.db_router.ReplicaRouter"]
+# Seconds a user reads from the primary after a mutation, and the (shared) cache holding those pins
+DATABASE_REPLICA_PIN_SECONDS = env.int("DATABASE_REPLICA_PIN_SECONDS", default=10)
+DATABASE_REPLICA_PIN_CACHE = env("DATABASE_REPLICA_PIN_CACHE", default="default")
+
+# Persistent connections, checked before reuse; run PgBouncer to pool across workers
+for database in DATABASES.values():
+    database["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", default=60)
+    database["CONN_HEALTH_CHECKS"] = env.bool("DATABASE_CONN_HEALTH_CHECKS", default=True)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -102,6 +119,30 @@ else:  # Local development
 STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 
+# Media files: an S3 (or MinIO, with AWS_S3_ENDPOINT_URL) bucket when one is configured, MEDIA_ROOT otherwise
+AWS_STORAGE_BUCKET_NAME = env("AWS_STORAGE_BUCKET_NAME", default=None)
+if AWS_STORAGE_BUCKET_NAME:
+    AWS_S3_ENDPOINT_URL = env("AWS_S3_ENDPOINT_URL", default=None)
+    AWS_S3_REGION_NAME = env("AWS_S3_REGION_NAME", default=None)
+    AWS_S3_CUSTOM_DOMAIN = env("AWS_S3_CUSTOM_DOMAIN", default=None)
+    # media URLs are stored, so they must not expire
+    AWS_QUERYSTRING_AUTH = env.bool("AWS_QUERYSTRING_AUTH", default=False)
+    STORAGES = {
+        "default": {"BACKEND": "storages.backends.s3.S3Storage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+
+# Direct media uploads (see feed/media.py)
+FEED_MEDIA_UPLOADER = env(
+    "FEED_MEDIA_UPLOADER", default="feed.media.S3Uploader" if AWS_STORAGE_BUCKET_NAME else "feed.media.LocalUploader"
+)
+FEED_MEDIA_UPLOAD_EXPIRES = env.int("FEED_MEDIA_UPLOAD_EXPIRES", default=900)
+FEED_MEDIA_MAX_UPLOAD_BYTES = env.int("FEED_MEDIA_MAX_UPLOAD_BYTES", default=20 * 1024 * 1024)
+# Media left PROCESSING this long (seconds) are queued again by `manage.py requeue_media`
+FEED_MEDIA_STALE_AFTER = env.int("FEED_MEDIA_STALE_AFTER", default=600)
+# Variant name -> longest side in pixels
+FEED_MEDIA_VARIANTS = {"thumbnail": 320, "medium": 1080}
+
 # Optional: add staticfiles dirs (for local dev)
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),  # your project static folder
@@ -116,15 +157,111 @@ GRAPHENE = {
     "SCHEMA": "backend.schema.schema",
     "MIDDLEWARE": [
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        "feed.loaders.LoaderMiddleware",
+        # last, so its timings include the middleware above
+        "feed.tracing.TracingMiddleware",
     ],
     'GRAPHQL_GRAPHQL': True, 
 }
 
+# Requests with this header get their trace in extensions.tracing (DEBUG or staff only)
+GRAPHQL_TRACING_HEADER = env("GRAPHQL_TRACING_HEADER", default="X-GraphQL-Trace")
+# HTTP caching of anonymous GET queries (see backend/http_cache.py); needs a
+# shared FEED_CACHE_BACKEND such as feed.cache.RedisCacheBackend
+GRAPHQL_HTTP_CACHE = env.bool("GRAPHQL_HTTP_CACHE", default=True)
+GRAPHQL_ETAG_TTL = env.int("GRAPHQL_ETAG_TTL", default=300)
+GRAPHQL_CACHE_CONTROL_DEFAULT = env("GRAPHQL_CACHE_CONTROL_DEFAULT", default="public, max-age=0, must-revalidate")
+# Cache-Control per operation name, e.g. {"TrendingPosts": "public, max-age=30"}
+GRAPHQL_CACHE_CONTROL = env.json("GRAPHQL_CACHE_CONTROL", default={})
+# Operation names labelled in /metrics/ besides allow-listed persisted queries
+GRAPHQL_METRICS_OPERATIONS = env.list("GRAPHQL_METRICS_OPERATIONS", default=[])
+# When set, /metrics/ requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = env("METRICS_TOKEN", default=None)
+
+# Feed pagination
+FEED_DEFAULT_PAGE_SIZE = env.int("FEED_DEFAULT_PAGE_SIZE", default=20)
+FEED_MAX_PAGE_SIZE = env.int("FEED_MAX_PAGE_SIZE", default=100)
+FEED_BULK_MAX_ITEMS = env.int("FEED_BULK_MAX_ITEMS", default=100)
+
+# Threaded comments: replies deeper than this are attached to their parent's parent
+FEED_COMMENT_MAX_DEPTH = env.int("FEED_COMMENT_MAX_DEPTH", default=8)
+
+# Home timelines (fan-out on write, fan-out on read for celebrity accounts)
+FEED_TIMELINE_BACKEND = env("FEED_TIMELINE_BACKEND", default="feed.timeline.DatabaseTimelineStore")
+FEED_TIMELINE_MAX_LENGTH = env.int("FEED_TIMELINE_MAX_LENGTH", default=800)
+FEED_CELEBRITY_THRESHOLD = env.int("FEED_CELEBRITY_THRESHOLD", default=10000)
+
+# Feed page/post cache
+FEED_CACHE_ENABLED = env.bool("FEED_CACHE_ENABLED", default=True)
+FEED_CACHE_BACKEND = env("FEED_CACHE_BACKEND", default="feed.cache.LRUCacheBackend")
+FEED_CACHE_TTL = env.int("FEED_CACHE_TTL", default=30)
+FEED_CACHE_MAX_ENTRIES = env.int("FEED_CACHE_MAX_ENTRIES", default=10000)
+
+# Trending ("hot") ranking; the in-process store is per worker, use
+# feed.trending.RedisTrendingStore with more than one process
+FEED_TRENDING_BACKEND = env("FEED_TRENDING_BACKEND", default="feed.trending.MemoryTrendingStore")
+FEED_TRENDING_SIZE = env.int("FEED_TRENDING_SIZE", default=1000)
+FEED_TRENDING_HALF_LIFE = env.float("FEED_TRENDING_HALF_LIFE", default=6 * 3600)
+FEED_TRENDING_REBASE_INTERVAL = env.float("FEED_TRENDING_REBASE_INTERVAL", default=3600)
+FEED_TRENDING_WEIGHTS = {"likes_count": 1.0, "comments_count": 2.0, "shares_count": 3.0}
+
+# Monthly post/comment partitions on PostgreSQL (manage.py manage_partitions); feed pages
+# read the last FEED_PARTITION_PRUNE_DAYS first so only the newest partitions are scanned
+FEED_PARTITION_AHEAD_MONTHS = env.int("FEED_PARTITION_AHEAD_MONTHS", default=3)
+FEED_PARTITION_RETAIN_MONTHS = env.int("FEED_PARTITION_RETAIN_MONTHS", default=0)
+FEED_PARTITION_ARCHIVE_SCHEMA = env("FEED_PARTITION_ARCHIVE_SCHEMA", default="feed_archive")
+FEED_PARTITION_PRUNE_DAYS = env.int(
+    "FEED_PARTITION_PRUNE_DAYS", default=31 if DATABASES["default"]["ENGINE"].endswith("postgresql") else 0
+)
+
+# Full-text search; unset picks feed.search.PostgresSearchBackend on PostgreSQL
+# and feed.search.MemorySearchBackend otherwise
+FEED_SEARCH_BACKEND = env("FEED_SEARCH_BACKEND", default=None)
+
+# Buffered like/comment/share/post counters
+FEED_COUNTER_BACKEND = env("FEED_COUNTER_BACKEND", default="feed.counters.DatabaseCounterBackend")
+FEED_COUNTER_FLUSH_INTERVAL = env.float("FEED_COUNTER_FLUSH_INTERVAL", default=5)
+FEED_COUNTER_EXACT_READS = env.bool("FEED_COUNTER_EXACT_READS", default=True)
+
+# Background jobs for the side effects of mutations; with the Redis queue run
+# `manage.py run_jobs --loop` next to the web workers
+FEED_JOBS_BACKEND = env("FEED_JOBS_BACKEND", default="feed.jobs.MemoryJobQueue")
+FEED_JOBS_EAGER = env.bool("FEED_JOBS_EAGER", default=False)
+FEED_JOBS_WORKER_THREAD = env.bool("FEED_JOBS_WORKER_THREAD", default=True)
+FEED_JOBS_BATCH_SIZE = env.int("FEED_JOBS_BATCH_SIZE", default=500)
+FEED_JOBS_MAX_ATTEMPTS = env.int("FEED_JOBS_MAX_ATTEMPTS", default=5)
+FEED_JOBS_RETRY_DELAY = env.float("FEED_JOBS_RETRY_DELAY", default=1)
+FEED_JOBS_POLL_INTERVAL = env.float("FEED_JOBS_POLL_INTERVAL", default=0.5)
+
+# GraphQL document cache and automatic persisted queries
+GRAPHQL_DOCUMENT_CACHE_SIZE = env.int("GRAPHQL_DOCUMENT_CACHE_SIZE", default=1000)
+GRAPHQL_PERSISTED_QUERY_BACKEND = env(
+    "GRAPHQL_PERSISTED_QUERY_BACKEND", default="backend.persisted_queries.MemoryQueryStore"
+)
+GRAPHQL_PERSISTED_QUERIES_ALLOWLIST = env("GRAPHQL_PERSISTED_QUERIES_ALLOWLIST", default=None)
+GRAPHQL_PERSISTED_QUERIES_STRICT = env.bool("GRAPHQL_PERSISTED_QUERIES_STRICT", default=False)
+
+# Serve /graphql/ with the async view (run under an ASGI server, see docker-compose.yml)
+GRAPHQL_ASYNC = env.bool("GRAPHQL_ASYNC", default=False)
+# Operations allowed in one batched request (a JSON array body)
+GRAPHQL_BATCH_MAX_OPERATIONS = env.int("GRAPHQL_BATCH_MAX_OPERATIONS", default=20)
+
+# Static query cost analysis; per-field overrides as {"Type.field": cost}
+GRAPHQL_MAX_DEPTH = env.int("GRAPHQL_MAX_DEPTH", default=10)
+GRAPHQL_MAX_COST = env.int("GRAPHQL_MAX_COST", default=5000)
+GRAPHQL_DEFAULT_LIST_SIZE = env.int("GRAPHQL_DEFAULT_LIST_SIZE", default=1000)
+GRAPHQL_FIELD_COSTS = {}
+
 AUTHENTICATION_BACKENDS = [
-    "graphql_jwt.backends.JSONWebTokenBackend",
+    "feed.auth.CachedJSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
 ]
 
+# Verified JWTs, cached per token (see feed.auth); 0 disables the cache
+FEED_AUTH_CACHE_BACKEND = env("FEED_AUTH_CACHE_BACKEND", default="feed.auth.MemoryTokenCache")
+FEED_AUTH_CACHE_TTL = env.int("FEED_AUTH_CACHE_TTL", default=60)
+FEED_AUTH_CACHE_MAX_ENTRIES = env.int("FEED_AUTH_CACHE_MAX_ENTRIES", default=10000)
+
 # Custom user model
 AUTH_USER_MODEL = "feed.User"
 
@@ -142,5 +279,8 @@ CHANNEL_LAYERS = {
     }
 }
 
+# GraphQL subscriptions: minimum seconds between two postCountersChanged pushes
+FEED_SUBSCRIPTION_COUNTER_INTERVAL = env.float("FEED_SUBSCRIPTION_COUNTER_INTERVAL", default=1)
+
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
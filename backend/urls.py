@@ -14,16 +14,22 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
-from .views import welcome_page
+from django.conf.urls.static import static
+from feed.views import metrics, upload
+from .views import AsyncFeedGraphQLView, FeedGraphQLView, welcome_page
+
+GraphQLView = AsyncFeedGraphQLView if settings.GRAPHQL_ASYNC else FeedGraphQLView
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", welcome_page, name="welcome"),
     path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path("metrics/", metrics, name="metrics"),
+    path("uploads/<str:token>/", upload, name="media_upload"),
 
-]
\ No newline at end of file
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,4 +1,453 @@
+import asyncio
+import inspect
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, validate_schema
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+from graphql_jwt.utils import get_http_authorization
+
+from feed import tracing
+from feed.loaders import LoaderRegistry
+
+from . import cost, db_router, http_cache, persisted_queries
+
 
 def welcome_page(request):
     return render(request, "welcome.html")
+
+
+def batch_max_operations():
+    return getattr(settings, "GRAPHQL_BATCH_MAX_OPERATIONS", 20)
+
+
+class RequestFinished(Exception):
+    """Raised while preparing a request that ends before execution."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+class FeedGraphQLView(GraphQLView):
+    """
+    GraphQLView that gives every request its own set of DataLoaders,
+    resolves persisted queries against a cache of parsed, validated documents
+    and rejects operations over the depth and cost limits before executing
+    them. The cost report is returned in ``extensions.cost``.
+
+    Queries read from a replica when ``DATABASE_REPLICA_URLS`` is set, and
+    mutations pin their user to the primary (see ``backend.db_router``).
+    Every request is traced (see ``feed.tracing``), and anonymous GET queries
+    get ETags and conditional responses (see ``backend.http_cache``).
+
+    A JSON body may also be an array of up to ``GRAPHQL_BATCH_MAX_OPERATIONS``
+    operations. They run in order on the same request, so they authenticate
+    once and share DataLoaders (until a mutation writes), and the response is
+    the array of their results, each with its own ``errors``, ``id`` and
+    ``status``.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        except http_cache.NotModified as e:
+            return e.response
+        return http_cache.finish(request, response)
+
+    def get_context(self, request, asynchronous=False):
+        loaders = getattr(request, "loaders", None)
+        # the operations of a batch share their loaders
+        if not getattr(request, "graphql_batch", False) or loaders is None or loaders.asynchronous != asynchronous:
+            request.loaders = LoaderRegistry(asynchronous=asynchronous)
+        return request
+
+    def parse_body(self, request):
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+        if isinstance(data, list):
+            if not data:
+                raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+            if len(data) > batch_max_operations():
+                raise HttpError(
+                    HttpResponseBadRequest(f"At most {batch_max_operations()} operations are allowed per batch.")
+                )
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest("Every operation of a batch must be a JSON object."))
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return data
+
+    @staticmethod
+    def get_extensions(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions
+
+    def prepare_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Resolve, parse, validate and cost-check a request. Returns
+        ``(document, operation_ast, extensions)``, or raises ``RequestFinished``
+        with the result to send when the request ends before execution.
+        """
+        try:
+            query, query_hash = persisted_queries.resolve_query(query, self.get_extensions(request, data))
+        except GraphQLError as e:
+            raise RequestFinished(ExecutionResult(data=None, errors=[e]))
+        if query_hash in persisted_queries.get_allowlist():
+            tracing.mark_allowlisted()
+
+        if not query:
+            if show_graphiql:
+                raise RequestFinished(None)
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            raise RequestFinished(ExecutionResult(data=None, errors=schema_validation_errors))
+
+        try:
+            document, validation_errors = persisted_queries.get_document(
+                schema, query, query_hash, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+            )
+        except Exception as e:
+            raise RequestFinished(ExecutionResult(errors=[e]))
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                raise RequestFinished(None)
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            raise RequestFinished(ExecutionResult(data=None, errors=validation_errors))
+
+        report, cost_errors = cost.check(schema, document, operation_name, variables)
+        extensions = {"cost": report} if report is not None else None
+        if cost_errors:
+            raise RequestFinished(ExecutionResult(data=None, errors=cost_errors, extensions=extensions))
+
+        return document, operation_ast, extensions
+
+    def get_execute_options(self, request, variables, operation_name, asynchronous=False):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request, asynchronous),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    @staticmethod
+    def replica_reads(request):
+        """Route a query's reads to a replica unless its user has just written."""
+        user = getattr(request, "user", None)
+        if db_router.replicas() and not (user and user.is_authenticated) and get_http_authorization(request):
+            # resolve the JWT user up front (on the primary) so their pin applies
+            try:
+                user = authenticate(request=request)
+            except JSONWebTokenError:
+                # the JWT middleware reports it during execution
+                user = None
+            if user is not None:
+                request.user = user
+        return db_router.replica_reads(getattr(request, "user", None))
+
+    def execute_document(self, request, document, operation_ast, variables, operation_name, extensions):
+        schema = self.schema.graphql_schema
+        operation = operation_ast.operation if operation_ast is not None else None
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if operation == OperationType.QUERY:
+                with self.replica_reads(request):
+                    result = execute(schema, document, **execute_options)
+            elif (
+                operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+        if operation == OperationType.MUTATION:
+            db_router.pin_to_primary(getattr(request, "user", None))
+            # later operations of a batch must not read what the loaders cached before the write
+            request.loaders = None
+        result.extensions = extensions
+        return result
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        with tracing.trace_request(request) as trace:
+            try:
+                with trace.phase("prepare"):
+                    document, operation_ast, extensions = self.prepare_request(
+                        request, data, query, variables, operation_name, show_graphiql
+                    )
+                    if not show_graphiql:
+                        http_cache.check(request, operation_ast, variables)
+            except RequestFinished as e:
+                return trace.finish(request, e.result)
+            except http_cache.NotModified:
+                trace.finish(request, None, operation_ast)
+                raise
+            with trace.phase("execute"):
+                result = self.execute_document(
+                    request, document, operation_ast, variables, operation_name, extensions
+                )
+            return trace.finish(request, result, operation_ast)
+
+    def get_response(self, request, data, show_graphiql=False):
+        if isinstance(data, list):
+            request.graphql_batch = True
+            return self.batch_response(request, [self.get_entry_response(request, entry) for entry in data])
+
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def get_entry_response(self, request, entry):
+        """``get_response`` for one operation of a batch, with request errors reported in its result."""
+        try:
+            return self.get_response(request, entry)
+        except HttpError as e:
+            return self.entry_error(request, entry, e)
+
+    def entry_error(self, request, entry, error):
+        status_code = error.response.status_code
+        response = {"errors": [self.format_error(error)], "id": entry.get("id"), "status": status_code}
+        return self.json_encode(request, response), status_code
+
+    @staticmethod
+    def batch_response(request, responses):
+        result = "[{}]".format(",".join(response[0] for response in responses))
+        return result, max(status_code for _, status_code in responses)
+
+    def build_response(self, request, execution_result, id=None, show_graphiql=False):
+        # the tail of GraphQLView.get_response, plus the result's extensions
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch or getattr(request, "graphql_batch", False):
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+
+class AsyncFeedGraphQLView(FeedGraphQLView):
+    """
+    FeedGraphQLView for ASGI servers, enabled with ``GRAPHQL_ASYNC``.
+
+    Queries execute on the event loop: root fields read through the async ORM
+    and nested fields batch through async DataLoaders, so a request waiting on
+    the database does not hold a worker thread. Mutations keep their
+    transactional semantics by running on Django's ORM thread.
+
+    In a batch, consecutive queries execute concurrently and their DataLoaders
+    batch across operations; a mutation waits for the operations before it
+    and the ones after it wait for the mutation.
+    """
+
+    view_is_async = True
+
+    def get_middleware(self, request):
+        # `authenticate` resolves the user up front; the JWT middleware would
+        # otherwise query the database from the event loop
+        return [m for m in super().get_middleware(request) if not isinstance(m, JSONWebTokenMiddleware)]
+
+    @staticmethod
+    async def authenticate(request):
+        if get_http_authorization(request) is not None:
+            user = await sync_to_async(authenticate)(request=request)
+        elif hasattr(request, "auser"):
+            user = await request.auser()
+        else:
+            user = None
+        request.user = user or AnonymousUser()
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                # rendering the GraphiQL page never touches the database
+                return GraphQLView.dispatch(self, request, *args, **kwargs)
+
+            try:
+                await self.authenticate(request)
+            except JSONWebTokenError as e:
+                result, status_code = self.build_response(request, ExecutionResult(errors=[GraphQLError(str(e))]))
+                return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+            if isinstance(data, list):
+                result, status_code = await self.aget_batch_response(request, data)
+            else:
+                try:
+                    result, status_code = await self.aget_response(request, data)
+                except http_cache.NotModified as e:
+                    return e.response
+
+            response = HttpResponse(status=status_code, content=result, content_type="application/json")
+            return await sync_to_async(http_cache.finish)(request, response)
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    def is_mutation(self, request, entry):
+        """Whether a batch entry writes; one that cannot be parsed fails on its own, like a query."""
+        try:
+            query, _, operation_name, _ = self.get_graphql_params(request, entry)
+            query, query_hash = persisted_queries.resolve_query(query, self.get_extensions(request, entry))
+            document, _ = persisted_queries.get_document(
+                self.schema.graphql_schema, query, query_hash, self.validation_rules,
+                graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+        except Exception:
+            return False
+        operation_ast = get_operation_ast(document, operation_name)
+        return operation_ast is not None and operation_ast.operation != OperationType.QUERY
+
+    async def aget_batch_response(self, request, data):
+        request.graphql_batch = True
+        responses, queries = [], []
+        for entry in data:
+            if not self.is_mutation(request, entry):
+                queries.append(entry)
+                continue
+            responses.extend(await asyncio.gather(*[self.aget_entry_response(request, query) for query in queries]))
+            queries = []
+            responses.append(await self.aget_entry_response(request, entry))
+        responses.extend(await asyncio.gather(*[self.aget_entry_response(request, query) for query in queries]))
+        return self.batch_response(request, responses)
+
+    async def aget_entry_response(self, request, entry):
+        try:
+            return await self.aget_response(request, entry)
+        except HttpError as e:
+            return self.entry_error(request, entry, e)
+
+    async def aget_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = await self.aexecute_graphql_request(request, data, query, variables, operation_name)
+        return self.build_response(request, execution_result, id)
+
+    async def aexecute_graphql_request(self, request, data, query, variables, operation_name):
+        with tracing.trace_request(request) as trace:
+            try:
+                with trace.phase("prepare"):
+                    document, operation_ast, extensions = self.prepare_request(
+                        request, data, query, variables, operation_name
+                    )
+                    await sync_to_async(http_cache.check)(request, operation_ast, variables)
+            except RequestFinished as e:
+                return trace.finish(request, e.result)
+            except http_cache.NotModified:
+                trace.finish(request, None, operation_ast)
+                raise
+            with trace.phase("execute"):
+                result = await self.aexecute_document(
+                    request, document, operation_ast, variables, operation_name, extensions
+                )
+            return trace.finish(request, result, operation_ast)
+
+    async def aexecute_document(self, request, document, operation_ast, variables, operation_name, extensions):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return await sync_to_async(self.execute_document)(
+                request, document, operation_ast, variables, operation_name, extensions
+            )
+
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name, asynchronous=True)
+            # `dispatch` has already authenticated the request
+            with db_router.replica_reads(request.user):
+                result = execute(self.schema.graphql_schema, document, **execute_options)
+                if inspect.isawaitable(result):
+                    result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+        result.extensions = extensions
+        return result
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FeedConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'feed'
+
+    def ready(self):
+        # connect the signals that revoke cached tokens and instrument connections,
+        # and register the background job handlers
+        from . import auth, counters, media, search, timeline, tracing  # noqa: F401
@@ -0,0 +1,149 @@
+"""
+JWT authentication with a cache of verified tokens.
+
+``CachedJSONWebTokenBackend`` replaces ``graphql_jwt``'s backend. The first
+request with a token decodes and verifies it and loads the user as usual; the
+result is cached under the token's SHA-256 as a snapshot of
+``SNAPSHOT_FIELDS``. Repeat requests with the same token skip both the
+signature check and the user query and get a ``User`` built from the
+snapshot whose other fields are deferred: reading one of them (``bio``,
+``followers_count``...) loads it from the database on first access.
+
+Entries live for ``FEED_AUTH_CACHE_TTL`` seconds, never past the token's
+``exp``. Saving or deleting a user bumps their generation, which every
+entry records, so a deactivated user or a changed password stops matching
+the cached tokens at once. With the default in-process cache that only holds
+in the worker that saved the user; other workers notice within the TTL.
+``feed.auth.RedisTokenCache`` shares entries and generations between
+workers (``FEED_AUTH_CACHE_BACKEND``). ``FEED_AUTH_CACHE_TTL = 0`` turns the
+cache off.
+
+The time spent authenticating, and whether the cache answered, is recorded
+on the request as ``auth_span``.
+"""
+import hashlib
+import logging
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_credentials, get_payload, get_user_by_payload
+
+from .cache import LRUCacheBackend, RedisCacheBackend
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ("id", "username", "email", "is_active", "is_staff", "is_superuser")
+
+
+def cache_ttl():
+    return getattr(settings, "FEED_AUTH_CACHE_TTL", 60)
+
+
+class MemoryTokenCache(LRUCacheBackend):
+    def __init__(self, max_entries=None):
+        super().__init__(max_entries or getattr(settings, "FEED_AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+class RedisTokenCache(RedisCacheBackend):
+    prefix = "authcache:"
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_token_cache():
+    return _load_backend(getattr(settings, "FEED_AUTH_CACHE_BACKEND", "feed.auth.MemoryTokenCache"))
+
+
+def _token_key(token):
+    return "token:" + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _generation_name(user_id):
+    return f"user:{user_id}"
+
+
+def revoke_tokens(user):
+    """Drop every cached token of ``user``; their next request is verified in full."""
+    get_token_cache().bump_versions([_generation_name(user.pk)])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _user_changed(sender, instance, created=False, **kwargs):
+    # counters are kept with queryset updates, so saves are rare: profile
+    # edits, password changes, (de)activation
+    if not created:
+        transaction.on_commit(lambda: revoke_tokens(instance))
+
+
+def snapshot_user(snapshot):
+    """A ``User`` holding only the snapshot's fields; the others load on access."""
+    model = get_user_model()
+    # from_db takes the loaded values in field order
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in SNAPSHOT_FIELDS]
+    return model.from_db(None, names, [snapshot[name] for name in names])
+
+
+def _entry_ttl(payload):
+    ttl = cache_ttl()
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        leeway = jwt_settings.JWT_LEEWAY
+        leeway = leeway.total_seconds() if hasattr(leeway, "total_seconds") else leeway
+        ttl = min(ttl, int(exp + leeway - time.time()))
+    return ttl
+
+
+class CachedJSONWebTokenBackend(JSONWebTokenBackend):
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, "_jwt_token_auth", False):
+            return None
+
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+
+        started = time.perf_counter()
+        outcome = "off"
+        try:
+            if cache_ttl() <= 0:
+                return super().authenticate(request, **kwargs)
+            user, outcome = self.authenticate_token(token)
+            return user
+        finally:
+            request.auth_span = {"cache": outcome, "duration": time.perf_counter() - started}
+            logger.debug("JWT authentication (cache %s) took %.2f ms", outcome, request.auth_span["duration"] * 1000)
+
+    def authenticate_token(self, token):
+        """Return ``(user, "hit" | "miss")``; raises ``JSONWebTokenError`` like graphql_jwt."""
+        store = get_token_cache()
+        key = _token_key(token)
+        entry = store.get_many([key]).get(key)
+        if entry is not None:
+            [generation] = store.get_versions([_generation_name(entry["id"])])
+            if generation == entry["generation"]:
+                return snapshot_user(entry), "hit"
+
+        payload = get_payload(token)
+        user = get_user_by_payload(payload)
+        if user is None:
+            return None, "miss"
+
+        [generation] = store.get_versions([_generation_name(user.pk)])
+        ttl = _entry_ttl(payload)
+        if ttl > 0:
+            entry = {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+            entry["generation"] = generation
+            store.set_many({key: entry}, ttl)
+        return user, "miss"
@@ -0,0 +1,256 @@
+"""
+Load and latency benchmarks for the GraphQL API.
+
+``seed`` fills the database with a synthetic dataset (users, posts, likes,
+comments, follows) drawn from a seeded RNG, so two runs with the same sizes
+and seed build the same graph. ``run`` executes the canonical operations
+(``OPERATIONS``) against ``backend.schema.schema`` with the configured
+GraphQL middleware and reports, per operation, p50/p95/p99 latency,
+throughput and SQL queries per execution.
+
+Every operation has a query budget: the most SQL statements one execution
+may run. A resolver that starts querying per row (an N+1) blows through it,
+so ``manage.py benchmark`` exits with an error and
+``feed/tests/test_benchmark.py`` fails. Budgets are independent of the
+dataset size; raise one only together with the change that needs it.
+
+``manage.py benchmark`` runs in a throwaway test database, on SQLite or on
+the PostgreSQL server of ``DATABASE_URL``.
+"""
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import count, cycle
+
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+
+from backend.schema import schema
+
+from .loaders import LoaderRegistry
+from .models import Comment, Follow, Post, PostLike, User
+
+FEED_PAGE = """
+query FeedPage($after: String) {
+  postsConnection(first: 20, after: $after) {
+    edges { node { id content likesCount commentsCount viewerHasLiked author { id username } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+SINGLE_POST = """
+query SinglePost($postId: ID!) {
+  post(postId: $postId) {
+    id content likesCount commentsCount viewerHasLiked author { id username }
+    comments(first: 10) { edges { node { id content author { username } } } }
+  }
+}
+"""
+
+LIKE = "mutation Like($postId: ID!) { likePost(postId: $postId) { ok likesCount } }"
+
+UNLIKE = "mutation Unlike($postId: ID!) { unlikePost(postId: $postId) { ok likesCount } }"
+
+COMMENT = """
+mutation Comment($postId: ID!, $content: String!) {
+  createComment(postId: $postId, content: $content) { comment { id content author { username } } }
+}
+"""
+
+
+@dataclass
+class Dataset:
+    users: list
+    post_ids: list
+    hot_post_id: str
+
+
+def seed(users=50, posts=500, likes=2000, comments=1000, follows=500, rng_seed=0):
+    """Create a synthetic dataset and return its ``Dataset``."""
+    rng = random.Random(rng_seed)
+    people = User.objects.bulk_create([
+        User(email=f"bench{i}@example.com", username=f"bench{i}", name=f"Bench {i}", password="!")
+        for i in range(users)
+    ])
+    rows = Post.objects.bulk_create([
+        Post(author=rng.choice(people), content=f"Benchmark post {i}") for i in range(posts)
+    ])
+
+    # a few posts draw most of the likes, as in a real feed
+    weights = [1 / (rank + 1) for rank in range(len(rows))]
+    pairs = set()
+    for _ in range(likes):
+        pairs.add((rng.choices(rows, weights)[0], rng.choice(people)))
+    PostLike.objects.bulk_create([PostLike(post=post, user=user) for post, user in pairs])
+    Comment.objects.bulk_create([
+        Comment(post=rng.choices(rows, weights)[0], author=rng.choice(people), content=f"Benchmark comment {i}")
+        for i in range(comments)
+    ])
+    edges = {tuple(rng.sample(people, 2)) for _ in range(follows)} if users > 1 else set()
+    Follow.objects.bulk_create([Follow(follower=a, followee=b) for a, b in edges])
+
+    like_counts = Counter(post.pk for post, _ in pairs)
+    comment_counts = Counter(Comment.objects.values_list("post_id", flat=True))
+    for post in rows:
+        post.likes_count = like_counts[post.pk]
+        post.comments_count = comment_counts[post.pk]
+    Post.objects.bulk_update(rows, ["likes_count", "comments_count"], batch_size=500)
+    posts_counts = Counter(post.author_id for post in rows)
+    followers = Counter(b.pk for _, b in edges)
+    following = Counter(a.pk for a, _ in edges)
+    for user in people:
+        user.posts_count = posts_counts[user.pk]
+        user.followers_count = followers[user.pk]
+        user.following_count = following[user.pk]
+    User.objects.bulk_update(people, ["posts_count", "followers_count", "following_count"], batch_size=500)
+
+    return Dataset(users=people, post_ids=[post.pk for post in rows], hot_post_id=rows[0].pk)
+
+
+def feed_page(data):
+    viewers = cycle(data.users)
+    return lambda: (FEED_PAGE, {}, next(viewers))
+
+
+def single_post(data):
+    viewers, posts = cycle(data.users), cycle(data.post_ids)
+    return lambda: (SINGLE_POST, {"postId": next(posts)}, next(viewers))
+
+
+def like_storm(data):
+    """Every user likes the hot post, then every user unlikes it, and so on."""
+    users, liked = cycle(data.users), set(
+        PostLike.objects.filter(post_id=data.hot_post_id).values_list("user_id", flat=True)
+    )
+
+    def next_request():
+        user = next(users)
+        query = UNLIKE if user.pk in liked else LIKE
+        liked.symmetric_difference_update({user.pk})
+        return query, {"postId": data.hot_post_id}, user
+    return next_request
+
+
+def comment_burst(data):
+    users, numbers = cycle(data.users), count()
+    return lambda: (COMMENT, {"postId": data.hot_post_id, "content": f"Burst {next(numbers)}"}, next(users))
+
+
+def deep_pagination(data):
+    """Walks ``postsConnection`` to its last page and starts over."""
+    viewers, state = cycle(data.users), {"after": None}
+
+    def next_request():
+        return FEED_PAGE, {"after": state["after"]}, next(viewers)
+
+    def on_result(result):
+        page = result.data["postsConnection"]["pageInfo"]
+        state["after"] = page["endCursor"] if page["hasNextPage"] else None
+
+    next_request.on_result = on_result
+    return next_request
+
+
+# name, query budget per execution, and a factory of ``() -> (query, variables, user)``
+OPERATIONS = [
+    ("feed_page", 4, feed_page),
+    ("single_post", 6, single_post),
+    ("like_storm", 6, like_storm),
+    ("comment_burst", 6, comment_burst),
+    ("deep_pagination", 4, deep_pagination),
+]
+
+
+@dataclass
+class Result:
+    name: str
+    budget: int
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)
+
+    def percentile(self, p):
+        """Nearest-rank percentile of the latencies, in milliseconds."""
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return 0.0
+        rank = max(1, math.ceil(p * len(ordered) / 100))
+        return ordered[rank - 1] * 1000
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def max_queries(self):
+        return max(self.queries, default=0)
+
+    @property
+    def over_budget(self):
+        return self.max_queries > self.budget
+
+    @property
+    def failed(self):
+        return self.over_budget or bool(self.errors)
+
+    def row(self):
+        return {
+            "operation": self.name,
+            "runs": len(self.latencies),
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "ops_per_s": round(self.throughput, 1),
+            "queries_avg": round(sum(self.queries) / len(self.queries), 1) if self.queries else 0,
+            "queries_max": self.max_queries,
+            "budget": self.budget,
+            "errors": len(self.errors),
+        }
+
+
+def execute(query, variables, user):
+    request = RequestFactory().post("/graphql/")
+    request.user = user
+    request.loaders = LoaderRegistry()
+    return schema.execute(
+        query,
+        variables=variables,
+        context_value=request,
+        middleware=list(instantiate_middleware(graphene_settings.MIDDLEWARE)),
+    )
+
+
+def run_operation(name, budget, next_request, iterations):
+    result = Result(name, budget)
+    on_result = getattr(next_request, "on_result", None)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        query, variables, user = next_request()
+        with CaptureQueriesContext(connection) as captured:
+            began = time.perf_counter()
+            outcome = execute(query, variables, user)
+            result.latencies.append(time.perf_counter() - began)
+        result.queries.append(len(captured))
+        if outcome.errors:
+            result.errors.extend(str(error) for error in outcome.errors)
+        elif on_result is not None:
+            on_result(outcome)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def run(data, iterations=100, operations=None):
+    """Run each of ``OPERATIONS`` (or the named ``operations``) ``iterations`` times."""
+    results = []
+    for name, budget, factory in OPERATIONS:
+        if operations and name not in operations:
+            continue
+        results.append(run_operation(name, budget, factory(data), iterations))
+    return results
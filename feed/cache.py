@@ -0,0 +1,333 @@
+"""
+Read-through cache for feed pages and single posts.
+
+Pages are cached as lists of post ids; posts are cached individually, so a
+mutation that touches one post only has to rewrite or drop that post's entry.
+Pages are invalidated through two generation counters folded into their keys:
+
+* ``head`` is bumped whenever a post is created or deleted and invalidates
+  pages read from the top of the feed (no ``after`` cursor);
+* ``all`` is bumped when a post is deleted and invalidates every page.
+
+Keyset pages read with an ``after`` cursor are unaffected by new posts, so
+they survive inserts.
+
+Mutations also bump the data versions that HTTP ETags are keyed on (see
+``backend.http_cache``): ``data:feed`` on every change, ``data:post:<id>``
+for the posts it touched and ``data:users`` when user profiles or counters
+change.
+
+``aget_posts`` and ``acached_page`` are the event-loop variants used by the
+ASGI view: database reads go through the async ORM and only the cache
+backend calls run in a worker thread.
+
+The backend is chosen with ``FEED_CACHE_BACKEND``:
+``feed.cache.LRUCacheBackend`` (in-process, default) or
+``feed.cache.RedisCacheBackend``.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .ids import canonical_id
+from .models import Post
+
+
+def cache_ttl():
+    return getattr(settings, "FEED_CACHE_TTL", 30)
+
+
+def cache_enabled():
+    return getattr(settings, "FEED_CACHE_ENABLED", True)
+
+
+class LRUCacheBackend:
+    """Thread-safe in-process LRU with per-entry TTL and a bounded entry count."""
+
+    # versions are per process, so other workers never see a bump
+    shared = False
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or getattr(settings, "FEED_CACHE_MAX_ENTRIES", 10000)
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None or entry[0] <= now:
+                    if entry is not None:
+                        del self._data[key]
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                found[key] = pickle.loads(entry[1])
+                self.hits += 1
+        return found
+
+    def set_many(self, mapping, ttl):
+        expires = time.monotonic() + ttl
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def get_versions(self, names):
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def bump_versions(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._data)}
+
+
+class RedisCacheBackend:
+    """
+    Shared cache in Redis. Entry count is bounded by the server's ``maxmemory``
+    policy (use ``volatile-lru`` so the generation keys, which have no TTL, are
+    never evicted).
+    """
+
+    prefix = "feedcache:"
+    shared = True
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.hits = self.misses = 0
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        values = self.client.mget([self.prefix + key for key in keys])
+        found = {key: pickle.loads(value) for key, value in zip(keys, values) if value is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, mapping, ttl):
+        with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=ttl)
+            pipe.execute()
+
+    def delete_many(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def get_versions(self, names):
+        values = self.client.mget([self.prefix + "v:" + name for name in names])
+        return [int(value or 0) for value in values]
+
+    def bump_versions(self, names):
+        with self.client.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(self.prefix + "v:" + name)
+            pipe.execute()
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        evictions = self.client.info("stats").get("evicted_keys", 0)
+        return {"hits": self.hits, "misses": self.misses, "evictions": evictions, "size": None}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_cache_backend():
+    return _load_backend(getattr(settings, "FEED_CACHE_BACKEND", "feed.cache.LRUCacheBackend"))
+
+
+def _post_keys(post_ids):
+    """Cache keys of ``post_ids``; bumping the "posts" version drops every cached post at once."""
+    (generation,) = get_cache_backend().get_versions(["posts"])
+    return {pk: f"post:{generation}:{pk}" for pk in post_ids}
+
+
+def _cached_posts(post_ids):
+    """Return ``({id: Post}, missing_ids)`` from the cache alone."""
+    cached = get_cache_backend().get_many(list(_post_keys(post_ids).values()))
+    posts = {post.pk: post for post in cached.values()}
+    return posts, [pk for pk in post_ids if pk not in posts]
+
+
+def _store_posts(posts):
+    posts = {post.pk: post for post in posts}
+    keys = _post_keys(posts)
+    get_cache_backend().set_many({keys[pk]: post for pk, post in posts.items()}, cache_ttl())
+
+
+def get_posts(post_ids):
+    """Return ``{id: Post}`` for ``post_ids``, reading through the post cache."""
+    if not cache_enabled():
+        return Post.objects.in_bulk(post_ids)
+    posts, missing = _cached_posts(post_ids)
+    if missing:
+        loaded = Post.objects.in_bulk(missing)
+        _store_posts(loaded.values())
+        posts.update(loaded)
+    return posts
+
+
+async def aget_posts(post_ids):
+    if not cache_enabled():
+        return await Post.objects.ain_bulk(post_ids)
+    posts, missing = await sync_to_async(_cached_posts)(post_ids)
+    if missing:
+        loaded = await Post.objects.ain_bulk(missing)
+        await sync_to_async(_store_posts)(loaded.values())
+        posts.update(loaded)
+    return posts
+
+
+def get_post(post_id):
+    return get_posts([post_id]).get(post_id)
+
+
+async def aget_post(post_id):
+    return (await aget_posts([post_id])).get(post_id)
+
+
+def _cached_page(name, first, after):
+    """Return ``(key, (posts, has_next) or None)`` for a page, from the cache alone."""
+    backend = get_cache_backend()
+    all_version, head_version = backend.get_versions(["all", "head"])
+    if after:
+        key = f"page:{name}:{all_version}:{first}:{after}"
+    else:
+        key = f"page:{name}:{all_version}.{head_version}:{first}"
+    entry = backend.get_many([key]).get(key)
+    if entry is not None:
+        post_ids, has_next = entry
+        posts, missing = _cached_posts(post_ids)
+        if not missing:
+            return key, ([posts[pk] for pk in post_ids], has_next)
+    return key, None
+
+
+def _store_page(key, rows, has_next):
+    get_cache_backend().set_many({key: ([row.pk for row in rows], has_next)}, cache_ttl())
+    _store_posts(rows)
+
+
+def cached_page(name, first, after, compute):
+    """
+    Return ``(posts, has_next_page)`` for a feed page, calling ``compute()``
+    (which must return the same pair) only on a miss.
+    """
+    if not cache_enabled():
+        return compute()
+    key, page = _cached_page(name, first, after)
+    if page is not None:
+        return page
+    rows, has_next = compute()
+    _store_page(key, rows, has_next)
+    return rows, has_next
+
+
+async def acached_page(name, first, after, compute):
+    """``cached_page`` for a coroutine function ``compute``."""
+    if not cache_enabled():
+        return await compute()
+    key, page = await sync_to_async(_cached_page)(name, first, after)
+    if page is not None:
+        return page
+    rows, has_next = await compute()
+    await sync_to_async(_store_page)(key, rows, has_next)
+    return rows, has_next
+
+
+def post_created(post):
+    get_cache_backend().bump_versions(["head"])
+
+
+def post_updated(post):
+    """Write the fresh instance through to the cache."""
+    _store_posts([post])
+
+
+def post_deleted(post_id):
+    backend = get_cache_backend()
+    backend.delete_many(list(_post_keys([post_id]).values()))
+    backend.bump_versions(["all", "head"])
+
+
+def posts_changed(post_ids):
+    """Drop cached posts whose stored columns changed outside a mutation, e.g. a counter flush."""
+    if post_ids:
+        get_cache_backend().delete_many(list(_post_keys(post_ids).values()))
+
+
+FEED_VERSION = "data:feed"
+USERS_VERSION = "data:users"
+# read by every cacheable query
+ALL_VERSION = "data:all"
+
+
+def post_version(post_id):
+    # the same post however the client spelled its id
+    return f"data:post:{canonical_id(Post, post_id)}"
+
+
+def data_versions(names):
+    return get_cache_backend().get_versions(names)
+
+
+def data_changed(post_ids=(), users=False):
+    """Bump the feed's data version, and that of ``post_ids`` (and users), once the mutation commits."""
+    names = [FEED_VERSION] + [post_version(pk) for pk in post_ids]
+    if users:
+        names.append(USERS_VERSION)
+    transaction.on_commit(lambda: get_cache_backend().bump_versions(names))
+
+
+def everything_changed():
+    """
+    Drop every cached post and make every ETag stale once the transaction
+    commits, e.g. after the counters are rebuilt. Bumping versions rather
+    than clearing the backend keeps them increasing, so an ETag taken before
+    can never match again.
+    """
+    transaction.on_commit(
+        lambda: get_cache_backend().bump_versions(["posts", FEED_VERSION, USERS_VERSION, ALL_VERSION])
+    )
+
+
+def stats():
+    return get_cache_backend().stats()
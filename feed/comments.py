@@ -0,0 +1,110 @@
+"""
+Threaded comments and comment likes.
+
+A reply's ``path`` is its parent's path followed by a fixed-width,
+time-ordered segment (``models.thread_segment``), so ordering by path lists a
+thread depth first with older siblings first. Paths only use ``0-9a-f``,
+which makes the descendants of a comment at path ``P`` exactly the rows with
+``P < path < P + "g"``: one range scan on the ``(post, path)`` index.
+
+Replies to a comment at ``FEED_COMMENT_MAX_DEPTH - 1`` are attached to its
+parent instead, so threads stay within the path column.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import cache as feed_cache
+from . import counters
+from .models import THREAD_SEGMENT_LENGTH, Comment, CommentLike, thread_segment
+from .pagination import keyset_slice_many
+
+
+def max_depth():
+    return min(getattr(settings, "FEED_COMMENT_MAX_DEPTH", 8), 255 // THREAD_SEGMENT_LENGTH)
+
+
+def build_comment(post_id, author, content, parent=None):
+    """An unsaved ``Comment`` on ``post_id``, threaded under ``parent`` if given."""
+    if parent is None:
+        return Comment(post_id=post_id, author=author, content=content)
+    if parent.depth + 1 >= max_depth():
+        # too deep: reply next to the parent instead
+        return Comment(
+            post_id=post_id, author=author, content=content, parent_id=parent.parent_id,
+            path=parent.path[:-THREAD_SEGMENT_LENGTH] + thread_segment(), depth=parent.depth,
+        )
+    return Comment(
+        post_id=post_id, author=author, content=content, parent_id=parent.pk,
+        path=parent.path + thread_segment(), depth=parent.depth + 1,
+    )
+
+
+def comment_pages(fk, keys, first, after=None):
+    """
+    One keyset page of comments for each key, newest first: top-level
+    comments per post for ``fk="post_id"``, direct replies per comment for
+    ``fk="parent_id"``.
+    """
+    qs = Comment.objects.all()
+    if fk == "post_id":
+        qs = qs.filter(parent__isnull=True)
+    return keyset_slice_many(qs, fk, keys, first, after)
+
+
+def subtrees(roots):
+    """
+    ``{(post_id, path): [descendants in thread order]}`` for every
+    ``(post_id, path)`` in ``roots``, with one query.
+    """
+    roots = set(roots)
+    if not roots:
+        return {}
+    condition = Q()
+    for post_id, path in roots:
+        condition |= Q(post_id=post_id, path__gt=path, path__lt=path + "g")
+    found = {}
+    for comment in Comment.objects.filter(condition).order_by("post_id", "path"):
+        # every ancestor of the row that was asked for gets it
+        for end in range(THREAD_SEGMENT_LENGTH, len(comment.path), THREAD_SEGMENT_LENGTH):
+            key = (comment.post_id, comment.path[:end])
+            if key in roots:
+                found.setdefault(key, []).append(comment)
+    return found
+
+
+def like_comment(user, comment_id):
+    """
+    Like ``comment_id`` as ``user``; a repeated like is a no-op.
+
+    Returns ``(changed, likes_count)`` and raises ``Comment.DoesNotExist``.
+    """
+    comment = Comment.objects.get(pk=comment_id)
+    changed = False
+    try:
+        with transaction.atomic():
+            CommentLike.objects.create(comment=comment, user=user)
+            counters.incr(Comment, comment.pk, "likes_count", 1)
+            changed = True
+    except IntegrityError:
+        pass
+    if changed:
+        feed_cache.data_changed([comment.post_id])
+    return changed, counters.value(comment, "likes_count")
+
+
+def unlike_comment(user, comment_id):
+    """Remove ``user``'s like of ``comment_id`` if there is one; see ``like_comment``."""
+    comment = Comment.objects.get(pk=comment_id)
+    with transaction.atomic():
+        deleted, _ = CommentLike.objects.filter(comment=comment, user=user).delete()
+        if deleted:
+            counters.incr(Comment, comment.pk, "likes_count", -1)
+            feed_cache.data_changed([comment.post_id])
+    return bool(deleted), counters.value(comment, "likes_count")
+
+
+def liked_comment_ids(user, comment_ids):
+    """Return ``{comment_id: True}`` for the comments in ``comment_ids`` that ``user`` has liked."""
+    liked = CommentLike.objects.filter(user=user, comment_id__in=list(comment_ids)).values_list("comment_id", flat=True)
+    return {comment_id: True for comment_id in liked}
@@ -0,0 +1,170 @@
+"""
+WebSocket endpoint for GraphQL subscriptions (``graphql-transport-ws``).
+
+Each connection is one channel: subscriptions ask for events through
+``SubscriptionContext.listen``, which joins the matching channel-layer group
+and feeds every event to a per-subscription queue. Only subscriptions are
+served here; queries and mutations keep going through ``/graphql/``.
+
+Clients authenticate in ``connection_init`` with
+``{"payload": {"authorization": "JWT <token>"}}``.
+"""
+import asyncio
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.contrib.auth.models import AnonymousUser
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, OperationType, get_operation_ast, subscribe
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_user_by_token
+
+from backend import cost, persisted_queries
+
+from .loaders import LoaderRegistry
+
+PROTOCOL = "graphql-transport-ws"
+
+
+class SubscriptionContext:
+    """``info.context`` of a subscription; fresh loaders are used for every event."""
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.user = consumer.user
+        self.loaders = LoaderRegistry(asynchronous=True)
+
+    async def listen(self, group, interval=0):
+        async for event in self.consumer.listen(group, interval):
+            self.loaders = LoaderRegistry(asynchronous=True)
+            yield event
+
+
+class GraphQLConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        if PROTOCOL not in self.scope.get("subprotocols", []):
+            await self.close(code=4406)
+            return
+        self.user = AnonymousUser()
+        self.initialized = False
+        self.operations = {}
+        self.queues = defaultdict(set)
+        await self.accept(PROTOCOL)
+
+    async def disconnect(self, code):
+        for task in list(getattr(self, "operations", {}).values()):
+            task.cancel()
+
+    async def receive_json(self, message):
+        kind = message.get("type") if isinstance(message, dict) else None
+        if kind == "connection_init":
+            await self.connection_init(message.get("payload") or {})
+        elif kind == "ping":
+            await self.send_json({"type": "pong"})
+        elif kind == "pong":
+            pass
+        elif kind == "subscribe":
+            await self.start(message.get("id"), message.get("payload") or {})
+        elif kind == "complete":
+            task = self.operations.pop(message.get("id"), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(code=4400)
+
+    async def connection_init(self, payload):
+        if self.initialized:
+            await self.close(code=4429)
+            return
+        token = payload.get("authorization") or payload.get("Authorization")
+        if token:
+            try:
+                self.user = await database_sync_to_async(get_user_by_token)(token.split(" ", 1)[-1])
+            except JSONWebTokenError:
+                await self.close(code=4403)
+                return
+        self.initialized = True
+        await self.send_json({"type": "connection_ack"})
+
+    async def start(self, id, payload):
+        if not self.initialized:
+            await self.close(code=4401)
+            return
+        if not isinstance(id, str) or id in self.operations:
+            await self.close(code=4409)
+            return
+        try:
+            results = await self.subscribe(payload)
+        except GraphQLError as e:
+            await self.send_json({"id": id, "type": "error", "payload": [e.formatted]})
+            return
+        if isinstance(results, list):
+            await self.send_json({"id": id, "type": "error", "payload": [e.formatted for e in results]})
+            return
+        self.operations[id] = asyncio.ensure_future(self.stream(id, results))
+
+    async def subscribe(self, payload):
+        """Return the result stream of a subscription, or a list of errors."""
+        schema = graphene_settings.SCHEMA.graphql_schema
+        query, query_hash = persisted_queries.resolve_query(payload.get("query"), payload.get("extensions"))
+        if not query:
+            raise GraphQLError("Must provide query string.")
+        document, errors = persisted_queries.get_document(
+            schema, query, query_hash, None, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        if errors:
+            return errors
+        operation_name = payload.get("operationName")
+        operation = get_operation_ast(document, operation_name)
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            raise GraphQLError("Only subscriptions are served over WebSocket; use POST /graphql/.")
+        variables = payload.get("variables")
+        _, errors = cost.check(schema, document, operation_name, variables)
+        if errors:
+            return errors
+        result = await subscribe(
+            schema, document, context_value=SubscriptionContext(self),
+            variable_values=variables, operation_name=operation_name,
+        )
+        return getattr(result, "errors", None) or result
+
+    async def stream(self, id, results):
+        try:
+            async for result in results:
+                await self.send_json({"id": id, "type": "next", "payload": result.formatted})
+            await self.send_json({"id": id, "type": "complete"})
+        finally:
+            self.operations.pop(id, None)
+            await results.aclose()
+
+    async def listen(self, group, interval=0):
+        """
+        Yield the payloads published to ``group``. With ``interval``, events
+        arriving less than ``interval`` seconds after the previous one are
+        collapsed into a single trailing event.
+        """
+        queue = asyncio.Queue()
+        if not self.queues[group]:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.queues[group].add(queue)
+        loop = asyncio.get_running_loop()
+        last = None
+        try:
+            while True:
+                event = await queue.get()
+                if interval and last is not None:
+                    await asyncio.sleep(last + interval - loop.time())
+                    while not queue.empty():
+                        event = queue.get_nowait()
+                last = loop.time()
+                yield event
+        finally:
+            self.queues[group].discard(queue)
+            if not self.queues[group]:
+                del self.queues[group]
+                await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def feed_event(self, message):
+        for queue in self.queues.get(message["group"], ()):
+            queue.put_nowait(message["payload"])
@@ -0,0 +1,348 @@
+"""
+Buffered counters for likes, comments, shares and post counts.
+
+Mutations call ``incr`` instead of ``UPDATE ... SET x = x + 1``, so a viral
+post no longer serializes every like on its row lock. Increments accumulate
+in a backend and ``flush`` folds them into the counter columns with one
+UPDATE per affected row. Reads add the still-pending deltas (``value`` and
+``pending_many``), so counts are exact with the database backend and stale by
+at most one flush interval with the others.
+
+Backends, chosen with ``FEED_COUNTER_BACKEND``:
+
+* ``feed.counters.DatabaseCounterBackend`` (default): insert-only
+  ``CounterDelta`` rows, transactional and shared by every worker;
+* ``feed.counters.RedisCounterBackend``: one ``HINCRBY`` per increment;
+* ``feed.counters.MemoryCounterBackend``: a per-process accumulator.
+
+Every increment queues one deduplicated ``counters.flush`` background job,
+due ``FEED_COUNTER_FLUSH_INTERVAL`` seconds later (see ``feed.jobs``), so
+increments are folded in at most once per interval and never on the request
+path. ``manage.py flush_counters`` flushes by hand and ``manage.py
+reconcile_counters`` rebuilds every counter from source rows.
+"""
+import threading
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.module_loading import import_string
+
+from . import cache as feed_cache, events, jobs, trending
+from .loaders import get_loaders, then
+from .models import Comment, CommentLike, CounterDelta, Follow, Post, PostLike, PostShare, User
+
+
+def flush_interval():
+    return getattr(settings, "FEED_COUNTER_FLUSH_INTERVAL", 5)
+
+
+def exact_reads():
+    return getattr(settings, "FEED_COUNTER_EXACT_READS", True)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def apply_totals(totals):
+    """
+    Apply ``{(label, object_id): {field: delta}}`` with one UPDATE per row.
+
+    Returns the ``(label, object_id)`` pairs that were updated.
+    """
+    updated = []
+    for (label, object_id), fields in totals.items():
+        changes = {
+            name: Greatest(F(name) + delta, Value(0)) for name, delta in fields.items() if delta
+        }
+        if changes:
+            apps.get_model(label).objects.filter(pk=object_id).update(**changes)
+            updated.append((label, object_id))
+    return updated
+
+
+class DatabaseCounterBackend:
+    transactional = True
+
+    def incr(self, label, object_id, field, delta):
+        CounterDelta.objects.create(target=label, object_id=object_id, field=field, delta=delta)
+
+    def incr_many(self, items):
+        CounterDelta.objects.bulk_create(
+            [CounterDelta(target=label, object_id=object_id, field=field, delta=delta)
+             for label, object_id, field, delta in items]
+        )
+
+    def pending_many(self, label, object_ids):
+        pending = defaultdict(dict)
+        rows = (
+            CounterDelta.objects.filter(target=label, object_id__in=list(object_ids))
+            .values("object_id", "field")
+            .annotate(total=Sum("delta"))
+            .values_list("object_id", "field", "total")
+        )
+        for object_id, field, total in rows:
+            if total:
+                pending[object_id][field] = total
+        return pending
+
+    def flush(self, batch_size=10000):
+        with transaction.atomic():
+            rows = list(
+                CounterDelta.objects.select_for_update(skip_locked=True)
+                .order_by("pk")
+                .values_list("pk", "target", "object_id", "field", "delta")[:batch_size]
+            )
+            totals = defaultdict(lambda: defaultdict(int))
+            for _, label, object_id, field, delta in rows:
+                totals[(label, object_id)][field] += delta
+            updated = apply_totals(totals)
+            CounterDelta.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        return updated
+
+    def discard(self):
+        CounterDelta.objects.all().delete()
+
+
+class MemoryCounterBackend:
+    transactional = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+
+    def incr(self, label, object_id, field, delta):
+        with self._lock:
+            self._deltas[(label, object_id, field)] += delta
+
+    def incr_many(self, items):
+        with self._lock:
+            for label, object_id, field, delta in items:
+                self._deltas[(label, object_id, field)] += delta
+
+    def pending_many(self, label, object_ids):
+        pending = defaultdict(dict)
+        with self._lock:
+            for object_id in object_ids:
+                for field in COUNTER_FIELDS.get(label, ()):
+                    delta = self._deltas.get((label, object_id, field))
+                    if delta:
+                        pending[object_id][field] = delta
+        return pending
+
+    def flush(self, batch_size=None):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+        totals = defaultdict(dict)
+        for (label, object_id, field), delta in deltas.items():
+            totals[(label, object_id)][field] = delta
+        try:
+            with transaction.atomic():
+                return apply_totals(totals)
+        except Exception:
+            for (label, object_id, field), delta in deltas.items():
+                self.incr(label, object_id, field, delta)
+            raise
+
+    def discard(self):
+        with self._lock:
+            self._deltas.clear()
+
+
+class RedisCounterBackend:
+    transactional = False
+    key = "counters:pending"
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def incr(self, label, object_id, field, delta):
+        self.client.hincrby(self.key, f"{label}|{object_id}|{field}", delta)
+
+    def incr_many(self, items):
+        with self.client.pipeline(transaction=False) as pipe:
+            for label, object_id, field, delta in items:
+                pipe.hincrby(self.key, f"{label}|{object_id}|{field}", delta)
+            pipe.execute()
+
+    def pending_many(self, label, object_ids):
+        object_ids = list(object_ids)
+        fields = COUNTER_FIELDS.get(label, ())
+        names = [f"{label}|{object_id}|{field}" for object_id in object_ids for field in fields]
+        pending = defaultdict(dict)
+        if not names:
+            return pending
+        for name, value in zip(names, self.client.hmget(self.key, names)):
+            if value is not None and int(value):
+                _, object_id, field = name.split("|")
+                pending[object_id][field] = int(value)
+        return pending
+
+    def flush(self, batch_size=None):
+        # swap the hash out atomically so increments arriving mid-flush start a new one
+        from redis.exceptions import ResponseError
+
+        flushing = f"counters:flushing:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(self.key, flushing)
+        except ResponseError:
+            # nothing pending
+            return []
+        totals = defaultdict(dict)
+        for name, value in self.client.hgetall(flushing).items():
+            label, object_id, field = name.decode().split("|")
+            totals[(label, object_id)][field] = int(value)
+        with transaction.atomic():
+            updated = apply_totals(totals)
+        self.client.delete(flushing)
+        return updated
+
+    def discard(self):
+        self.client.delete(self.key)
+
+
+# counter columns maintained through this module, by model label
+COUNTER_FIELDS = {
+    "feed.post": ("likes_count", "comments_count", "shares_count"),
+    "feed.comment": ("likes_count",),
+    "feed.user": ("posts_count",),
+}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _load_backend(getattr(settings, "FEED_COUNTER_BACKEND", "feed.counters.DatabaseCounterBackend"))
+
+
+def schedule_flush():
+    """Queue a flush for the end of the interval, unless one is already queued."""
+    interval = flush_interval()
+    if interval:
+        jobs.enqueue("counters.flush", key="flush", delay=interval)
+
+
+def incr(model, object_id, field, delta=1):
+    """Buffer ``delta`` for ``model.field`` of row ``object_id``."""
+    backend = get_backend()
+    label = _label(model)
+    if backend.transactional:
+        backend.incr(label, object_id, field, delta)
+    else:
+        # only count increments whose transaction actually commits
+        transaction.on_commit(lambda: backend.incr(label, object_id, field, delta))
+    if model is Post:
+        trending.record({(object_id, field): delta})
+    schedule_flush()
+
+
+def incr_many(deltas):
+    """
+    Buffer several increments at once from ``{(model, object_id, field): delta}``;
+    deltas for the same counter should already be summed by the caller.
+    """
+    backend = get_backend()
+    items = [(_label(model), object_id, field, delta) for (model, object_id, field), delta in deltas.items() if delta]
+    if not items:
+        return
+    if backend.transactional:
+        backend.incr_many(items)
+    else:
+        transaction.on_commit(lambda: backend.incr_many(items))
+    trending.record({
+        (object_id, field): delta for (model, object_id, field), delta in deltas.items() if model is Post
+    })
+    schedule_flush()
+
+
+def pending_many(model, object_ids):
+    """Return ``{object_id: {field: delta}}`` for the not yet flushed increments."""
+    return get_backend().pending_many(_label(model), object_ids)
+
+
+def value(instance, field):
+    """Current value of a counter: the stored column plus pending deltas."""
+    stored = getattr(instance, field)
+    if not exact_reads():
+        return stored
+    return stored + pending_many(type(instance), [instance.pk]).get(instance.pk, {}).get(field, 0)
+
+
+def flush(batch_size=10000):
+    """Fold pending deltas into the counter columns; returns the updated rows."""
+    updated = get_backend().flush(batch_size)
+    post_ids = [object_id for label, object_id in updated if label == "feed.post"]
+    feed_cache.posts_changed(post_ids)
+    if updated:
+        # the stored counts changed: ETags computed before the flush are stale
+        comment_ids = [object_id for label, object_id in updated if label == "feed.comment"]
+        commented = Comment.objects.filter(pk__in=comment_ids).values_list("post_id", flat=True) if comment_ids else []
+        feed_cache.data_changed(
+            {*post_ids, *commented}, users=any(label == "feed.user" for label, _ in updated)
+        )
+    events.counters_changed(post_ids)
+    return updated
+
+
+@jobs.handler("counters.flush")
+def _flush_job(payloads):
+    flush()
+
+
+def _count(model, fk):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(c=Count("pk"))
+            .values("c")[:1]
+        ),
+        0,
+    )
+
+
+def reconcile():
+    """Rebuild every counter column from the source tables and drop pending deltas."""
+    with transaction.atomic():
+        get_backend().discard()
+        Post.objects.update(
+            likes_count=_count(PostLike, "post"),
+            comments_count=_count(Comment, "post"),
+            shares_count=_count(PostShare, "post"),
+        )
+        Comment.objects.update(likes_count=_count(CommentLike, "comment"))
+        User.objects.update(
+            posts_count=_count(Post, "author"),
+            followers_count=_count(Follow, "followee"),
+            following_count=_count(Follow, "follower"),
+        )
+        feed_cache.everything_changed()
+
+
+def counter_resolver(field):
+    """
+    GraphQL resolver for a counter column that adds pending deltas, fetched
+    once for every instance of the model loaded in the request.
+    """
+    def resolver(root, info):
+        stored = getattr(root, field)
+        if not exact_reads():
+            return stored
+        model = type(root)
+        loader = get_loaders(info).for_peers(
+            model, "counters", lambda keys: pending_many(model, keys), default=dict
+        )
+        return then(loader.load(root.pk), lambda pending: stored + pending.get(field, 0))
+    return resolver
@@ -0,0 +1,66 @@
+"""
+Real-time feed events for GraphQL subscriptions.
+
+Mutations publish small id-only messages to channel-layer groups once their
+transaction commits; ``feed.consumers.GraphQLConsumer`` joins the groups its
+subscriptions listen to and re-reads the rows when an event arrives.
+
+Counter events are published by ``counters.flush``, so a post gets at most
+one per flush however many likes it received, and each subscription further
+coalesces them to one push per ``FEED_SUBSCRIPTION_COUNTER_INTERVAL``.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+POST_CREATED = "feed.post_created"
+
+
+def post_group(post_id, topic):
+    return f"feed.post.{post_id}.{topic}"
+
+
+def counter_interval():
+    return getattr(settings, "FEED_SUBSCRIPTION_COUNTER_INTERVAL", 1)
+
+
+def _send(messages):
+    layer = get_channel_layer()
+    if layer is None or not messages:
+        return
+
+    async def send_all():
+        for group, payload in messages:
+            await layer.group_send(group, {"type": "feed.event", "group": group, "payload": payload})
+
+    try:
+        async_to_sync(send_all)()
+    except Exception:
+        # pushes are best effort; clients can always fall back to querying
+        logger.exception("Could not publish feed events")
+
+
+def publish(messages):
+    """Send ``[(group, payload)]`` once the current transaction commits."""
+    messages = list(messages)
+    if messages:
+        transaction.on_commit(lambda: _send(messages))
+
+
+def posts_created(posts):
+    publish((POST_CREATED, {"post_id": post.pk}) for post in posts)
+
+
+def comments_added(comments):
+    publish(
+        (post_group(comment.post_id, "comments"), {"comment_id": comment.pk}) for comment in comments
+    )
+
+
+def counters_changed(post_ids):
+    publish((post_group(post_id, "counters"), {"post_id": post_id}) for post_id in post_ids)
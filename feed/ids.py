@@ -0,0 +1,91 @@
+"""
+Time-ordered primary keys.
+
+New rows get a UUIDv7 (RFC 9562): 48 bits of Unix milliseconds, a 12-bit
+counter that keeps ids from one process increasing within a millisecond,
+and 62 random bits. Consecutive inserts therefore land at the right edge of
+the primary key and foreign key indexes instead of at random pages.
+
+``CompactIDField`` stores ids as a native 16-byte ``uuid`` on PostgreSQL
+(``char(32)`` elsewhere) but hands them to Python, GraphQL and the caches as
+32-character lowercase hex, the format of the ``uuid4().hex`` ids that came
+before. Those are valid UUIDs too: migration ``0007`` casts them in place,
+so existing ids, cursors and client-held references keep working.
+"""
+import secrets
+import threading
+import time
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import models
+
+NIL = uuid.UUID(int=0)
+
+_COUNTER_MAX = 0xFFF
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """A new UUIDv7; ids from this process are strictly increasing."""
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            # start low in the counter space to leave room for a burst
+            _last_ms, _counter = ms, secrets.randbits(10)
+        else:
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                # more than 4096 ids in one millisecond: borrow the next one
+                _last_ms, _counter = _last_ms + 1, 0
+        ms, counter = _last_ms, _counter
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | secrets.randbits(62)
+    return uuid.UUID(int=value)
+
+
+class CompactIDField(models.UUIDField):
+    """A UUID column whose Python value is the 32-character hex string."""
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        return value.hex if isinstance(value, uuid.UUID) else value
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        try:
+            return uuid.UUID(hex=str(value))
+        except ValueError:
+            # a malformed id matches nothing, as it did when ids were text
+            return NIL
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return value if connection.features.has_native_uuid_field else value.hex
+
+    def get_db_prep_save(self, value, connection):
+        if hasattr(value, "as_sql"):
+            return value
+        if value is not None and not isinstance(value, uuid.UUID):
+            # raises ValidationError rather than storing a malformed id
+            value = uuid.UUID(hex=self.to_python(value))
+        return self.get_db_prep_value(value, connection, prepared=True)
+
+
+def canonical_id(model, value):
+    """``value`` in the form ``model``'s ids take in Python, or unchanged if it is malformed."""
+    try:
+        return model._meta.pk.to_python(value)
+    except ValidationError:
+        return value
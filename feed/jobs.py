@@ -0,0 +1,281 @@
+"""
+Background jobs for the side effects of mutations.
+
+Mutations ``enqueue`` work (timeline fan-out, search indexing, counter
+flushes) instead of doing it in the request. Jobs are pushed once the
+transaction commits, so a rolled back mutation leaves nothing behind, and
+run on workers:
+
+* handlers are registered per kind with ``@handler(kind)`` and receive a
+  list of payloads: a worker takes up to ``FEED_JOBS_BATCH_SIZE`` due jobs of
+  one kind and runs them in one call;
+* a job enqueued with a ``key`` is dropped while another job of its kind
+  with the same key is still queued. ``counters.incr`` enqueues
+  ``counters.flush`` with one key and a ``FEED_COUNTER_FLUSH_INTERVAL``
+  delay, so a thousand likes become one flush;
+* a batch whose handler raises is queued again with an exponential
+  backoff (``FEED_JOBS_RETRY_DELAY * 2 ** attempt``) and dropped after
+  ``FEED_JOBS_MAX_ATTEMPTS`` attempts.
+
+Queues, chosen with ``FEED_JOBS_BACKEND``:
+
+* ``feed.jobs.MemoryJobQueue`` (default): per process, worked by a daemon
+  thread started with the first job;
+* ``feed.jobs.RedisJobQueue``: one sorted set per kind shared by every
+  worker; run ``manage.py run_jobs --loop`` next to the web workers.
+
+``FEED_JOBS_EAGER`` runs jobs inline as they are enqueued, for tests and
+scripts. Queue depth, lag (how long the oldest due job has waited) and
+processed/failed batches are served at ``/metrics/``.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from .tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+def eager():
+    return getattr(settings, "FEED_JOBS_EAGER", False)
+
+
+def batch_size():
+    return getattr(settings, "FEED_JOBS_BATCH_SIZE", 500)
+
+
+def max_attempts():
+    return getattr(settings, "FEED_JOBS_MAX_ATTEMPTS", 5)
+
+
+def retry_delay():
+    return getattr(settings, "FEED_JOBS_RETRY_DELAY", 1)
+
+
+def worker_thread():
+    return getattr(settings, "FEED_JOBS_WORKER_THREAD", True)
+
+
+def poll_interval():
+    return getattr(settings, "FEED_JOBS_POLL_INTERVAL", 0.5)
+
+
+def handler(kind):
+    """Register the decorated ``function(payloads)`` as the handler of ``kind``."""
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def _job(kind, payload, key, delay):
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex, "kind": kind, "payload": payload, "key": key,
+        "attempts": 0, "enqueued_at": now, "run_at": now + delay,
+    }
+
+
+class MemoryJobQueue:
+    """Thread-safe in-process queue; a daemon thread works it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = defaultdict(list)
+        self._keys = set()
+        self._worker = None
+
+    def push(self, job):
+        with self._lock:
+            if job["key"] is not None:
+                if (job["kind"], job["key"]) in self._keys:
+                    return False
+                self._keys.add((job["kind"], job["key"]))
+            self._jobs[job["kind"]].append(job)
+            if worker_thread():
+                self._start_worker()
+        return True
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=work, name="feed-jobs", daemon=True)
+            self._worker.start()
+
+    def take(self, limit):
+        """Remove and return up to ``limit`` due jobs of one kind."""
+        now = time.time()
+        with self._lock:
+            for kind, jobs in self._jobs.items():
+                due = [job for job in jobs if job["run_at"] <= now][:limit]
+                if due:
+                    taken = {job["id"] for job in due}
+                    self._jobs[kind] = [job for job in jobs if job["id"] not in taken]
+                    self._keys.difference_update((kind, job["key"]) for job in due if job["key"] is not None)
+                    return due
+        return []
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {kind: _stats(jobs, now) for kind, jobs in self._jobs.items()}
+
+    def clear(self):
+        with self._lock:
+            self._jobs.clear()
+            self._keys.clear()
+
+
+def _stats(jobs, now):
+    due = [job["run_at"] for job in jobs if job["run_at"] <= now]
+    return {"depth": len(jobs), "lag": now - min(due) if due else 0.0}
+
+
+class RedisJobQueue:
+    """One sorted set per kind, scored by when each job is due."""
+
+    prefix = "jobs:"
+
+    _TAKE = """
+    local jobs = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    if #jobs > 0 then redis.call('ZREM', KEYS[1], unpack(jobs)) end
+    return jobs
+    """
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._take = self.client.register_script(self._TAKE)
+
+    def _queue(self, kind):
+        return f"{self.prefix}queue:{kind}"
+
+    def _key(self, kind, key):
+        return f"{self.prefix}key:{kind}:{key}"
+
+    def push(self, job):
+        # the key expires on its own should its job be lost
+        if job["key"] is not None and not self.client.set(self._key(job["kind"], job["key"]), 1, nx=True, ex=3600):
+            return False
+        pipe = self.client.pipeline()
+        pipe.sadd(self.prefix + "kinds", job["kind"])
+        pipe.zadd(self._queue(job["kind"]), {json.dumps(job): job["run_at"]})
+        pipe.execute()
+        return True
+
+    def take(self, limit):
+        now = time.time()
+        for kind in sorted(member.decode() for member in self.client.smembers(self.prefix + "kinds")):
+            jobs = [json.loads(raw) for raw in self._take(keys=[self._queue(kind)], args=[now, limit])]
+            if jobs:
+                keys = [self._key(kind, job["key"]) for job in jobs if job["key"] is not None]
+                if keys:
+                    self.client.delete(*keys)
+                return jobs
+        return []
+
+    def stats(self):
+        now = time.time()
+        found = {}
+        for kind in sorted(member.decode() for member in self.client.smembers(self.prefix + "kinds")):
+            queue = self._queue(kind)
+            depth = self.client.zcard(queue)
+            oldest = self.client.zrange(queue, 0, 0, withscores=True)
+            lag = now - oldest[0][1] if oldest and oldest[0][1] <= now else 0.0
+            found[kind] = {"depth": depth, "lag": lag}
+        return found
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_queue():
+    return _load_backend(getattr(settings, "FEED_JOBS_BACKEND", "feed.jobs.MemoryJobQueue"))
+
+
+def enqueue(kind, payload=None, key=None, delay=0):
+    """Queue a ``kind`` job once the current transaction commits."""
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler for job kind {kind!r}")
+    if eager() and not delay:
+        HANDLERS[kind]([payload])
+        return
+    job = _job(kind, payload, key, delay)
+    transaction.on_commit(lambda: get_queue().push(job))
+
+
+def _run(jobs):
+    kind = jobs[0]["kind"]
+    try:
+        HANDLERS[kind]([job["payload"] for job in jobs])
+    except Exception:
+        metrics.inc("feed_jobs_failed_total", {"kind": kind})
+        attempts = jobs[0]["attempts"] + 1
+        if attempts >= max_attempts():
+            logger.exception("Dropping %d %s jobs after %d attempts", len(jobs), kind, attempts)
+            return
+        logger.warning("%d %s jobs failed, retrying", len(jobs), kind, exc_info=True)
+        run_at = time.time() + retry_delay() * 2 ** (attempts - 1)
+        queue = get_queue()
+        for job in jobs:
+            queue.push({**job, "attempts": attempts, "run_at": run_at})
+        return
+    metrics.inc("feed_jobs_processed_total", {"kind": kind}, len(jobs))
+
+
+def run_pending(limit=None):
+    """Run due jobs, a batch per kind at a time, until none is due; returns the jobs run."""
+    queue = get_queue()
+    done = 0
+    while limit is None or done < limit:
+        jobs = queue.take(batch_size() if limit is None else min(batch_size(), limit - done))
+        if not jobs:
+            break
+        _run(jobs)
+        done += len(jobs)
+    return done
+
+
+def work(stop=None):
+    """Work the queue until ``stop`` (a ``threading.Event``) is set."""
+    while stop is None or not stop.is_set():
+        try:
+            if not run_pending():
+                time.sleep(poll_interval())
+        except Exception:
+            logger.exception("Job worker iteration failed")
+            time.sleep(poll_interval())
+        finally:
+            close_old_connections()
+
+
+def stats():
+    """``{kind: {"depth", "lag"}}`` for every kind with queued jobs."""
+    return get_queue().stats()
+
+
+def export_metrics():
+    """Copy the queue depth and lag into ``metrics`` before it is rendered."""
+    metrics.clear_family("feed_jobs_queued")
+    metrics.clear_family("feed_jobs_lag_seconds")
+    for kind, found in stats().items():
+        metrics.set("feed_jobs_queued", {"kind": kind}, found["depth"])
+        metrics.set("feed_jobs_lag_seconds", {"kind": kind}, found["lag"])
@@ -0,0 +1,136 @@
+"""
+Idempotent like/unlike.
+
+On PostgreSQL with the database counter backend a like or unlike is a single
+statement: the ``PostLike`` insert (``ON CONFLICT DO NOTHING``) or delete
+(``RETURNING``), the ``CounterDelta`` row and the resulting count all happen
+in one round trip. Other setups fall back to a savepoint-guarded ORM path
+that is equally idempotent and safe against concurrent double-taps.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from . import counters, trending
+from .models import CounterDelta, Post, PostLike, cuid
+
+_LIKE = """
+WITH changed AS (
+    INSERT INTO {like} (id, user_id, post_id)
+    SELECT %(id)s, %(user)s, p.id FROM {post} p WHERE p.id = %(post)s
+    ON CONFLICT (user_id, post_id) DO NOTHING
+    RETURNING post_id
+),"""
+
+_UNLIKE = """
+WITH changed AS (
+    DELETE FROM {like} WHERE user_id = %(user)s AND post_id = %(post)s
+    RETURNING post_id
+),"""
+
+# The outer SELECT runs on the statement's snapshot, so it cannot see the
+# delta inserted by `bumped`; that delta is added explicitly.
+_BUMP = """
+bumped AS (
+    INSERT INTO {delta} (target, object_id, field, delta, created_at)
+    SELECT 'feed.post', post_id, 'likes_count', %(sign)s, NOW() FROM changed
+    RETURNING delta
+)
+SELECT p.likes_count
+       + COALESCE((SELECT SUM(d.delta) FROM {delta} d
+                   WHERE d.target = 'feed.post' AND d.object_id = p.id AND d.field = 'likes_count'), 0)
+       + COALESCE((SELECT SUM(delta) FROM bumped), 0),
+       (SELECT COUNT(*) FROM changed)
+FROM {post} p WHERE p.id = %(post)s
+"""
+
+
+def _single_statement():
+    return connection.vendor == "postgresql" and isinstance(
+        counters.get_backend(), counters.DatabaseCounterBackend
+    )
+
+
+def _run_single_statement(template, user, post_id, sign):
+    sql = (template + _BUMP).format(
+        like=PostLike._meta.db_table, post=Post._meta.db_table, delta=CounterDelta._meta.db_table
+    )
+    # a UUID; malformed ids become one that matches no post
+    post_uuid = Post._meta.pk.get_prep_value(post_id)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"id": cuid(), "user": user.pk, "post": post_uuid, "sign": sign})
+        row = cursor.fetchone()
+    if row is None:
+        raise Post.DoesNotExist
+    likes_count, changed = row
+    if changed:
+        trending.record({(post_uuid.hex, "likes_count"): sign})
+        counters.schedule_flush()
+    return bool(changed), likes_count
+
+
+def like_post(user, post_id):
+    """
+    Like ``post_id`` as ``user``; a repeated like is a no-op.
+
+    Returns ``(changed, likes_count)`` and raises ``Post.DoesNotExist``.
+    """
+    if _single_statement():
+        return _run_single_statement(_LIKE, user, post_id, 1)
+    post = Post.objects.get(pk=post_id)
+    changed = False
+    try:
+        with transaction.atomic():
+            PostLike.objects.create(post=post, user=user)
+            counters.incr(Post, post.pk, "likes_count", 1)
+            changed = True
+    except IntegrityError:
+        # a concurrent or repeated like already exists
+        pass
+    return changed, counters.value(post, "likes_count")
+
+
+def unlike_post(user, post_id):
+    """Remove ``user``'s like of ``post_id`` if there is one; see ``like_post``."""
+    if _single_statement():
+        return _run_single_statement(_UNLIKE, user, post_id, -1)
+    post = Post.objects.get(pk=post_id)
+    with transaction.atomic():
+        deleted, _ = PostLike.objects.filter(post=post, user=user).delete()
+        if deleted:
+            counters.incr(Post, post.pk, "likes_count", -1)
+    return bool(deleted), counters.value(post, "likes_count")
+
+
+def like_posts(user, post_ids):
+    """
+    Like every existing post in ``post_ids`` with one insert and one batch of
+    counter deltas. Returns ``(found_ids, changed_ids)``.
+    """
+    found = set(Post.objects.filter(pk__in=list(post_ids)).values_list("pk", flat=True))
+    wanted = [pk for pk in dict.fromkeys(post_ids) if pk in found]
+    if not wanted:
+        return found, set()
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            values = ", ".join(["(%s, %s, %s)"] * len(wanted))
+            params = [value for pk in wanted for value in (cuid(), user.pk, pk)]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {PostLike._meta.db_table} (id, user_id, post_id) VALUES {values} "
+                    "ON CONFLICT (user_id, post_id) DO NOTHING RETURNING post_id",
+                    params,
+                )
+                changed = {Post._meta.pk.to_python(row[0]) for row in cursor.fetchall()}
+        else:
+            existing = set(
+                PostLike.objects.filter(user=user, post_id__in=wanted).values_list("post_id", flat=True)
+            )
+            changed = {pk for pk in wanted if pk not in existing}
+            PostLike.objects.bulk_create([PostLike(user=user, post_id=pk) for pk in changed])
+        counters.incr_many({(Post, pk, "likes_count"): 1 for pk in changed})
+    return found, changed
+
+
+def liked_post_ids(user, post_ids):
+    """Return ``{post_id: True}`` for the posts in ``post_ids`` that ``user`` has liked."""
+    liked = PostLike.objects.filter(user=user, post_id__in=list(post_ids)).values_list("post_id", flat=True)
+    return {post_id: True for post_id in liked}
@@ -0,0 +1,374 @@
+"""
+Per-request DataLoaders for the feed GraphQL types.
+
+Every list or object returned by a resolver is primed into the request's
+``LoaderRegistry`` by ``LoaderMiddleware``; relation fields on types that
+extend ``BatchedDjangoObjectType`` then resolve through the registry, so each
+relation costs one ``IN (...)`` query per request instead of one per row.
+
+An asynchronous registry (used by the ASGI view) makes ``load`` return
+awaitables: keys requested by sibling fields are collected for one event
+loop tick and fetched together through the async ORM.
+"""
+import asyncio
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models.query import QuerySet
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+class DataLoader:
+    """Caches values by key and fetches every pending key in a single batch."""
+
+    def __init__(self, batch_load_fn, default=None, peers=None, async_batch_load_fn=None):
+        self.batch_load_fn = batch_load_fn
+        self.async_batch_load_fn = async_batch_load_fn
+        self.default = default
+        # optional callable returning further keys worth fetching in the same batch
+        self.peers = peers
+        # set by an asynchronous LoaderRegistry
+        self.asynchronous = False
+        self._cache = {}
+        self._pending = set()
+        self._dispatching = None
+        # keys being fetched -> the batch fetching them
+        self._loading = {}
+
+    def prime(self, keys):
+        for key in keys:
+            if key is not None and key not in self._cache:
+                self._pending.add(key)
+
+    def prime_value(self, key, value):
+        self._cache[key] = value
+        self._pending.discard(key)
+
+    def clear(self, key):
+        self._cache.pop(key, None)
+
+    def load(self, key):
+        if self.asynchronous:
+            return self.aload(key)
+        if key is None:
+            return self._default()
+        if key not in self._cache:
+            self._pending.add(key)
+            self.dispatch()
+        return self._cache.get(key, self._default())
+
+    def load_many(self, keys):
+        self.prime(keys)
+        if self.asynchronous:
+            return asyncio.gather(*[self.aload(key) for key in keys])
+        self.dispatch()
+        return [self.load(key) for key in keys]
+
+    async def aload(self, key):
+        if key is None:
+            return self._default()
+        while key not in self._cache:
+            batch = self._loading.get(key)
+            if batch is None:
+                self._pending.add(key)
+                if self._dispatching is None:
+                    self._dispatching = asyncio.ensure_future(self._adispatch())
+                batch = self._dispatching
+            await batch
+        return self._cache[key]
+
+    def keys(self):
+        return list(self._cache)
+
+    def values(self):
+        return [value for value in self._cache.values() if value is not None]
+
+    def dispatch(self):
+        keys = self._take_pending()
+        if keys:
+            self._store(keys, self.batch_load_fn(keys))
+
+    async def _adispatch(self):
+        # yield once so that sibling fields queue their keys into this batch
+        await asyncio.sleep(0)
+        self._dispatching = None
+        keys = self._take_pending()
+        if not keys:
+            return
+        # a key requested while this batch is in flight (e.g. by another
+        # operation of a batched request) waits for it instead of refetching
+        batch = asyncio.current_task()
+        self._loading.update(dict.fromkeys(keys, batch))
+        try:
+            if self.async_batch_load_fn is not None:
+                found = await self.async_batch_load_fn(keys)
+            else:
+                found = await sync_to_async(self.batch_load_fn)(keys)
+            self._store(keys, found)
+        finally:
+            for key in keys:
+                self._loading.pop(key, None)
+
+    def _take_pending(self):
+        if not self._pending:
+            return []
+        if self.peers is not None:
+            self.prime(self.peers())
+        keys, self._pending = list(self._pending), set()
+        return keys
+
+    def _store(self, keys, found):
+        for key in keys:
+            self._cache[key] = found.get(key, self._default())
+
+    def _default(self):
+        return self.default() if callable(self.default) else self.default
+
+
+def _load_by_pk(model):
+    def batch(keys):
+        return model._default_manager.in_bulk(keys)
+    return batch
+
+
+def _aload_by_pk(model):
+    async def batch(keys):
+        return await model._default_manager.ain_bulk(keys)
+    return batch
+
+
+def _group_by_fk(rel, objs):
+    grouped = {}
+    for obj in objs:
+        grouped.setdefault(getattr(obj, rel.field.attname), []).append(obj)
+    if rel.one_to_one:
+        return {key: objs[0] for key, objs in grouped.items()}
+    return grouped
+
+
+def _load_by_fk(rel):
+    def batch(keys):
+        return _group_by_fk(rel, rel.related_model._default_manager.filter(**{f"{rel.field.name}__in": keys}))
+    return batch
+
+
+def _aload_by_fk(rel):
+    async def batch(keys):
+        qs = rel.related_model._default_manager.filter(**{f"{rel.field.name}__in": keys})
+        return _group_by_fk(rel, [obj async for obj in qs])
+    return batch
+
+
+class LoaderRegistry:
+    """
+    All loaders for one request, keyed by model or by (model, relation).
+
+    With ``asynchronous=True`` every loader's ``load`` returns an awaitable.
+    """
+
+    def __init__(self, asynchronous=False):
+        self.asynchronous = asynchronous
+        self._loaders = {}
+
+    def _register(self, key, loader):
+        loader.asynchronous = self.asynchronous
+        self._loaders[key] = loader
+
+    def for_model(self, model):
+        key = model._meta.label
+        if key not in self._loaders:
+            self._register(key, DataLoader(_load_by_pk(model), async_batch_load_fn=_aload_by_pk(model)))
+        return self._loaders[key]
+
+    def for_relation(self, model, name):
+        key = (model._meta.label, name)
+        if key not in self._loaders:
+            rel = model._meta.get_field(name)
+            default = None if rel.one_to_one else list
+            self._register(
+                key, DataLoader(_load_by_fk(rel), default=default, async_batch_load_fn=_aload_by_fk(rel))
+            )
+        return self._loaders[key]
+
+    def for_peers(self, model, name, batch_load_fn, default=None):
+        """
+        Loader keyed by ``model`` pk that batches every instance of ``model``
+        seen so far in this request, e.g. per-post counters for a feed page.
+        """
+        key = (model._meta.label, "peers", name)
+        if key not in self._loaders:
+            self._register(key, DataLoader(batch_load_fn, default=default, peers=self.for_model(model).keys))
+        return self._loaders[key]
+
+    def get(self, key, factory):
+        """Return the loader registered under ``key``, creating it with ``factory()``."""
+        if key not in self._loaders:
+            self._register(key, factory())
+        return self._loaders[key]
+
+    def prime(self, instances, selected=None):
+        """Queue relation keys of ``instances`` for the fields in ``selected``."""
+        if not instances:
+            return
+        meta = instances[0]._meta
+        for name in selected if selected is not None else ():
+            try:
+                field = meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if not field.is_relation or field.many_to_many:
+                continue
+            if field.concrete:
+                self.for_model(field.related_model).prime(
+                    getattr(obj, field.attname) for obj in instances
+                )
+            else:
+                self.for_relation(meta.model, name).prime(obj.pk for obj in instances)
+        for obj in instances:
+            self.for_model(meta.model).prime_value(obj.pk, obj)
+
+
+def get_loaders(info):
+    """Return the request's ``LoaderRegistry``, attaching one on first use."""
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = LoaderRegistry()
+        try:
+            context.loaders = loaders
+        except AttributeError:
+            pass
+    return loaders
+
+
+def is_async(info):
+    """True when the operation is executed on the event loop by the ASGI view."""
+    return get_loaders(info).asynchronous
+
+
+def then(value, fn):
+    """Apply ``fn`` to ``value``, awaiting it first if a loader returned an awaitable."""
+    if inspect.isawaitable(value):
+        async def chained():
+            return fn(await value)
+        return chained()
+    return fn(value)
+
+
+def selected_fields(info, *path):
+    """
+    Snake-cased names of the fields selected under the current field.
+
+    ``path`` descends into nested selections first, e.g. ``("node",)`` from a
+    connection's ``edges`` field.
+    """
+    names = set()
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                names.add(to_snake_case(selection.name.value))
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+                if fragment is not None:
+                    collect(fragment.selection_set)
+
+    def descend(selection_sets, name):
+        found = []
+        for selection_set in selection_sets:
+            for selection in selection_set.selections if selection_set else ():
+                if isinstance(selection, FieldNode):
+                    if to_snake_case(selection.name.value) == name:
+                        found.append(selection.selection_set)
+                elif isinstance(selection, InlineFragmentNode):
+                    found.extend(descend([selection.selection_set], name))
+                elif isinstance(selection, FragmentSpreadNode):
+                    fragment = info.fragments.get(selection.name.value)
+                    if fragment is not None:
+                        found.extend(descend([fragment.selection_set], name))
+        return found
+
+    selection_sets = [node.selection_set for node in info.field_nodes]
+    for name in path:
+        selection_sets = descend(selection_sets, name)
+    for selection_set in selection_sets:
+        collect(selection_set)
+    return names
+
+
+class LoaderMiddleware:
+    """Primes the request's loaders with every model instance a resolver returns."""
+
+    def resolve(self, next, root, info, **args):
+        result = next(root, info, **args)
+        if inspect.isawaitable(result) or (isinstance(result, QuerySet) and is_async(info)):
+            return self._aprime(result, info)
+        if isinstance(result, QuerySet):
+            result = list(result)
+        return self._prime(result, info)
+
+    async def _aprime(self, result, info):
+        if inspect.isawaitable(result):
+            result = await result
+        if isinstance(result, QuerySet):
+            result = [obj async for obj in result]
+        return self._prime(result, info)
+
+    def _prime(self, result, info):
+        if isinstance(result, models.Model):
+            get_loaders(info).prime([result], selected_fields(info))
+        elif isinstance(result, list) and result:
+            if isinstance(result[0], models.Model):
+                get_loaders(info).prime(result, selected_fields(info))
+            elif isinstance(getattr(result[0], "node", None), models.Model):
+                # connection edges: prime the nodes with the fields selected under `node`
+                nodes = [edge.node for edge in result]
+                get_loaders(info).prime(nodes, selected_fields(info, "node"))
+        return result
+
+
+def _batched_relation_resolver(name):
+    def resolver(root, info, **kwargs):
+        return get_loaders(info).for_relation(type(root), name).load(root.pk)
+    return resolver
+
+
+class BatchedDjangoObjectType(DjangoObjectType):
+    """
+    DjangoObjectType whose relation fields resolve through the request loaders.
+
+    Forward FK and one-to-one fields pointing at a batched type go through
+    ``get_node``; reverse relations get a batched ``resolve_<name>`` unless the
+    subclass defines its own.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def __init_subclass_with_meta__(cls, **options):
+        super().__init_subclass_with_meta__(**options)
+        for name in cls._meta.fields:
+            try:
+                field = cls._meta.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.is_relation and not field.concrete and not field.many_to_many:
+                if not hasattr(cls, f"resolve_{name}"):
+                    setattr(cls, f"resolve_{name}", staticmethod(_batched_relation_resolver(name)))
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        return queryset
+
+    @classmethod
+    def get_node(cls, info, id):
+        return get_loaders(info).for_model(cls._meta.model).load(id)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from feed import benchmark
+
+# subscriptions are not benchmarked; keep mutations from needing Redis
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+COLUMNS = ("operation", "runs", "p50_ms", "p95_ms", "p99_ms", "ops_per_s", "queries_avg", "queries_max", "budget")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset into a throwaway test database and report latency, throughput and "
+        "SQL queries of the canonical GraphQL operations; fails when one exceeds its query budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--likes", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=2000)
+        parser.add_argument("--iterations", type=int, default=200, help="Executions of each operation.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic dataset.")
+        parser.add_argument(
+            "--operation", action="append", dest="operations",
+            choices=[name for name, _, _ in benchmark.OPERATIONS], help="Only run this operation (repeatable).",
+        )
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs.")
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options["keepdb"])
+        try:
+            with override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS):
+                data = benchmark.seed(
+                    options["users"], options["posts"], options["likes"], options["comments"], options["follows"],
+                    rng_seed=options["seed"],
+                )
+                results = benchmark.run(data, options["iterations"], options["operations"])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+
+        self.stdout.write(f"{COLUMNS[0]:<16}" + "".join(f"{column:>12}" for column in COLUMNS[1:]))
+        for result in results:
+            row = result.row()
+            self.stdout.write(f"{row[COLUMNS[0]]:<16}" + "".join(f"{row[column]!s:>12}" for column in COLUMNS[1:]))
+
+        failed = [result for result in results if result.failed]
+        for result in failed:
+            if result.over_budget:
+                self.stderr.write(f"{result.name}: {result.max_queries} queries, budget {result.budget}")
+            for error in sorted(set(result.errors)):
+                self.stderr.write(f"{result.name}: {error}")
+        if failed:
+            raise CommandError(f"{len(failed)} operation(s) failed")
+        self.stdout.write(self.style.SUCCESS("All operations within their query budgets"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from feed import snapshot
+
+
+class Command(BaseCommand):
+    help = "Stream users, posts, comments, likes, shares, follows and media into a msgpack snapshot directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory that receives one .msgpack file per model.")
+        parser.add_argument(
+            "--model", action="append", dest="models", choices=snapshot.MODELS,
+            help="Only export this model (repeatable).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per database round trip.")
+        parser.add_argument("--workers", type=int, default=1, help="Models exported in parallel.")
+
+    def handle(self, *args, **options):
+        exported = snapshot.export_snapshot(
+            options["directory"], options["models"], options["chunk_size"], options["workers"]
+        )
+        for label, rows in exported.items():
+            self.stdout.write(f"{label}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Exported {sum(exported.values())} rows"))
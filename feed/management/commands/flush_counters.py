@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feed import counters
+
+
+class Command(BaseCommand):
+    help = "Fold buffered like/comment/share/post counter deltas into their columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep flushing every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=None, help="Seconds between flushes with --loop.")
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or counters.flush_interval() or 5
+        while True:
+            updated = counters.flush(options["batch_size"])
+            if options["verbosity"] > 1 or not options["loop"]:
+                self.stdout.write(f"Flushed counters for {len(updated)} rows")
+            if not options["loop"]:
+                return
+            time.sleep(interval)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed import snapshot
+
+
+class Command(BaseCommand):
+    help = "Load a snapshot written by export_feed (COPY on PostgreSQL) and rebuild the counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory written by export_feed.")
+        parser.add_argument(
+            "--model", action="append", dest="models", choices=snapshot.MODELS,
+            help="Only import this model (repeatable).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows written per statement.")
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Models of one dependency level imported in parallel.",
+        )
+        parser.add_argument(
+            "--skip-reconcile", action="store_true", help="Do not rebuild the counters after importing.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            imported = snapshot.import_snapshot(
+                options["directory"], options["models"], options["chunk_size"], options["workers"],
+                reconcile=not options["skip_reconcile"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        for label, rows in imported.items():
+            self.stdout.write(f"{label}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Imported {sum(imported.values())} rows"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly post/comment partitions and archive the expired ones (PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ahead", type=int, default=None, help="Months of partitions to create ahead.")
+        parser.add_argument(
+            "--retain", type=int, default=None,
+            help="Months of partitions to keep attached; older ones are archived (0 keeps all).",
+        )
+        parser.add_argument("--archive-schema", default=None, help="Schema that receives detached partitions.")
+
+    def handle(self, *args, **options):
+        if not all(partitions.is_partitioned(table) for table in partitions.PARTITIONED_TABLES):
+            raise CommandError("Posts and comments are only partitioned on PostgreSQL (see migration 0006).")
+        for name in partitions.ensure_partitions(options["ahead"]):
+            self.stdout.write(f"Created {name}")
+        for name in partitions.archive_partitions(options["retain"], options["archive_schema"]):
+            self.stdout.write(f"Archived {name}")
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date"))
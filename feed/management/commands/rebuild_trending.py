@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from feed import trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the trending ranking from the counters of recent posts (for the shared Redis store)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Only rank posts created in the last N days.")
+
+    def handle(self, *args, **options):
+        ranked = trending.rebuild(options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Ranked {ranked} posts"))
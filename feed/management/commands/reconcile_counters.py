@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from feed import counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild every denormalized counter from PostLike, Comment, PostShare, Post and Follow rows."
+
+    def handle(self, *args, **options):
+        counters.reconcile()
+        self.stdout.write(self.style.SUCCESS("Counters reconciled"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from feed import jobs, media
+
+
+class Command(BaseCommand):
+    help = "Queue media whose processing job was lost (PROCESSING for longer than FEED_MEDIA_STALE_AFTER) again."
+
+    def handle(self, *args, **options):
+        stale = media.requeue_stale()
+        if isinstance(jobs.get_queue(), jobs.MemoryJobQueue):
+            # this process's queue dies with it: process them here
+            jobs.run_pending()
+        self.stdout.write(f"Requeued {len(stale)} media")
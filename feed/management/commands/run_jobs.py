@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from feed import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (timeline fan-out, search indexing, counter flushes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=None, help="Seconds between polls with --loop.")
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many jobs.")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or jobs.poll_interval()
+        while True:
+            done = jobs.run_pending(options["limit"])
+            if options["verbosity"] > 1 or not options["loop"]:
+                self.stdout.write(f"Ran {done} jobs")
+            if not options["loop"]:
+                return
+            if not done:
+                time.sleep(interval)
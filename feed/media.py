@@ -0,0 +1,208 @@
+"""
+Direct media uploads and background image variants.
+
+Uploading takes three steps, and the file never passes through the web
+workers:
+
+1. ``requestMediaUpload(postId, contentType, size)`` creates a ``PENDING``
+   ``Media`` for the post and returns where to send the file. The
+   ``FEED_MEDIA_UPLOADER`` decides where: ``S3Uploader`` presigns a ``POST``
+   to the S3 (or MinIO) bucket of ``default_storage``; ``LocalUploader``, for
+   development and tests, signs a ``PUT`` to ``/uploads/<token>/`` that
+   streams into ``default_storage``.
+2. The client uploads the file there within ``FEED_MEDIA_UPLOAD_EXPIRES``
+   seconds; the URL only accepts the declared content type and size.
+3. ``completeMediaUpload(mediaId)`` checks that the file arrived and queues
+   a ``media.process`` background job (see ``feed.jobs``), retried on errors.
+
+The job has Pillow write a JPEG next to the original for every
+``FEED_MEDIA_VARIANTS`` entry (name -> longest side in pixels); the
+``thumbnail`` variant also becomes ``Media.thumbnail``. The media is then
+``READY``, or ``FAILED`` if the file is not an image Pillow can read. Videos
+are served as uploaded. Media whose job was lost, e.g. with the process that
+held it, stay ``PROCESSING``: ``manage.py requeue_media`` queues those older
+than ``FEED_MEDIA_STALE_AFTER`` seconds again. Until a media is ``READY`` only
+the post's author sees it on ``Post.media``.
+"""
+import io
+import logging
+import posixpath
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+from . import cache as feed_cache, jobs
+from .models import Media
+
+logger = logging.getLogger(__name__)
+
+# accepted content types -> (media type, file extension)
+CONTENT_TYPES = {
+    "image/jpeg": (Media.IMAGE, "jpg"),
+    "image/png": (Media.IMAGE, "png"),
+    "image/webp": (Media.IMAGE, "webp"),
+    "image/gif": (Media.IMAGE, "gif"),
+    "video/mp4": (Media.VIDEO, "mp4"),
+    "video/quicktime": (Media.VIDEO, "mov"),
+}
+
+
+def max_upload_bytes():
+    return getattr(settings, "FEED_MEDIA_MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+
+
+def upload_expires():
+    return getattr(settings, "FEED_MEDIA_UPLOAD_EXPIRES", 900)
+
+
+def variants():
+    return getattr(settings, "FEED_MEDIA_VARIANTS", {"thumbnail": 320, "medium": 1080})
+
+
+def stale_after():
+    return getattr(settings, "FEED_MEDIA_STALE_AFTER", 600)
+
+
+@dataclass
+class Upload:
+    """Where and how the client sends the file."""
+
+    url: str
+    method: str
+    fields: dict
+    headers: dict
+    expires_at: datetime
+
+
+def _expires_at():
+    return datetime.now(timezone.utc) + timedelta(seconds=upload_expires())
+
+
+class LocalUploader:
+    """Signed ``PUT`` URLs served by ``feed.views.upload``; stands in for object storage."""
+
+    salt = "feed.media.upload"
+
+    def presign(self, key, content_type, size):
+        token = signing.dumps({"key": key, "type": content_type, "size": size}, salt=self.salt)
+        return Upload(
+            url=reverse("media_upload", args=[token]),
+            method="PUT",
+            fields={},
+            headers={"Content-Type": content_type},
+            expires_at=_expires_at(),
+        )
+
+    def grant(self, token):
+        """The upload a token allows; raises ``signing.BadSignature`` once expired."""
+        return signing.loads(token, salt=self.salt, max_age=upload_expires())
+
+
+class S3Uploader:
+    """Presigned ``POST`` policies for the bucket of django-storages' ``S3Storage``."""
+
+    def presign(self, key, content_type, size):
+        storage = default_storage
+        post = storage.bucket.meta.client.generate_presigned_post(
+            storage.bucket_name,
+            posixpath.join(storage.location, storage.generate_filename(key)),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, size]],
+            ExpiresIn=upload_expires(),
+        )
+        return Upload(url=post["url"], method="POST", fields=post["fields"], headers={}, expires_at=_expires_at())
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_uploader():
+    return _load_backend(getattr(settings, "FEED_MEDIA_UPLOADER", "feed.media.LocalUploader"))
+
+
+def request_upload(post, content_type, size):
+    """Create a pending ``Media`` for ``post``; returns ``(media, Upload)``."""
+    media_type, extension = CONTENT_TYPES[content_type]
+    # a post has one media: an upload that never completed is replaced
+    Media.objects.filter(post=post).exclude(status=Media.READY).delete()
+    media = Media(post=post, type=media_type, status=Media.PENDING)
+    media.key = f"media/{media.pk}/original.{extension}"
+    media.url = default_storage.url(media.key)
+    media.save()
+    return media, get_uploader().presign(media.key, content_type, size)
+
+
+def store(key, content):
+    """Write ``content`` (a ``File``) to ``key`` in ``default_storage``, replacing what is there."""
+    if default_storage.exists(key):
+        default_storage.delete(key)
+    return default_storage.save(key, content)
+
+
+def complete_upload(media):
+    """Queue an uploaded ``media`` for processing once the current transaction commits."""
+    media.status, media.processing_at = Media.PROCESSING, django_timezone.now()
+    Media.objects.filter(pk=media.pk).update(status=media.status, processing_at=media.processing_at)
+    jobs.enqueue("media.process", media.pk, key=media.pk)
+
+
+def requeue_stale():
+    """Queue again the media left ``PROCESSING`` for over ``FEED_MEDIA_STALE_AFTER`` seconds; returns their ids."""
+    cutoff = django_timezone.now() - timedelta(seconds=stale_after())
+    stale = list(Media.objects.filter(status=Media.PROCESSING, processing_at__lt=cutoff).values_list("pk", flat=True))
+    if stale:
+        Media.objects.filter(pk__in=stale).update(processing_at=django_timezone.now())
+    for media_id in stale:
+        jobs.enqueue("media.process", media_id, key=media_id)
+    return stale
+
+
+@jobs.handler("media.process")
+def _process_job(media_ids):
+    # media already processed by an earlier attempt of the batch are skipped
+    for media_id in media_ids:
+        process(media_id)
+
+
+def _render(image, size):
+    variant = image.copy()
+    variant.thumbnail((size, size))
+    if variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+    buffer = io.BytesIO()
+    variant.save(buffer, "JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def process(media_id):
+    """Render the variants of an uploaded media and mark it ``READY`` (or ``FAILED``)."""
+    media = Media.objects.filter(pk=media_id, status=Media.PROCESSING).first()
+    if media is None:
+        return
+    urls = {}
+    if media.type == Media.IMAGE:
+        try:
+            with default_storage.open(media.key) as original:
+                image = ImageOps.exif_transpose(Image.open(original))
+                image.load()
+            for name, size in variants().items():
+                key = posixpath.join(posixpath.dirname(media.key), f"{name}.jpg")
+                key = store(key, ContentFile(_render(image, size)))
+                urls[name] = default_storage.url(key)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning("Media %s is not a readable image: %s", media.pk, e)
+            Media.objects.filter(pk=media.pk).update(status=Media.FAILED)
+            return
+    Media.objects.filter(pk=media.pk).update(status=Media.READY, variants=urls, thumbnail=urls.get("thumbnail"))
+    feed_cache.data_changed([media.post_id])
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0002_follow_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('target', models.CharField(max_length=64)),
+                ('object_id', models.CharField(max_length=32)),
+                ('field', models.CharField(max_length=32)),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target', 'object_id'], name='feed_counte_target_e0df1b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:22
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# tsvector maintenance only exists on PostgreSQL; other databases search
+# through feed.search.MemorySearchBackend and leave the columns empty.
+SEARCH_TABLES = ("feed_post", "feed_comment")
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(
+            f"CREATE TRIGGER {table}_search_update BEFORE INSERT OR UPDATE OF content ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.english', content)"
+        )
+        schema_editor.execute(f"UPDATE {table} SET search_vector = to_tsvector('pg_catalog.english', content)")
+        schema_editor.execute(f"CREATE INDEX {table}_search_gin ON {table} USING gin (search_vector)")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_gin")
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_search_update ON {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0003_counterdelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
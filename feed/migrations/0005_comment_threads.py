@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:24
+
+import django.db.models.deletion
+import feed.models
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    # existing comments are all top-level; order their paths by creation time
+    Comment = apps.get_model("feed", "Comment")
+    batch = []
+    for comment in Comment.objects.only("pk", "created_at").iterator(chunk_size=2000):
+        comment.path = feed.models.thread_segment(int(comment.created_at.timestamp() * 1_000_000))
+        batch.append(comment)
+        if len(batch) == 2000:
+            Comment.objects.bulk_update(batch, ["path"])
+            batch = []
+    Comment.objects.bulk_update(batch, ["path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0004_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='feed.comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default=feed.models.thread_segment, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'parent', '-created_at'], name='feed_commen_post_id_401257_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='feed_commen_post_id_d5dd9a_idx'),
+        ),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:31
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Rebuilds feed_post and feed_comment as tables range-partitioned by month on
+# created_at (PostgreSQL only; see feed.partitions). The foreign keys pointing
+# at them are dropped first, by the AlterField operations below that run before
+# the rebuild, because PostgreSQL cannot reference a partitioned table by id
+# alone.
+PARTITIONED_TABLES = ("feed_post", "feed_comment")
+MONTHS_AHEAD = 3
+SEARCH_TRIGGER = (
+    "CREATE TRIGGER {table}_search_update BEFORE INSERT OR UPDATE OF content ON {table} "
+    "FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.english', content)"
+)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _months(first, last):
+    """``(start, end)`` of every month from the one holding ``first`` to the one holding ``last``."""
+    first, last = first.astimezone(timezone.utc), last.astimezone(timezone.utc)
+    month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while month <= last:
+        yield month, _add_months(month, 1)
+        month = _add_months(month, 1)
+
+
+def _rebuild(schema_editor, table, partitioned):
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s",
+            [table, f"{table}_pkey"],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(created_at), MAX(created_at) FROM {table}")
+        first, last = cursor.fetchone()
+
+    old = f"{table}_unpartitioned" if partitioned else f"{table}_partitioned"
+    execute(f"ALTER TABLE {table} RENAME TO {old}")
+    execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    execute(f"DROP TRIGGER IF EXISTS {table}_search_update ON {old}")
+    for name, _ in indexes:
+        execute(f"DROP INDEX {name}")
+
+    if partitioned:
+        execute(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+        now = datetime.now(timezone.utc)
+        horizon = _add_months(now, MONTHS_AHEAD)
+        for start, end in _months(min(first or now, now), max(last or now, horizon)):
+            execute(
+                f"CREATE TABLE {table}_p{start:%Y_%m} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    else:
+        execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+
+    execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    execute(f"DROP TABLE {old}")
+    for _, definition in indexes:
+        execute(definition)
+    for name, definition in foreign_keys:
+        execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+    execute(SEARCH_TRIGGER.format(table=table))
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        _rebuild(schema_editor, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        _rebuild(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0005_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='feed.comment'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='feed.post'),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='comment',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='feed.comment'),
+        ),
+        migrations.AlterField(
+            model_name='media',
+            name='post',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='media', to='feed.post'),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='likes', to='feed.post'),
+        ),
+        migrations.AlterField(
+            model_name='postshare',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='shares_on_post', to='feed.post'),
+        ),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='feed.post'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:44
+
+import feed.ids
+import feed.models
+from django.db import migrations
+
+# Turns the 32-character hex primary keys into native uuid columns (see
+# feed.ids). The existing uuid4 hex ids are valid UUIDs, so PostgreSQL casts
+# them in place (USING id::uuid) together with every foreign key column
+# pointing at them; their hex form, used by the API, does not change. On
+# SQLite the column stays char(32) hex.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0006_partition_posts_comments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='counterdelta',
+            name='object_id',
+            field=feed.ids.CompactIDField(),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='media',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postshare',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=feed.ids.CompactIDField(default=feed.models.cuid, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
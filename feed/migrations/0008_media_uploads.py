@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0007_compact_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='READY', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
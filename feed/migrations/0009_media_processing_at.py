@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0008_media_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='processing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,10 +1,23 @@
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
+import time
 import uuid
 
+from .ids import CompactIDField, uuid7
+
 def cuid():
-    return uuid.uuid4().hex
+    return uuid7().hex
+
+# width of one level of Comment.path
+THREAD_SEGMENT_LENGTH = 16
+
+def thread_segment(micros=None):
+    """One fixed-width, time-ordered level of a comment's materialized path."""
+    if micros is None:
+        micros = time.time_ns() // 1000
+    return f"{micros:013x}{uuid.uuid4().hex[:3]}"
 
 class UserManager(BaseUserManager):
     def create_user(self, email, username, name, password=None, **extra_fields):
@@ -22,7 +35,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, username, name, password, **extra_fields)
 
 class User(AbstractBaseUser, PermissionsMixin):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     name = models.CharField(max_length=150)
     username = models.CharField(max_length=150, unique=True)
     email = models.EmailField(unique=True)
@@ -45,7 +58,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.username
 
 class Post(models.Model):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    """
+    Range-partitioned by month on ``created_at`` on PostgreSQL (see
+    ``feed.partitions``), so foreign keys to posts and comments are declared
+    with ``db_constraint=False``.
+    """
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     content = models.TextField(blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -53,6 +71,8 @@ class Post(models.Model):
     likes_count = models.PositiveIntegerField(default=0)
     comments_count = models.PositiveIntegerField(default=0)
     shares_count = models.PositiveIntegerField(default=0)
+    # maintained by a trigger on PostgreSQL, unused elsewhere (see feed.search)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         indexes = [
@@ -64,44 +84,117 @@ class Post(models.Model):
         return f"{self.author.username}: {self.content[:30]}"
 
 class Media(models.Model):
+    """An image or video attached to a post, uploaded directly to storage (see ``feed.media``)."""
     IMAGE = "IMAGE"
     VIDEO = "VIDEO"
     MEDIA_TYPE_CHOICES = [(IMAGE, "Image"), (VIDEO, "Video")]
 
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
-    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name="media")
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    READY = "READY"
+    FAILED = "FAILED"
+    STATUS_CHOICES = [(PENDING, "Pending"), (PROCESSING, "Processing"), (READY, "Ready"), (FAILED, "Failed")]
+
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name="media", db_constraint=False)
     type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
     url = models.URLField()
     thumbnail = models.URLField(blank=True, null=True)
+    # storage name of the uploaded original
+    key = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=READY)
+    # variant name -> URL
+    variants = models.JSONField(default=dict, blank=True)
+    # when processing was last queued, to find media whose job was lost
+    processing_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
 class Comment(models.Model):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    """
+    A comment or a reply. ``path`` is the parent's path plus a segment of
+    this comment's own (see ``feed.comments``), so a subtree is one range scan
+    on ``(post, path)``; top-level comments get a one-segment path by default.
+    """
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     content = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments", db_constraint=False)
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies", db_constraint=False
+    )
+    path = models.CharField(max_length=255, default=thread_segment, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0)
     likes_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "parent", "-created_at"]),
+            models.Index(fields=["post", "path"]),
+        ]
 
 class PostLike(models.Model):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="post_likes")
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="likes")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="likes", db_constraint=False)
 
     class Meta:
         unique_together = ("user", "post")
 
 class CommentLike(models.Model):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comment_likes")
-    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name="likes")
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name="likes", db_constraint=False)
 
     class Meta:
         unique_together = ("user", "comment")
 
 class PostShare(models.Model):
-    id = models.CharField(max_length=32, primary_key=True, default=cuid, editable=False)
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="shares")
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="shares_on_post")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="shares_on_post", db_constraint=False)
     shared_at = models.DateTimeField(auto_now_add=True)
+
+class Follow(models.Model):
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name="followers")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("follower", "followee")
+
+class TimelineEntry(models.Model):
+    """A post materialized into one user's home timeline (fan-out on write)."""
+    id = CompactIDField(primary_key=True, default=cuid, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries", db_constraint=False)
+    # copy of post.created_at so a page is a single index range scan on (owner, created_at)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("owner", "post")
+        indexes = [
+            models.Index(fields=["owner", "-created_at", "-post"]),
+        ]
+
+class CounterDelta(models.Model):
+    """
+    A pending increment of a denormalized counter, e.g. ``Post.likes_count``.
+
+    Rows are insert-only, so concurrent likes never wait on the post's row
+    lock; ``feed.counters.flush`` folds them into the counter columns.
+    """
+    id = models.BigAutoField(primary_key=True)
+    target = models.CharField(max_length=64)
+    object_id = CompactIDField()
+    field = models.CharField(max_length=32)
+    delta = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["target", "object_id"]),
+        ]
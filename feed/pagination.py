@@ -0,0 +1,146 @@
+"""
+Keyset pagination over ``(created_at, id)``.
+
+Cursors are opaque base64 strings holding the sort key of the last row seen,
+so a page is always an index range scan that starts where the previous one
+stopped. Rows inserted after a cursor was issued never shift later pages.
+
+With ``FEED_PARTITION_PRUNE_DAYS`` a page is first read from the rows within
+that many days of its cursor, a range PostgreSQL can prune to the newest
+monthly partitions; older rows are only scanned when the window holds less
+than a page.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+
+
+def max_page_size():
+    return getattr(settings, "FEED_MAX_PAGE_SIZE", 100)
+
+
+def default_page_size():
+    return getattr(settings, "FEED_DEFAULT_PAGE_SIZE", 20)
+
+
+def prune_window():
+    days = getattr(settings, "FEED_PARTITION_PRUNE_DAYS", 0)
+    return timedelta(days=days) if days else None
+
+
+def encode_cursor(obj, field="created_at"):
+    raw = f"{getattr(obj, field).isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        value, pk = raw.split("|", 1)
+        return datetime.fromisoformat(value), pk
+    except (ValueError, UnicodeError):
+        raise GraphQLError("Invalid cursor")
+
+
+def clamp_page_size(first):
+    if first is None:
+        return default_page_size()
+    if first < 0:
+        raise GraphQLError("`first` must be a non-negative integer")
+    return min(first, max_page_size())
+
+
+def keyset_filter(queryset, after, field="created_at", tiebreak="pk"):
+    """Order ``queryset`` newest first and drop everything up to cursor ``after``."""
+    qs = queryset.order_by(f"-{field}", f"-{tiebreak}")
+    if after:
+        value, pk = decode_cursor(after)
+        qs = qs.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, f"{tiebreak}__lt": pk}))
+    return qs
+
+
+def _keyset_scans(queryset, after, field):
+    """The querysets to read in turn for the page after ``after``."""
+    window = prune_window()
+    if window is None:
+        return [keyset_filter(queryset, after, field)]
+    lower = (decode_cursor(after)[0] if after else timezone.now()) - window
+    return [
+        keyset_filter(queryset.filter(**{f"{field}__gte": lower}), after, field),
+        keyset_filter(queryset.filter(**{f"{field}__lt": lower}), None, field),
+    ]
+
+
+def keyset_slice(queryset, first, after=None, field="created_at"):
+    """
+    Return ``(rows, has_next_page)`` for the page after ``after``, newest first.
+
+    ``first`` is used as-is, so callers that expose it to clients should pass
+    it through ``clamp_page_size`` first.
+    """
+    rows = []
+    for qs in _keyset_scans(queryset, after, field):
+        rows += qs[: first + 1 - len(rows)]
+        if len(rows) > first:
+            break
+    return rows[:first], len(rows) > first
+
+
+async def akeyset_slice(queryset, first, after=None, field="created_at"):
+    """``keyset_slice`` through the async ORM."""
+    rows = []
+    for qs in _keyset_scans(queryset, after, field):
+        rows += [row async for row in qs[: first + 1 - len(rows)]]
+        if len(rows) > first:
+            break
+    return rows[:first], len(rows) > first
+
+
+def keyset_slice_many(queryset, fk, keys, first, after=None, field="created_at"):
+    """
+    ``keyset_slice`` for every value of ``fk`` in ``keys`` with one query, as
+    ``{key: (rows, has_next_page)}``: a ``ROW_NUMBER()`` window over ``fk``
+    keeps the first ``first + 1`` rows of each partition.
+    """
+    qs = keyset_filter(queryset.filter(**{f"{fk}__in": keys}), after, field).annotate(
+        keyset_row=Window(RowNumber(), partition_by=[F(fk)], order_by=[F(field).desc(), F("pk").desc()])
+    ).filter(keyset_row__lte=first + 1)
+    grouped = {}
+    for row in qs:
+        grouped.setdefault(getattr(row, fk), []).append(row)
+    return {key: (rows[:first], len(rows) > first) for key, rows in grouped.items()}
+
+
+def connection_from_rows(connection_type, rows, has_next, after=None, field="created_at", cursors=None):
+    """
+    Wrap an already-sliced page of ``rows`` in a Relay ``connection_type``.
+
+    ``cursors`` overrides the default ``(field, pk)`` cursors, for pages that
+    are not ordered by ``field``.
+    """
+    if cursors is None:
+        cursors = [encode_cursor(row, field) for row in rows]
+    edges = [
+        connection_type.Edge(node=row, cursor=cursor) for row, cursor in zip(rows, cursors)
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=has_next,
+            has_previous_page=bool(after),
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+    )
+
+
+def connection_from_keyset(connection_type, queryset, first=None, after=None, field="created_at"):
+    """Build a Relay ``connection_type`` instance for one keyset page."""
+    rows, has_next = keyset_slice(queryset, clamp_page_size(first), after, field)
+    return connection_from_rows(connection_type, rows, has_next, after, field)
@@ -0,0 +1,161 @@
+"""
+Monthly range partitions of ``feed_post`` and ``feed_comment`` on PostgreSQL.
+
+Migration ``0006`` rebuilds both tables as ``PARTITION BY RANGE
+(created_at)`` with one partition per month (``feed_post_p2026_10``) and a
+default partition. PostgreSQL requires the partition key in the primary key,
+so it becomes ``(id, created_at)`` and foreign keys to posts and comments are
+no longer enforced by the database (``db_constraint=False``); Django's
+``on_delete`` still cascades.
+
+``manage.py manage_partitions`` (run daily) creates the partitions of the
+coming ``FEED_PARTITION_AHEAD_MONTHS``; rows that landed in the default
+partition while a month had none are moved into the new partition. With
+``FEED_PARTITION_RETAIN_MONTHS``, detaches older partitions into the
+``FEED_PARTITION_ARCHIVE_SCHEMA`` schema, from where they can be dumped and
+dropped without touching the live tables.
+
+Feed pages read newest first within ``FEED_PARTITION_PRUNE_DAYS`` of their
+cursor (see ``pagination.keyset_slice``), so PostgreSQL only scans the newest
+partitions. Lookups by id alone still probe every attached partition, which
+is one more reason to keep their number bounded.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = ("feed_post", "feed_comment")
+
+_MONTH_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def ahead_months():
+    return getattr(settings, "FEED_PARTITION_AHEAD_MONTHS", 3)
+
+
+def retain_months():
+    return getattr(settings, "FEED_PARTITION_RETAIN_MONTHS", 0)
+
+
+def archive_schema():
+    return getattr(settings, "FEED_PARTITION_ARCHIVE_SCHEMA", "feed_archive")
+
+
+def month_start(value):
+    """First instant (UTC) of the month holding ``value``."""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def default_partition(table):
+    return f"{table}_default"
+
+
+def partition_month(name):
+    """The month a partition named by ``partition_name`` covers, or None."""
+    match = _MONTH_SUFFIX.search(name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(table):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def attached_partitions(table):
+    """Names of the partitions currently attached to ``table``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND p.relnamespace = current_schema()::regnamespace ORDER BY c.relname",
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(table, month):
+    """
+    Create the partition of ``month``. PostgreSQL refuses to while the default
+    partition holds rows of that month, so the default is then detached, its
+    rows of the month moved to the new partition, and attached again.
+    """
+    quote = connection.ops.quote_name
+    name, default = quote(partition_name(table, month)), quote(default_partition(table))
+    bounds = [month, add_months(month, 1)]
+    in_month = "created_at >= %s AND created_at < %s"
+    with transaction.atomic(), connection.cursor() as cursor:
+        stranded = default_partition(table) in attached_partitions(table)
+        if stranded:
+            cursor.execute(f"SELECT 1 FROM {default} WHERE {in_month} LIMIT 1", bounds)
+            stranded = cursor.fetchone() is not None
+        if stranded:
+            cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {default}")
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)", bounds
+        )
+        if stranded:
+            cursor.execute(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}", bounds)
+            cursor.execute(f"DELETE FROM {default} WHERE {in_month}", bounds)
+            cursor.execute(f"ALTER TABLE {quote(table)} ATTACH PARTITION {default} DEFAULT")
+
+
+def ensure_partitions(ahead=None, now=None):
+    """Create the partitions from this month to ``ahead`` months out; returns the new ones."""
+    ahead = ahead_months() if ahead is None else ahead
+    current = month_start(now or timezone.now())
+    created = []
+    for table in PARTITIONED_TABLES:
+        existing = set(attached_partitions(table))
+        for offset in range(ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(table, month) not in existing:
+                create_partition(table, month)
+                created.append(partition_name(table, month))
+    return created
+
+
+def archive_partitions(retain=None, schema=None, now=None):
+    """
+    Detach the partitions of months more than ``retain`` months back and move
+    them to ``schema``; returns their names. ``retain=0`` keeps everything.
+    """
+    retain = retain_months() if retain is None else retain
+    if not retain:
+        return []
+    schema = schema or archive_schema()
+    cutoff = add_months(month_start(now or timezone.now()), -retain)
+    quote = connection.ops.quote_name
+    archived = []
+    for table in PARTITIONED_TABLES:
+        for name in attached_partitions(table):
+            month = partition_month(name)
+            if month is None or month >= cutoff:
+                continue
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {quote(schema)}")
+                cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"ALTER TABLE {quote(name)} SET SCHEMA {quote(schema)}")
+            archived.append(f"{schema}.{name}")
+    return archived
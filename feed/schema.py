@@ -1,29 +1,197 @@
 import graphene
+from asgiref.sync import sync_to_async
 import graphql_jwt
-from graphene_django import DjangoObjectType
+from django.conf import settings
 from django.db import transaction, models
+from graphene_django.converter import convert_django_field, convert_field_to_id
+from graphene.types.generic import GenericScalar
 from graphql import GraphQLError
-from graphql_jwt.decorators import login_required
-from .models import User, Post, PostLike, Comment
+from graphql_jwt.decorators import login_required, staff_member_required
+from django.core.files.storage import default_storage
+from . import cache as feed_cache, counters, events, media, search, trending
+from .ids import CompactIDField, canonical_id
+from .comments import build_comment, comment_pages, like_comment, liked_comment_ids, subtrees, unlike_comment
+from .likes import like_post, like_posts, liked_post_ids, unlike_post
+from .loaders import BatchedDjangoObjectType, DataLoader, get_loaders, is_async, selected_fields, then
+from .models import User, Post, PostShare, Comment, Follow, Media
+from .pagination import akeyset_slice, clamp_page_size, connection_from_rows, keyset_slice
+from .timeline import fan_out_later, home_feed_page, on_follow, on_unfollow, retract_later
 
 # ----------------------
 # GraphQL Types
 # ----------------------
 
-class UserType(DjangoObjectType):
+# ids are exposed as ID in their 32-character hex form, not as UUID
+convert_django_field.register(CompactIDField)(convert_field_to_id)
+
+class UserType(BatchedDjangoObjectType):
     class Meta:
         model = User
-        fields = ("id", "username", "email", "posts_count")
+        fields = ("id", "username", "email", "posts_count", "followers_count", "following_count")
+
+    resolve_posts_count = staticmethod(counters.counter_resolver("posts_count"))
 
-class PostType(DjangoObjectType):
+class PostType(BatchedDjangoObjectType):
     class Meta:
         model = Post
-        fields = ("id", "author", "content", "likes_count", "comments_count", "shares_count", "created_at", "updated_at")
+        fields = (
+            "id", "author", "content", "media", "likes_count", "comments_count", "shares_count", "created_at",
+            "updated_at",
+        )
+
+    resolve_likes_count = staticmethod(counters.counter_resolver("likes_count"))
+    resolve_comments_count = staticmethod(counters.counter_resolver("comments_count"))
+    resolve_shares_count = staticmethod(counters.counter_resolver("shares_count"))
+
+    viewer_has_liked = graphene.Boolean()
+    comments = graphene.Field(lambda: CommentConnection, first=graphene.Int(), after=graphene.String())
+    # declared so that it resolves through the request loaders
+    media = graphene.Field(lambda: MediaType)
+
+    def resolve_viewer_has_liked(root, info):
+        user = getattr(info.context, "user", None)
+        if user is None or not user.is_authenticated:
+            return False
+        loader = get_loaders(info).for_peers(
+            Post, "viewer_has_liked", lambda keys: liked_post_ids(user, keys), default=False
+        )
+        return loader.load(root.pk)
+
+    def resolve_comments(root, info, first=None, after=None):
+        return _comment_page(info, Post, "post_id", root.pk, first, after)
+
+    def resolve_media(root, info):
+        user = getattr(info.context, "user", None)
+        is_author = user is not None and user.is_authenticated and root.author_id == user.pk
+
+        # uploads still pending, processing or failed are the author's business
+        def visible(media):
+            return media if media is None or media.status == Media.READY or is_author else None
+
+        return then(get_loaders(info).for_relation(Post, "media").load(root.pk), visible)
+
+class MediaType(BatchedDjangoObjectType):
+    class Meta:
+        model = Media
+        fields = ("id", "post", "type", "status", "url", "thumbnail", "variants", "created_at")
+
+
+class MediaUploadType(graphene.ObjectType):
+    media = graphene.Field(MediaType)
+    url = graphene.String()
+    method = graphene.String()
+    # form fields to send with a POST upload, before the file
+    fields = GenericScalar()
+    headers = GenericScalar()
+    expires_at = graphene.DateTime()
 
-class CommentType(DjangoObjectType):
+
+class CommentType(BatchedDjangoObjectType):
     class Meta:
         model = Comment
-        fields = ("id", "post", "author", "content", "created_at")
+        fields = ("id", "post", "author", "parent", "content", "depth", "likes_count", "created_at")
+
+    resolve_likes_count = staticmethod(counters.counter_resolver("likes_count"))
+
+    viewer_has_liked = graphene.Boolean()
+    replies = graphene.Field(lambda: CommentConnection, first=graphene.Int(), after=graphene.String())
+    # every reply below this comment, in thread order
+    thread = graphene.List(lambda: CommentType)
+
+    def resolve_viewer_has_liked(root, info):
+        user = getattr(info.context, "user", None)
+        if user is None or not user.is_authenticated:
+            return False
+        loader = get_loaders(info).for_peers(
+            Comment, "viewer_has_liked", lambda keys: liked_comment_ids(user, keys), default=False
+        )
+        return loader.load(root.pk)
+
+    def resolve_replies(root, info, first=None, after=None):
+        return _comment_page(info, Comment, "parent_id", root.pk, first, after)
+
+    def resolve_thread(root, info):
+        loaders = get_loaders(info)
+        comments = loaders.for_model(Comment)
+        selected = selected_fields(info)
+
+        def batch(keys):
+            found = subtrees(keys)
+            loaders.prime([comment for thread in found.values() for comment in thread], selected)
+            return found
+
+        loader = loaders.get(
+            ("feed.Comment", "thread"),
+            lambda: DataLoader(batch, default=list, peers=lambda: [(c.post_id, c.path) for c in comments.values()]),
+        )
+        return loader.load((root.post_id, root.path))
+
+
+class CommentConnection(graphene.relay.Connection):
+    class Meta:
+        node = CommentType
+
+
+def _comment_page(info, model, fk, key, first, after):
+    """
+    A page of comments under ``key``, fetched together with the same page
+    for every other ``model`` instance loaded in the request. All fetched
+    comments are primed at once, so their own fields batch across pages too.
+    """
+    first = clamp_page_size(first)
+    loaders = get_loaders(info)
+    selected = selected_fields(info, "edges", "node")
+
+    def batch(keys):
+        pages = comment_pages(fk, keys, first, after)
+        loaders.prime([comment for rows, _ in pages.values() for comment in rows], selected)
+        return pages
+
+    loader = loaders.get(
+        ("feed.Comment", fk, first, after),
+        lambda: DataLoader(batch, default=lambda: ([], False), peers=loaders.for_model(model).keys),
+    )
+    return then(loader.load(key), lambda page: connection_from_rows(CommentConnection, *page, after))
+
+
+class PostConnection(graphene.relay.Connection):
+    class Meta:
+        node = PostType
+
+
+class BulkPostResult(graphene.ObjectType):
+    index = graphene.Int()
+    ok = graphene.Boolean()
+    error = graphene.String()
+    post = graphene.Field(PostType)
+
+
+class BulkLikeResult(graphene.ObjectType):
+    index = graphene.Int()
+    ok = graphene.Boolean()
+    error = graphene.String()
+    post_id = graphene.ID()
+    likes_count = graphene.Int()
+
+
+class BulkCommentResult(graphene.ObjectType):
+    index = graphene.Int()
+    ok = graphene.Boolean()
+    error = graphene.String()
+    comment = graphene.Field(CommentType)
+
+
+class CommentInput(graphene.InputObjectType):
+    post_id = graphene.ID(required=True)
+    content = graphene.String(required=True)
+    parent_id = graphene.ID()
+
+
+class FeedCacheStatsType(graphene.ObjectType):
+    hits = graphene.Int()
+    misses = graphene.Int()
+    evictions = graphene.Int()
+    size = graphene.Int()
 
 
 # ----------------------
@@ -40,8 +208,12 @@ class CreatePost(graphene.Mutation):
     def mutate(self, info, content):
         user = info.context.user
         post = Post.objects.create(author=user, content=content)
-        # Increment user post count
-        User.objects.filter(pk=user.pk).update(posts_count=models.F('posts_count') + 1)
+        counters.incr(User, user.pk, "posts_count", 1)
+        fan_out_later([post])
+        feed_cache.post_created(post)
+        feed_cache.data_changed(users=True)
+        search.index_posts_later([post])
+        events.posts_created([post])
         return CreatePost(post=post)
 
 
@@ -63,6 +235,9 @@ class UpdatePost(graphene.Mutation):
             raise GraphQLError("Not authorized to update this post")
         post.content = content
         post.save()
+        feed_cache.post_updated(post)
+        feed_cache.data_changed([post.pk])
+        search.index_posts_later([post])
         return UpdatePost(post=post)
 
 
@@ -82,8 +257,13 @@ class DeletePost(graphene.Mutation):
         if post.author != user:
             raise GraphQLError("Not authorized to delete this post")
         with transaction.atomic():
+            retract_later(post)
             post.delete()
-            User.objects.filter(pk=user.pk).update(posts_count=models.F('posts_count') - 1)
+            counters.incr(User, user.pk, "posts_count", -1)
+        feed_cache.post_deleted(post_id)
+        feed_cache.data_changed([post_id], users=True)
+        trending.post_deleted(post_id)
+        search.post_deleted_later(post_id)
         return DeletePost(ok=True)
 
 
@@ -96,19 +276,14 @@ class LikePost(graphene.Mutation):
 
     @login_required
     def mutate(self, info, post_id):
-        user = info.context.user
+        # Idempotent: liking an already liked post just returns the count
         try:
-            post = Post.objects.get(pk=post_id)
+            changed, likes_count = like_post(info.context.user, post_id)
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
-        # Check if already liked
-        if PostLike.objects.filter(post=post, user=user).exists():
-            raise GraphQLError("Already liked")
-        with transaction.atomic():
-            PostLike.objects.create(post=post, user=user)
-            Post.objects.filter(pk=post_id).update(likes_count=models.F('likes_count') + 1)
-        post.refresh_from_db()
-        return LikePost(ok=True, likes_count=post.likes_count)
+        if changed:
+            feed_cache.data_changed([post_id])
+        return LikePost(ok=True, likes_count=likes_count)
 
 
 class UnlikePost(graphene.Mutation):
@@ -120,19 +295,13 @@ class UnlikePost(graphene.Mutation):
 
     @login_required
     def mutate(self, info, post_id):
-        user = info.context.user
         try:
-            post = Post.objects.get(pk=post_id)
+            changed, likes_count = unlike_post(info.context.user, post_id)
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
-        like = PostLike.objects.filter(post=post, user=user).first()
-        if not like:
-            raise GraphQLError("You haven't liked this post")
-        with transaction.atomic():
-            like.delete()
-            Post.objects.filter(pk=post_id).update(likes_count=models.F('likes_count') - 1)
-        post.refresh_from_db()
-        return UnlikePost(ok=True, likes_count=post.likes_count)
+        if changed:
+            feed_cache.data_changed([post_id])
+        return UnlikePost(ok=True, likes_count=likes_count)
 
 
 class CreateComment(graphene.Mutation):
@@ -141,19 +310,62 @@ class CreateComment(graphene.Mutation):
     class Arguments:
         post_id = graphene.ID(required=True)
         content = graphene.String(required=True)
+        parent_id = graphene.ID()
 
     @login_required
-    def mutate(self, info, post_id, content):
+    def mutate(self, info, post_id, content, parent_id=None):
         user = info.context.user
         try:
             post = Post.objects.get(pk=post_id)
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
-        comment = Comment.objects.create(post=post, author=user, content=content)
-        Post.objects.filter(pk=post_id).update(comments_count=models.F('comments_count') + 1)
+        parent = None
+        if parent_id is not None:
+            parent = Comment.objects.filter(pk=parent_id, post=post).first()
+            if parent is None:
+                raise GraphQLError("Parent comment not found")
+        with transaction.atomic():
+            comment = build_comment(post.pk, user, content, parent)
+            comment.save()
+            counters.incr(Post, post.pk, "comments_count", 1)
+            search.index_comments_later([comment])
+            events.comments_added([comment])
+        feed_cache.data_changed([post.pk])
         return CreateComment(comment=comment)
 
 
+class LikeComment(graphene.Mutation):
+    likes_count = graphene.Int()
+    ok = graphene.Boolean()
+
+    class Arguments:
+        comment_id = graphene.ID(required=True)
+
+    @login_required
+    def mutate(self, info, comment_id):
+        try:
+            _, likes_count = like_comment(info.context.user, comment_id)
+        except Comment.DoesNotExist:
+            raise GraphQLError("Comment not found")
+        return LikeComment(ok=True, likes_count=likes_count)
+
+
+class UnlikeComment(graphene.Mutation):
+    likes_count = graphene.Int()
+    ok = graphene.Boolean()
+
+    class Arguments:
+        comment_id = graphene.ID(required=True)
+
+    @login_required
+    def mutate(self, info, comment_id):
+        try:
+            _, likes_count = unlike_comment(info.context.user, comment_id)
+        except Comment.DoesNotExist:
+            raise GraphQLError("Comment not found")
+        return UnlikeComment(ok=True, likes_count=likes_count)
+
+
 class SharePost(graphene.Mutation):
     shares_count = graphene.Int()
     ok = graphene.Boolean()
@@ -169,34 +381,349 @@ class SharePost(graphene.Mutation):
         except Post.DoesNotExist:
             raise GraphQLError("Post not found")
 
-        # Increment shares count
+        # Record the share so reconcile_counters can rebuild shares_count
+        with transaction.atomic():
+            PostShare.objects.create(post=post, user=user)
+            counters.incr(Post, post.pk, "shares_count", 1)
+        feed_cache.data_changed([post.pk])
+        return SharePost(ok=True, shares_count=counters.value(post, "shares_count"))
+
+
+class FollowUser(graphene.Mutation):
+    user = graphene.Field(UserType)
+    ok = graphene.Boolean()
+
+    class Arguments:
+        user_id = graphene.ID(required=True)
+
+    @login_required
+    def mutate(self, info, user_id):
+        user = info.context.user
+        try:
+            followee = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            raise GraphQLError("User not found")
+        # compare the canonical ids: the client may spell its own differently
+        if followee.pk == user.pk:
+            raise GraphQLError("You cannot follow yourself")
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(follower=user, followee=followee)
+            if not created:
+                raise GraphQLError("Already following")
+            User.objects.filter(pk=user.pk).update(following_count=models.F('following_count') + 1)
+            User.objects.filter(pk=followee.pk).update(followers_count=models.F('followers_count') + 1)
+        on_follow(user, followee)
+        feed_cache.data_changed(users=True)
+        followee.refresh_from_db()
+        return FollowUser(ok=True, user=followee)
+
+
+class UnfollowUser(graphene.Mutation):
+    user = graphene.Field(UserType)
+    ok = graphene.Boolean()
+
+    class Arguments:
+        user_id = graphene.ID(required=True)
+
+    @login_required
+    def mutate(self, info, user_id):
+        user = info.context.user
+        try:
+            followee = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            raise GraphQLError("User not found")
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=user, followee=followee).delete()
+            if not deleted:
+                raise GraphQLError("You are not following this user")
+            User.objects.filter(pk=user.pk).update(following_count=models.F('following_count') - 1)
+            User.objects.filter(pk=followee.pk).update(followers_count=models.F('followers_count') - 1)
+        on_unfollow(user, followee)
+        feed_cache.data_changed(users=True)
+        followee.refresh_from_db()
+        return UnfollowUser(ok=True, user=followee)
+
+
+class RequestMediaUpload(graphene.Mutation):
+    upload = graphene.Field(MediaUploadType)
+
+    class Arguments:
+        post_id = graphene.ID(required=True)
+        content_type = graphene.String(required=True)
+        size = graphene.Int(required=True)
+
+    @login_required
+    def mutate(self, info, post_id, content_type, size):
+        user = info.context.user
+        try:
+            post = Post.objects.get(pk=post_id)
+        except Post.DoesNotExist:
+            raise GraphQLError("Post not found")
+        if post.author_id != user.pk:
+            raise GraphQLError("Not authorized to add media to this post")
+        if content_type not in media.CONTENT_TYPES:
+            raise GraphQLError(f"Unsupported content type {content_type}")
+        if not 0 < size <= media.max_upload_bytes():
+            raise GraphQLError(f"Files must be at most {media.max_upload_bytes()} bytes")
+        if Media.objects.filter(post=post, status=Media.READY).exists():
+            raise GraphQLError("This post already has media")
+        created, upload = media.request_upload(post, content_type, size)
+        feed_cache.data_changed([post.pk])
+        return RequestMediaUpload(upload=MediaUploadType(media=created, **vars(upload)))
+
+
+class CompleteMediaUpload(graphene.Mutation):
+    media = graphene.Field(MediaType)
+
+    class Arguments:
+        media_id = graphene.ID(required=True)
+
+    @login_required
+    def mutate(self, info, media_id):
+        user = info.context.user
+        found = Media.objects.select_related("post").filter(pk=media_id).first()
+        if found is None:
+            raise GraphQLError("Media not found")
+        if found.post.author_id != user.pk:
+            raise GraphQLError("Not authorized to complete this upload")
+        # completing twice is a no-op
+        if found.status == Media.PENDING:
+            if not default_storage.exists(found.key):
+                raise GraphQLError("The file has not been uploaded")
+            media.complete_upload(found)
+            feed_cache.data_changed([found.post_id])
+        return CompleteMediaUpload(media=found)
+
+
+# ----------------------
+# Bulk mutations
+# ----------------------
+
+def check_bulk_size(items):
+    limit = getattr(settings, "FEED_BULK_MAX_ITEMS", 100)
+    if len(items) > limit:
+        raise GraphQLError(f"At most {limit} items are allowed per request")
+
+
+class CreatePosts(graphene.Mutation):
+    results = graphene.List(BulkPostResult)
+
+    class Arguments:
+        contents = graphene.List(graphene.NonNull(graphene.String), required=True)
+
+    @login_required
+    def mutate(self, info, contents):
+        check_bulk_size(contents)
+        if not contents:
+            return CreatePosts(results=[])
+        user = info.context.user
         with transaction.atomic():
-            Post.objects.filter(pk=post_id).update(shares_count=models.F('shares_count') + 1)
-        
-        post.refresh_from_db()
-        return SharePost(ok=True, shares_count=post.shares_count)
+            posts = Post.objects.bulk_create([Post(author=user, content=content) for content in contents])
+            counters.incr(User, user.pk, "posts_count", len(posts))
+        fan_out_later(posts)
+        feed_cache.post_created(posts[0])
+        feed_cache.data_changed(users=True)
+        search.index_posts_later(posts)
+        events.posts_created(posts)
+        return CreatePosts(results=[BulkPostResult(index=i, ok=True, post=post) for i, post in enumerate(posts)])
+
+
+class LikePosts(graphene.Mutation):
+    results = graphene.List(BulkLikeResult)
+
+    class Arguments:
+        post_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
 
+    @login_required
+    def mutate(self, info, post_ids):
+        check_bulk_size(post_ids)
+        canonical = [canonical_id(Post, post_id) for post_id in post_ids]
+        found, changed = like_posts(info.context.user, canonical)
+        if changed:
+            feed_cache.data_changed(changed)
+        posts = Post.objects.in_bulk(list(found))
+        pending = counters.pending_many(Post, list(found))
+        results = []
+        for index, (post_id, pk) in enumerate(zip(post_ids, canonical)):
+            post = posts.get(pk)
+            if post is None:
+                results.append(BulkLikeResult(index=index, ok=False, error="Post not found", post_id=post_id))
+                continue
+            likes_count = post.likes_count + pending.get(pk, {}).get("likes_count", 0)
+            results.append(BulkLikeResult(index=index, ok=True, post_id=post_id, likes_count=likes_count))
+        return LikePosts(results=results)
+
+
+class CreateComments(graphene.Mutation):
+    results = graphene.List(BulkCommentResult)
+
+    class Arguments:
+        comments = graphene.List(graphene.NonNull(CommentInput), required=True)
+
+    @login_required
+    def mutate(self, info, comments):
+        check_bulk_size(comments)
+        user = info.context.user
+        for c in comments:
+            # compare ids in the form the database hands back
+            c.post_id = canonical_id(Post, c.post_id)
+            c.parent_id = c.parent_id and canonical_id(Comment, c.parent_id)
+        found = set(Post.objects.filter(pk__in=[c.post_id for c in comments]).values_list("pk", flat=True))
+        parents = Comment.objects.in_bulk([c.parent_id for c in comments if c.parent_id])
+        errors = {}
+        for i, c in enumerate(comments):
+            if c.post_id not in found:
+                errors[i] = "Post not found"
+            elif c.parent_id and getattr(parents.get(c.parent_id), "post_id", None) != c.post_id:
+                errors[i] = "Parent comment not found"
+        valid = [(i, c) for i, c in enumerate(comments) if i not in errors]
+        with transaction.atomic():
+            created = Comment.objects.bulk_create(
+                [build_comment(c.post_id, user, c.content, parents.get(c.parent_id)) for _, c in valid]
+            )
+            deltas = {}
+            for comment in created:
+                key = (Post, comment.post_id, "comments_count")
+                deltas[key] = deltas.get(key, 0) + 1
+            counters.incr_many(deltas)
+            search.index_comments_later(created)
+            events.comments_added(created)
+        if created:
+            feed_cache.data_changed({comment.post_id for comment in created})
+        by_index = {i: comment for (i, _), comment in zip(valid, created)}
+        results = [
+            BulkCommentResult(index=i, ok=True, comment=by_index[i]) if i in by_index
+            else BulkCommentResult(index=i, ok=False, error=errors[i])
+            for i in range(len(comments))
+        ]
+        return CreateComments(results=results)
 
 
 # ----------------------
 # Queries
 # ----------------------
 
+def _posts_page(first, after):
+    if after:
+        return keyset_slice(Post.objects.all(), first, after)
+    return list(Post.objects.all().order_by('-created_at')[:first]), False
+
+
+async def _aposts_page(first, after):
+    if after:
+        return await akeyset_slice(Post.objects.all(), first, after)
+    return [post async for post in Post.objects.all().order_by('-created_at')[:first]], False
+
+
+def _found(post):
+    if post is None:
+        raise GraphQLError("Post not found")
+    return post
+
+
 class Query(graphene.ObjectType):
-    posts = graphene.List(PostType, first=graphene.Int())
+    posts = graphene.List(PostType, first=graphene.Int(), after=graphene.String())
+    posts_connection = graphene.Field(PostConnection, first=graphene.Int(), after=graphene.String())
+    home_feed = graphene.Field(PostConnection, first=graphene.Int(), after=graphene.String())
+    trending_posts = graphene.Field(PostConnection, first=graphene.Int(), after=graphene.String())
+    search_posts = graphene.Field(
+        PostConnection, query=graphene.String(required=True), first=graphene.Int(), after=graphene.String()
+    )
     post = graphene.Field(PostType, post_id=graphene.ID(required=True))
+    feed_cache_stats = graphene.Field(FeedCacheStatsType)
+
+    # Under the ASGI view (`is_async`) root fields return coroutines that read
+    # through the async ORM; nested fields then batch through async loaders.
+
+    def resolve_posts(self, info, first=None, after=None):
+        first = clamp_page_size(first)
+        if is_async(info):
+            page = feed_cache.acached_page("posts", first, after, lambda: _aposts_page(first, after))
+            return then(page, lambda page: page[0])
+        return feed_cache.cached_page("posts", first, after, lambda: _posts_page(first, after))[0]
+
+    def resolve_posts_connection(self, info, first=None, after=None):
+        first = clamp_page_size(first)
+        if is_async(info):
+            page = feed_cache.acached_page(
+                "connection", first, after, lambda: akeyset_slice(Post.objects.all(), first, after)
+            )
+        else:
+            page = feed_cache.cached_page(
+                "connection", first, after, lambda: keyset_slice(Post.objects.all(), first, after)
+            )
+        return then(page, lambda page: connection_from_rows(PostConnection, *page, after))
 
-    def resolve_posts(self, info, first=None):
-        qs = Post.objects.all().order_by('-created_at')
-        if first:
-            qs = qs[:first]
-        return qs
+    @login_required
+    def resolve_home_feed(self, info, first=None, after=None):
+        first = clamp_page_size(first)
+        if is_async(info):
+            # timeline stores are synchronous; run the merge on the ORM thread
+            page = sync_to_async(home_feed_page)(info.context.user, first, after)
+        else:
+            page = home_feed_page(info.context.user, first, after)
+        return then(page, lambda page: connection_from_rows(PostConnection, *page, after))
+
+    def resolve_trending_posts(self, info, first=None, after=None):
+        first = clamp_page_size(first)
+        if is_async(info):
+            page = sync_to_async(trending.trending_page)(first, after)
+        else:
+            page = trending.trending_page(first, after)
+        return then(
+            page,
+            lambda page: connection_from_rows(PostConnection, page[0], page[2], after, cursors=page[1]),
+        )
+
+    def resolve_search_posts(self, info, query, first=None, after=None):
+        first = clamp_page_size(first)
+        if is_async(info):
+            page = sync_to_async(search.search_posts)(query, first, after)
+        else:
+            page = search.search_posts(query, first, after)
+        return then(
+            page,
+            lambda page: connection_from_rows(PostConnection, page[0], page[2], after, cursors=page[1]),
+        )
 
     def resolve_post(self, info, post_id):
-        try:
-            return Post.objects.get(pk=post_id)
-        except Post.DoesNotExist:
-            raise GraphQLError("Post not found")
+        post = feed_cache.aget_post(post_id) if is_async(info) else feed_cache.get_post(post_id)
+        return then(post, _found)
+
+    @staff_member_required
+    def resolve_feed_cache_stats(self, info):
+        return FeedCacheStatsType(**feed_cache.stats())
+
+
+# ----------------------
+# Subscriptions
+# ----------------------
+
+class Subscription(graphene.ObjectType):
+    """Served over WebSockets by ``feed.consumers.GraphQLConsumer``."""
+
+    post_created = graphene.Field(PostType)
+    post_counters_changed = graphene.Field(PostType, post_id=graphene.ID(required=True))
+    comment_added = graphene.Field(CommentType, post_id=graphene.ID(required=True))
+
+    async def subscribe_post_created(root, info):
+        async for event in info.context.listen(events.POST_CREATED):
+            post = await Post.objects.filter(pk=event["post_id"]).afirst()
+            if post is not None:
+                yield post
+
+    async def subscribe_post_counters_changed(root, info, post_id):
+        group = events.post_group(post_id, "counters")
+        async for _ in info.context.listen(group, interval=events.counter_interval()):
+            post = await Post.objects.filter(pk=post_id).afirst()
+            if post is not None:
+                yield post
+
+    async def subscribe_comment_added(root, info, post_id):
+        async for event in info.context.listen(events.post_group(post_id, "comments")):
+            comment = await Comment.objects.filter(pk=event["comment_id"]).afirst()
+            if comment is not None:
+                yield comment
 
 
 # ----------------------
@@ -210,11 +737,20 @@ class Mutation(graphene.ObjectType):
     like_post = LikePost.Field()
     unlike_post = UnlikePost.Field()
     create_comment = CreateComment.Field()
+    like_comment = LikeComment.Field()
+    unlike_comment = UnlikeComment.Field()
     share_post = SharePost.Field()
+    follow_user = FollowUser.Field()
+    unfollow_user = UnfollowUser.Field()
+    request_media_upload = RequestMediaUpload.Field()
+    complete_media_upload = CompleteMediaUpload.Field()
+    create_posts = CreatePosts.Field()
+    like_posts = LikePosts.Field()
+    create_comments = CreateComments.Field()
     # JWT Auth
     token_auth = graphql_jwt.ObtainJSONWebToken.Field()
     verify_token = graphql_jwt.Verify.Field()
     refresh_token = graphql_jwt.Refresh.Field()
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
@@ -0,0 +1,282 @@
+"""
+Full-text search over posts and their comments.
+
+A post matches when its own content or one of its comments contains every
+word of the query. Results are ranked by relevance, the best of the post's
+own rank and ``COMMENT_WEIGHT`` times its best comment's rank, and paginated
+with ``(rank, id)`` keyset cursors.
+
+Backends, chosen with ``FEED_SEARCH_BACKEND`` (by default from the database
+vendor):
+
+* ``feed.search.PostgresSearchBackend``: ``Post.search_vector`` and
+  ``Comment.search_vector`` are ``tsvector`` columns kept up to date by
+  triggers on insert and on update of ``content``, and indexed with GIN (see
+  migration ``0004``);
+* ``feed.search.MemorySearchBackend``: a per-process inverted index, built
+  from the tables on first use and updated by background jobs afterwards.
+  It is meant for SQLite and tests, and needs the in-process job queue
+  (``feed.jobs.MemoryJobQueue``): a separate ``run_jobs`` worker would
+  update its own index instead of the web workers'.
+
+Only backends that set ``maintains_index`` get indexing jobs.
+"""
+import base64
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+from . import cache as feed_cache, jobs
+from .models import Comment, Post
+
+SEARCH_CONFIG = "english"
+COMMENT_WEIGHT = 0.5
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or that the this to was were "
+    "will with you".split()
+)
+
+
+def encode_cursor(rank, post_id):
+    return base64.urlsafe_b64encode(f"{rank!r}|{post_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, post_id = raw.split("|", 1)
+        return float(rank), post_id
+    except (ValueError, UnicodeError):
+        raise GraphQLError("Invalid cursor")
+
+
+class PostgresSearchBackend:
+    """Ranks with ``ts_rank`` over the GIN-indexed ``search_vector`` columns."""
+
+    # the triggers keep the vectors current
+    maintains_index = False
+
+    def search(self, text, first, after=None):
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        comment_rank = (
+            Comment.objects.filter(post=OuterRef("pk"), search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank")
+            .values("rank")[:1]
+        )
+        qs = (
+            Post.objects.filter(
+                Q(search_vector=query)
+                | Q(pk__in=Comment.objects.filter(search_vector=query).values("post_id"))
+            )
+            .annotate(
+                rank=Greatest(
+                    SearchRank(F("search_vector"), query),
+                    Coalesce(Subquery(comment_rank, output_field=FloatField()), Value(0.0)) * Value(COMMENT_WEIGHT),
+                    output_field=FloatField(),
+                )
+            )
+            .order_by("-rank", "-pk")
+        )
+        if after:
+            rank, pk = decode_cursor(after)
+            qs = qs.filter(Q(rank__lt=rank) | Q(rank=rank, pk__lt=pk))
+        posts = list(qs[: first + 1])
+        return posts[:first], [encode_cursor(post.rank, post.pk) for post in posts[:first]], len(posts) > first
+
+    def index_posts(self, posts):
+        pass
+
+    def index_comments(self, comments):
+        pass
+
+    def post_deleted(self, post_id):
+        pass
+
+
+def tokenize(text):
+    """Lower-cased words without stop words and with a plural ``s`` dropped."""
+    words = []
+    for word in re.findall(r"\w+", text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+class MemorySearchBackend:
+    """
+    Inverted index from term to post and comment ids. A document's rank is
+    ``sum(1 + log(tf))`` over the query terms, so pages are ordered like the
+    Postgres backend's without matching its numbers.
+    """
+
+    maintains_index = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._terms = defaultdict(set)
+        self._docs = {}
+        self._comments_by_post = defaultdict(set)
+
+    def search(self, text, first, after=None):
+        terms = set(tokenize(text))
+        ranks = self._ranks(terms) if terms else {}
+        rows = sorted(((rank, post_id) for post_id, rank in ranks.items()), reverse=True)
+        if after:
+            below = decode_cursor(after)
+            rows = [row for row in rows if row < below]
+        rows = rows[: first + 1]
+        has_next = len(rows) > first
+        rows = rows[:first]
+        posts = feed_cache.get_posts([post_id for _, post_id in rows])
+        page = [(posts[post_id], encode_cursor(rank, post_id)) for rank, post_id in rows if post_id in posts]
+        return [post for post, _ in page], [cursor for _, cursor in page], has_next
+
+    def index_posts(self, posts):
+        docs = [(("post", post.pk), post.pk, post.content) for post in posts]
+        transaction.on_commit(lambda: self._index(docs))
+
+    def index_comments(self, comments):
+        docs = [(("comment", comment.pk), comment.post_id, comment.content) for comment in comments]
+        transaction.on_commit(lambda: self._index(docs))
+
+    def post_deleted(self, post_id):
+        def remove():
+            with self._lock:
+                for key in [("post", post_id), *self._comments_by_post.pop(post_id, ())]:
+                    self._remove(key)
+
+        transaction.on_commit(remove)
+
+    def _ranks(self, terms):
+        self._build()
+        with self._lock:
+            keys = set.intersection(*(self._terms.get(term, set()) for term in terms))
+            ranks = {}
+            for key in keys:
+                post_id, counts = self._docs[key]
+                rank = sum(1 + math.log(counts[term]) for term in terms)
+                if key[0] == "comment":
+                    rank *= COMMENT_WEIGHT
+                ranks[post_id] = max(rank, ranks.get(post_id, 0.0))
+            return ranks
+
+    def _build(self):
+        if self._built:
+            return
+        docs = [(("post", pk), pk, content) for pk, content in Post.objects.values_list("pk", "content").iterator()]
+        docs += [
+            (("comment", pk), post_id, content)
+            for pk, post_id, content in Comment.objects.values_list("pk", "post_id", "content").iterator()
+        ]
+        with self._lock:
+            if not self._built:
+                self._built = True
+                self._add(docs)
+
+    def _index(self, docs):
+        # an index that is not built yet will read these rows when it is
+        with self._lock:
+            if self._built:
+                self._add(docs)
+
+    def _add(self, docs):
+        for key, post_id, content in docs:
+            self._remove(key)
+            counts = Counter(tokenize(content))
+            self._docs[key] = (post_id, counts)
+            for term in counts:
+                self._terms[term].add(key)
+            if key[0] == "comment":
+                self._comments_by_post[post_id].add(key)
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for term in doc[1]:
+            keys = self._terms[term]
+            keys.discard(key)
+            if not keys:
+                del self._terms[term]
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    path = getattr(settings, "FEED_SEARCH_BACKEND", None)
+    if not path:
+        path = (
+            "feed.search.PostgresSearchBackend" if connection.vendor == "postgresql"
+            else "feed.search.MemorySearchBackend"
+        )
+    return _load_backend(path)
+
+
+def search_posts(text, first, after=None):
+    """Return ``(posts, cursors, has_next_page)`` for one page of results."""
+    return get_search_backend().search(text, first, after)
+
+
+def index_posts(posts):
+    get_search_backend().index_posts(posts)
+
+
+def index_comments(comments):
+    get_search_backend().index_comments(comments)
+
+
+def post_deleted(post_id):
+    get_search_backend().post_deleted(post_id)
+
+
+def index_posts_later(posts):
+    """Index ``posts`` in a background job once the mutation commits."""
+    if get_search_backend().maintains_index:
+        for post in posts:
+            jobs.enqueue("search.index_posts", post.pk, key=post.pk)
+
+
+def index_comments_later(comments):
+    if get_search_backend().maintains_index:
+        for comment in comments:
+            jobs.enqueue("search.index_comments", comment.pk, key=comment.pk)
+
+
+def post_deleted_later(post_id):
+    if get_search_backend().maintains_index:
+        jobs.enqueue("search.post_deleted", post_id, key=post_id)
+
+
+@jobs.handler("search.index_posts")
+def _index_posts_job(post_ids):
+    index_posts(list(Post.objects.filter(pk__in=post_ids)))
+
+
+@jobs.handler("search.index_comments")
+def _index_comments_job(comment_ids):
+    index_comments(list(Comment.objects.filter(pk__in=comment_ids)))
+
+
+@jobs.handler("search.post_deleted")
+def _post_deleted_job(post_ids):
+    for post_id in post_ids:
+        post_deleted(post_id)
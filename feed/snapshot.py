@@ -0,0 +1,185 @@
+"""
+Streaming export and import of the social graph (``manage.py export_feed`` /
+``import_feed``).
+
+A snapshot is a directory holding one msgpack stream per model
+(``feed.post.msgpack``): a header ``{"model", "fields", "version"}``
+followed by one array per row, in primary key order. Export reads through
+``QuerySet.iterator(chunk_size)`` (a server-side cursor on PostgreSQL) and
+import writes ``chunk_size`` rows at a time, so memory stays flat whatever
+the size of the tables.
+
+Import loads rows as they were exported, timestamps and ids included: with
+``COPY`` on PostgreSQL, which routes rows to the month partitions and fires
+the search triggers, and with batched ``INSERT`` elsewhere. Counters are
+rebuilt from the imported rows at the end (``counters.reconcile``). Home
+timelines and the trending ranking are not part of a snapshot.
+
+Tables are independent streams, so both commands take ``--workers``: that
+many tables are exported, or imported, at once, each on its own database
+connection. Import goes through ``IMPORT_LEVELS`` in order because users
+must exist before the rows that reference them.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import msgpack
+from django.apps import apps
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, connections, transaction
+
+from . import counters
+
+FORMAT_VERSION = 1
+
+# every level only references the levels before it (or itself, without a
+# database constraint)
+IMPORT_LEVELS = [
+    ["feed.User"],
+    ["feed.Post", "feed.Follow"],
+    ["feed.Media", "feed.Comment", "feed.PostLike", "feed.PostShare"],
+    ["feed.CommentLike"],
+]
+
+MODELS = [label for level in IMPORT_LEVELS for label in level]
+
+
+def snapshot_path(directory, label):
+    return os.path.join(directory, f"{label.lower()}.msgpack")
+
+
+def export_fields(model):
+    # search vectors are derived from the content by triggers
+    return [field for field in model._meta.concrete_fields if not isinstance(field, SearchVectorField)]
+
+
+def export_model(label, directory, chunk_size=2000):
+    """Stream every row of ``label`` into its file; returns the row count."""
+    model = apps.get_model(label)
+    fields = export_fields(model)
+    packer = msgpack.Packer(datetime=True)
+    rows = 0
+    with open(snapshot_path(directory, label), "wb") as out:
+        out.write(packer.pack({
+            "model": model._meta.label, "fields": [field.attname for field in fields], "version": FORMAT_VERSION,
+        }))
+        queryset = model._base_manager.order_by("pk").values_list(*[field.attname for field in fields])
+        for row in queryset.iterator(chunk_size=chunk_size):
+            out.write(packer.pack(row))
+            rows += 1
+    return rows
+
+
+def _read(path):
+    with open(path, "rb") as stream:
+        unpacker = msgpack.Unpacker(stream, raw=False, timestamp=3)
+        header = next(unpacker)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported snapshot version {header.get('version')}")
+        yield header
+        yield from unpacker
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy_text(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    if hasattr(value, "adapted"):
+        # a JSON value wrapped for psycopg2
+        value = value.dumps(value.adapted)
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    cursor.copy_expert(f"COPY {quote(table)} ({', '.join(quote(c) for c in columns)}) FROM STDIN", buffer)
+
+
+def _insert(cursor, table, columns, rows):
+    quote = connection.ops.quote_name
+    cursor.executemany(
+        f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})",
+        rows,
+    )
+
+
+def import_model(label, directory, chunk_size=2000):
+    """Load the rows of ``label`` from its file; returns the row count."""
+    model = apps.get_model(label)
+    stream = _read(snapshot_path(directory, label))
+    header = next(stream)
+    by_attname = {field.attname: field for field in model._meta.concrete_fields}
+    unknown = [name for name in header["fields"] if name not in by_attname]
+    if unknown:
+        raise ValueError(f"{label}: the snapshot has unknown fields {unknown}")
+    fields = [by_attname[name] for name in header["fields"]]
+    columns = [field.column for field in fields]
+    load = _copy if connection.vendor == "postgresql" else _insert
+
+    rows = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for chunk in _chunks(stream, chunk_size):
+            prepared = [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] for row in chunk
+            ]
+            load(cursor, model._meta.db_table, columns, prepared)
+            rows += len(chunk)
+    return rows
+
+
+def _in_worker(function, *args):
+    try:
+        return function(*args)
+    finally:
+        # worker threads open their own connections
+        connections.close_all()
+
+
+def _run(function, labels, directory, chunk_size, workers):
+    if workers <= 1:
+        return {label: function(label, directory, chunk_size) for label in labels}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {label: pool.submit(_in_worker, function, label, directory, chunk_size) for label in labels}
+        return {label: future.result() for label, future in futures.items()}
+
+
+def export_snapshot(directory, labels=None, chunk_size=2000, workers=1):
+    """Export ``labels`` (default: ``MODELS``); returns ``{label: rows}``."""
+    os.makedirs(directory, exist_ok=True)
+    return _run(export_model, labels or MODELS, directory, chunk_size, workers)
+
+
+def import_snapshot(directory, labels=None, chunk_size=2000, workers=1, reconcile=True):
+    """Import the files of ``labels`` present in ``directory``; returns ``{label: rows}``."""
+    wanted = labels or MODELS
+    imported = {}
+    for level in IMPORT_LEVELS:
+        present = [
+            label for label in level if label in wanted and os.path.exists(snapshot_path(directory, label))
+        ]
+        imported.update(_run(import_model, present, directory, chunk_size, workers))
+    if reconcile:
+        counters.reconcile()
+    return imported
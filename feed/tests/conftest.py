@@ -0,0 +1,55 @@
+import pytest
+
+from feed.auth import get_token_cache
+from feed.cache import get_cache_backend
+from feed.jobs import get_queue
+from feed.models import Post, User
+
+
+@pytest.fixture(autouse=True)
+def clear_feed_cache():
+    # the feed and token caches live in-process and would otherwise leak rows between tests
+    get_cache_backend().clear()
+    get_token_cache().clear()
+    yield
+    get_cache_backend().clear()
+    get_token_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def eager_jobs(settings):
+    # run background jobs inline; tests of the queue itself turn this off
+    settings.FEED_JOBS_EAGER = True
+    settings.FEED_JOBS_WORKER_THREAD = False
+    get_queue().clear()
+    yield
+    get_queue().clear()
+
+
+@pytest.fixture
+def make_user():
+    def make_user(name, **extra):
+        return User.objects.create_user(
+            email=f"{name}@example.com", username=name, name=name, password="pw", **extra
+        )
+    return make_user
+
+
+@pytest.fixture
+def make_feed():
+    """``make_feed(users, posts_per_user)`` creates that many authors and posts; returns ``(authors, posts)``."""
+    def make_feed(users=5, posts_per_user=3):
+        authors = [
+            User.objects.create_user(
+                email=f"user{i}@example.com", username=f"user{i}", name=f"User {i}", password="pw"
+            )
+            for i in range(users)
+        ]
+        posts = [
+            Post.objects.create(author=author, content=f"post {n} by {author.username}")
+            for author in authors
+            for n in range(posts_per_user)
+        ]
+        User.objects.update(posts_count=posts_per_user)
+        return authors, posts
+    return make_feed
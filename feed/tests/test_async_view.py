@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+
+from backend.views import AsyncFeedGraphQLView
+from feed.loaders import LoaderRegistry
+from feed.models import Post, PostLike, User
+
+
+FEED_QUERY = """
+{
+  posts(first: 50) { id likesCount viewerHasLiked author { username postsCount } }
+  postsConnection(first: 2) { edges { node { id author { username } } } pageInfo { hasNextPage } }
+}
+"""
+
+
+def post(body, **headers):
+    request = AsyncRequestFactory().post(
+        "/graphql/", json.dumps(body), content_type="application/json", headers=headers
+    )
+    response = async_to_sync(AsyncFeedGraphQLView.as_view())(request)
+    return response.status_code, json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_async_view_batches_nested_fields(make_feed):
+    authors, posts = make_feed()
+    PostLike.objects.create(user=authors[0], post=posts[0])
+
+    with CaptureQueriesContext(connection) as queries:
+        status, res = post({"query": FEED_QUERY}, authorization=f"JWT {get_token(authors[0])}")
+
+    assert status == 200, res
+    assert len(res["data"]["posts"]) == 15
+    liked = {p["id"]: p["viewerHasLiked"] for p in res["data"]["posts"]}
+    assert liked[posts[0].pk] is True and sum(liked.values()) == 1
+    assert all(p["author"]["postsCount"] == 3 for p in res["data"]["posts"])
+    assert res["data"]["postsConnection"]["pageInfo"]["hasNextPage"] is True
+    # user, two pages, then one batch per loader and root field rather than per row
+    assert len(queries) <= 8
+
+
+@pytest.mark.django_db
+def test_async_view_runs_mutations_and_single_post_reads():
+    user = User.objects.create_user(email="a@example.com", username="a", name="A", password="pw")
+    token = get_token(user)
+
+    status, res = post(
+        {"query": 'mutation { createPost(content: "hi") { post { id content } } }'},
+        authorization=f"JWT {token}",
+    )
+    assert status == 200, res
+    post_id = res["data"]["createPost"]["post"]["id"]
+
+    status, res = post({"query": '{ post(postId: "%s") { content author { username } } }' % post_id})
+    assert res["data"]["post"] == {"content": "hi", "author": {"username": "a"}}
+
+    status, res = post({"query": '{ post(postId: "missing") { id } }'})
+    assert res["errors"][0]["message"] == "Post not found"
+
+
+@pytest.mark.django_db
+def test_async_loads_in_one_tick_share_a_batch(make_feed):
+    _, posts = make_feed(users=2, posts_per_user=2)
+    loaders = LoaderRegistry(asynchronous=True)
+
+    async def load_all():
+        return await asyncio.gather(*[loaders.for_model(Post).load(p.pk) for p in posts])
+
+    with CaptureQueriesContext(connection) as queries:
+        loaded = async_to_sync(load_all)()
+
+    assert [p.pk for p in loaded] == [p.pk for p in posts]
+    assert len(queries) == 1
@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_token
+from graphql_jwt.utils import jwt_encode, jwt_payload
+
+from feed.auth import CachedJSONWebTokenBackend
+from feed.models import Post
+
+
+def authenticate(token):
+    request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {token}")
+    return CachedJSONWebTokenBackend().authenticate(request), request
+
+
+@pytest.mark.django_db
+def test_a_repeated_token_skips_the_database_until_a_field_needs_it(make_user):
+    alice = make_user("alice")
+    token = get_token(alice)
+    user, request = authenticate(token)
+    assert user == alice and request.auth_span["cache"] == "miss"
+
+    with CaptureQueriesContext(connection) as queries:
+        user, request = authenticate(token)
+        assert (user.pk, user.username, user.is_authenticated) == (alice.pk, "alice", True)
+    assert len(queries) == 0
+    assert request.auth_span["cache"] == "hit"
+
+    with CaptureQueriesContext(connection) as queries:
+        assert user.name == "alice"
+    assert len(queries) == 1
+
+
+@pytest.mark.django_db
+def test_saving_a_user_revokes_their_cached_tokens(django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    token = get_token(alice)
+    authenticate(token)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        alice.is_active = False
+        alice.save()
+
+    with pytest.raises(JSONWebTokenError):
+        authenticate(token)
+
+
+@pytest.mark.django_db
+def test_expired_tokens_are_never_cached(make_user):
+    alice = make_user("alice")
+    payload = jwt_payload(alice)
+    payload["exp"] = int(time.time()) - 10
+    # expiration is not verified by default, so the token still authenticates
+    token = jwt_encode(payload)
+    authenticate(token)
+
+    user, request = authenticate(token)
+    assert user == alice and request.auth_span["cache"] == "miss"
+
+
+@pytest.mark.django_db
+def test_the_snapshot_user_can_write(client, make_user):
+    alice = make_user("alice")
+    headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(alice)}"}
+    query = 'mutation { createPost(content: "hi") { post { author { username } } } }'
+    for _ in range(2):
+        res = client.post("/graphql/", json.dumps({"query": query}), content_type="application/json", **headers)
+        assert res.json()["data"]["createPost"]["post"]["author"] == {"username": "alice"}
+
+    assert Post.objects.filter(author=alice).count() == 2
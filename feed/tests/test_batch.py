@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+
+from backend.views import AsyncFeedGraphQLView
+from feed.models import Post
+
+SINGLE = "query($id: ID!) { post(postId: $id) { id likesCount author { username } } }"
+LIKE = "mutation($id: ID!) { likePost(postId: $id) { ok likesCount } }"
+
+
+def batch(client, operations, user=None):
+    headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"} if user else {}
+    return client.post("/graphql/", json.dumps(operations), content_type="application/json", **headers)
+
+
+def abatch(operations, user=None):
+    headers = {"authorization": f"JWT {get_token(user)}"} if user else {}
+    request = AsyncRequestFactory().post(
+        "/graphql/", json.dumps(operations), content_type="application/json", headers=headers
+    )
+    response = async_to_sync(AsyncFeedGraphQLView.as_view())(request)
+    return response.status_code, json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_a_batch_returns_results_in_order(client, make_user):
+    alice = make_user("alice")
+    first = Post.objects.create(author=alice, content="first")
+    second = Post.objects.create(author=alice, content="second")
+
+    res = batch(client, [
+        {"id": "feed", "query": "{ posts { id } }"},
+        {"id": "a", "query": SINGLE, "variables": {"id": first.pk}},
+        {"id": "like", "query": LIKE, "variables": {"id": second.pk}},
+        {"id": "b", "query": SINGLE, "variables": {"id": second.pk}},
+    ], alice)
+
+    assert res.status_code == 200
+    results = res.json()
+    assert [r["id"] for r in results] == ["feed", "a", "like", "b"]
+    assert all(r["status"] == 200 for r in results)
+    assert len(results[0]["data"]["posts"]) == 2
+    assert results[1]["data"]["post"]["id"] == first.pk
+    assert results[2]["data"]["likePost"] == {"ok": True, "likesCount": 1}
+    # the query after the mutation does not see what the loaders cached before it
+    assert results[3]["data"]["post"]["likesCount"] == 1
+
+
+@pytest.mark.django_db
+def test_errors_are_reported_per_operation(client, make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="hi")
+
+    results = batch(client, [
+        {"query": "{ nope }"},
+        {"variables": {}},
+        {"query": SINGLE, "variables": {"id": post.pk}},
+        {"query": LIKE, "variables": {"id": post.pk}},
+    ]).json()
+
+    assert results[0]["status"] == 400 and "nope" in results[0]["errors"][0]["message"]
+    assert results[1]["errors"][0]["message"] == "Must provide query string."
+    assert results[2]["data"]["post"]["id"] == post.pk
+    # anonymous: the mutation fails on its own
+    assert results[3]["data"]["likePost"] is None and results[3]["errors"]
+
+
+@pytest.mark.django_db
+@override_settings(GRAPHQL_BATCH_MAX_OPERATIONS=2)
+def test_the_batch_size_is_limited(client):
+    operations = [{"query": "{ posts { id } }"}] * 3
+    res = batch(client, operations)
+    assert res.status_code == 400
+    assert res.json()["errors"][0]["message"] == "At most 2 operations are allowed per batch."
+    assert batch(client, []).status_code == 400
+
+
+@pytest.mark.django_db
+def test_async_batch_queries_share_loaders(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    posts = [Post.objects.create(author=alice, content=f"post {i}") for i in range(3)]
+    operations = [{"query": SINGLE, "variables": {"id": post.pk}} for post in posts]
+
+    with CaptureQueriesContext(connection) as queries:
+        status, results = abatch(operations, bob)
+
+    assert status == 200
+    assert [r["data"]["post"]["id"] for r in results] == [post.pk for post in posts]
+    assert all(r["data"]["post"]["author"]["username"] == "alice" for r in results)
+    # bob for the JWT, then alice once for the three operations
+    assert len([q for q in queries if 'FROM "feed_user"' in q["sql"]]) == 2
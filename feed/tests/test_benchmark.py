@@ -0,0 +1,35 @@
+import pytest
+from django.test import override_settings
+
+from feed import benchmark
+from feed.models import Post, PostLike, User
+
+
+@pytest.mark.django_db
+def test_seed_builds_a_consistent_dataset():
+    data = benchmark.seed(users=10, posts=40, likes=120, comments=30, follows=15)
+
+    assert User.objects.count() == 10 and Post.objects.count() == 40
+    hot = Post.objects.get(pk=data.hot_post_id)
+    assert hot.likes_count == PostLike.objects.filter(post=hot).count() > 0
+    assert sum(user.posts_count for user in User.objects.all()) == 40
+
+
+@pytest.mark.django_db
+# the database path, where N+1 regressions show; background jobs are not part of the request
+@override_settings(FEED_CACHE_ENABLED=False, FEED_JOBS_EAGER=False)
+def test_operations_stay_within_their_query_budgets():
+    data = benchmark.seed(users=10, posts=60, likes=200, comments=80, follows=20)
+    results = benchmark.run(data, iterations=15)
+
+    assert [result.name for result in results] == [name for name, _, _ in benchmark.OPERATIONS]
+    for result in results:
+        assert not result.errors, (result.name, result.errors[:1])
+        assert result.max_queries <= result.budget, result.row()
+        assert 0 < result.percentile(50) <= result.percentile(95) <= result.percentile(99)
+
+
+def test_percentiles_are_nearest_rank():
+    result = benchmark.Result("op", budget=1, latencies=[i / 1000 for i in range(1, 101)])
+    assert (result.percentile(50), result.percentile(95), result.percentile(99)) == (50, 95, 99)
+
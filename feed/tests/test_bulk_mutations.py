@@ -0,0 +1,113 @@
+import uuid
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed import counters
+from feed.models import Comment, CounterDelta, Post, PostLike
+
+
+def execute(query, user, **variables):
+    request = RequestFactory().post("/graphql/")
+    request.user = user
+    return Client(schema).execute(query, variables=variables, context_value=request)
+
+
+@pytest.mark.django_db
+def test_create_posts_inserts_in_bulk(make_user):
+    alice = make_user("alice")
+
+    with CaptureQueriesContext(connection) as queries:
+        res = execute(
+            'mutation($c: [String!]!) { createPosts(contents: $c) { results { index ok post { content } } } }',
+            alice, c=[f"post {i}" for i in range(20)],
+        )
+
+    results = res["data"]["createPosts"]["results"]
+    assert [r["post"]["content"] for r in results] == [f"post {i}" for i in range(20)]
+    assert Post.objects.filter(author=alice).count() == 20
+    inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "feed_post"')]
+    assert len(inserts) == 1
+    counters.flush()
+    alice.refresh_from_db()
+    assert alice.posts_count == 20
+
+
+@pytest.mark.django_db
+def test_like_posts_reports_partial_failures(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    posts = [Post.objects.create(author=bob, content=str(i)) for i in range(3)]
+    PostLike.objects.create(user=alice, post=posts[0])
+    counters.incr(Post, posts[0].pk, "likes_count", 1)
+
+    res = execute(
+        'mutation($ids: [ID!]!) { likePosts(postIds: $ids) { results { index ok error postId likesCount } } }',
+        alice, ids=[posts[0].pk, "missing", posts[1].pk, posts[2].pk],
+    )
+
+    results = res["data"]["likePosts"]["results"]
+    assert [(r["ok"], r["likesCount"]) for r in results] == [(True, 1), (False, None), (True, 1), (True, 1)]
+    assert results[1]["error"] == "Post not found"
+    assert PostLike.objects.filter(user=alice).count() == 3
+
+
+@pytest.mark.django_db
+def test_create_comments_aggregates_counter_deltas(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    post = Post.objects.create(author=bob, content="x")
+    items = [{"postId": post.pk, "content": f"c{i}"} for i in range(4)] + [{"postId": "missing", "content": "?"}]
+
+    res = execute(
+        'mutation($c: [CommentInput!]!) { createComments(comments: $c) { results { ok error comment { content } } } }',
+        alice, c=items,
+    )
+
+    results = res["data"]["createComments"]["results"]
+    assert [r["ok"] for r in results] == [True] * 4 + [False]
+    assert Comment.objects.filter(post=post).count() == 4
+    assert counters.pending_many(Post, [post.pk]) == {post.pk: {"comments_count": 4}}
+
+
+@pytest.mark.django_db
+@override_settings(FEED_BULK_MAX_ITEMS=2)
+def test_bulk_size_is_limited(make_user):
+    alice = make_user("alice")
+
+    res = execute('mutation { createPosts(contents: ["a", "b", "c"]) { results { ok } } }', alice)
+
+    assert res["errors"][0]["message"] == "At most 2 items are allowed per request"
+    assert not Post.objects.exists()
+
+
+@pytest.mark.django_db
+def test_bulk_mutations_accept_any_spelling_of_an_id(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    post = Post.objects.create(author=bob, content="x")
+    parent = Comment.objects.create(post=post, author=bob, content="parent")
+    upper, dashed = post.pk.upper(), str(uuid.UUID(hex=post.pk))
+
+    liked = execute(
+        'mutation($ids: [ID!]!) { likePosts(postIds: $ids) { results { ok likesCount } } }', alice, ids=[upper, dashed]
+    )["data"]["likePosts"]["results"]
+    assert liked == [{"ok": True, "likesCount": 1}, {"ok": True, "likesCount": 1}]
+
+    items = [{"postId": upper, "content": "a"}, {"postId": dashed, "parentId": parent.pk.upper(), "content": "b"}]
+    created = execute(
+        'mutation($c: [CommentInput!]!) { createComments(comments: $c) { results { ok } } }', alice, c=items
+    )["data"]["createComments"]["results"]
+    assert created == [{"ok": True}, {"ok": True}]
+    assert Comment.objects.get(content="b").parent_id == parent.pk
+
+
+@pytest.mark.django_db
+def test_an_empty_create_posts_writes_nothing(make_user):
+    alice = make_user("alice")
+
+    res = execute('mutation { createPosts(contents: []) { results { ok } } }', alice)
+
+    assert res["data"]["createPosts"]["results"] == []
+    assert not CounterDelta.objects.exists()
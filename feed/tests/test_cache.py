@@ -0,0 +1,72 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.cache import LRUCacheBackend, get_cache_backend
+
+FEED = "{ posts(first: 10) { id content likesCount } }"
+
+
+def execute(query, user=None, **variables):
+    request = RequestFactory().post("/graphql/")
+    if user is not None:
+        request.user = user
+    res = Client(schema).execute(query, variables=variables, context_value=request)
+    assert "errors" not in res, res.get("errors")
+    return res["data"]
+
+
+def create_post(user, content):
+    data = execute('mutation($c: String!) { createPost(content: $c) { post { id } } }', user, c=content)
+    return data["createPost"]["post"]["id"]
+
+
+@pytest.mark.django_db
+def test_feed_page_is_served_from_cache(make_user):
+    alice = make_user("alice")
+    create_post(alice, "hello")
+    query = "{ posts(first: 10) { id content } }"
+    first = execute(query)
+
+    with CaptureQueriesContext(connection) as queries:
+        second = execute(query)
+
+    assert second == first
+    assert len(queries) == 0
+    assert get_cache_backend().stats()["hits"] >= 2
+
+
+@pytest.mark.django_db
+def test_mutations_invalidate_or_patch_cached_entries(make_user):
+    alice = make_user("alice")
+    post_id = create_post(alice, "hello")
+    execute(FEED)
+
+    new_id = create_post(alice, "second")
+    assert [p["id"] for p in execute(FEED)["posts"]] == [new_id, post_id]
+
+    execute('mutation($id: ID!) { likePost(postId: $id) { ok } }', alice, id=post_id)
+    assert execute(FEED)["posts"][1]["likesCount"] == 1
+
+    execute('mutation($id: ID!, $c: String!) { updatePost(postId: $id, content: $c) { post { id } } }',
+            alice, id=post_id, c="edited")
+    assert execute('query($id: ID!) { post(postId: $id) { content } }', id=post_id)["post"]["content"] == "edited"
+
+    execute('mutation($id: ID!) { deletePost(postId: $id) { ok } }', alice, id=new_id)
+    assert [p["id"] for p in execute(FEED)["posts"]] == [post_id]
+
+
+def test_lru_backend_evicts_least_recently_used_and_expires():
+    backend = LRUCacheBackend(max_entries=2)
+    backend.set_many({"a": 1, "b": 2}, ttl=60)
+    backend.get_many(["a"])
+    backend.set_many({"c": 3}, ttl=60)
+
+    assert backend.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert backend.stats()["evictions"] == 1
+
+    backend.set_many({"d": 4}, ttl=0)
+    assert backend.get_many(["d"]) == {}
@@ -0,0 +1,137 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.comments import build_comment
+from feed.loaders import LoaderMiddleware
+from feed.models import Comment, Post
+
+
+def execute(query, user=None, **variables):
+    request = RequestFactory().post("/graphql/")
+    if user is not None:
+        request.user = user
+    res = Client(schema, middleware=[LoaderMiddleware()]).execute(query, variables=variables, context_value=request)
+    assert "errors" not in res, res.get("errors")
+    return res["data"]
+
+
+def reply(user, post, content, parent=None):
+    data = execute(
+        'mutation($post: ID!, $parent: ID, $content: String!) {'
+        '  createComment(postId: $post, parentId: $parent, content: $content) { comment { id depth } } }',
+        user, post=post.pk, parent=parent, content=content,
+    )
+    return data["createComment"]["comment"]
+
+
+FEED_WITH_COMMENTS = """
+{
+  postsConnection(first: 20) {
+    edges { node {
+      content
+      comments(first: 2) {
+        edges { node { content likesCount author { username } } }
+        pageInfo { hasNextPage }
+      }
+    } }
+  }
+}
+"""
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("posts", [2, 6])
+def test_comment_pages_are_batched_across_a_feed_page(posts, make_user):
+    author = make_user("author")
+    for i in range(posts):
+        post = Post.objects.create(author=author, content=f"post {i}")
+        for n in range(3):
+            Comment.objects.create(post=post, author=make_user(f"c{i}x{n}"), content=f"comment {n}")
+
+    with CaptureQueriesContext(connection) as queries:
+        data = execute(FEED_WITH_COMMENTS)
+
+    edges = data["postsConnection"]["edges"]
+    assert len(edges) == posts
+    for edge in edges:
+        comments = edge["node"]["comments"]
+        assert [e["node"]["content"] for e in comments["edges"]] == ["comment 2", "comment 1"]
+        assert comments["pageInfo"]["hasNextPage"] is True
+    # posts page, comment pages, comment authors, pending comment likes
+    assert len(queries) == 4
+
+
+@pytest.mark.django_db
+def test_replies_thread_and_subtree(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    post = Post.objects.create(author=alice, content="topic")
+
+    root = reply(alice, post, "root")
+    first = reply(bob, post, "first", root["id"])
+    nested = reply(alice, post, "nested", first["id"])
+    second = reply(bob, post, "second", root["id"])
+    reply(alice, post, "other thread")
+    assert (first["depth"], nested["depth"], second["depth"]) == (1, 2, 1)
+
+    with CaptureQueriesContext(connection) as queries:
+        data = execute(
+            'query($id: ID!) { post(postId: $id) { comments { edges { node {'
+            '  content replies { edges { node { content } } } thread { content depth } } } } } }',
+            id=post.pk,
+        )
+    comments = {e["node"]["content"]: e["node"] for e in data["post"]["comments"]["edges"]}
+    assert set(comments) == {"root", "other thread"}
+    assert [e["node"]["content"] for e in comments["root"]["replies"]["edges"]] == ["second", "first"]
+    assert [(c["content"], c["depth"]) for c in comments["root"]["thread"]] == [
+        ("first", 1), ("nested", 2), ("second", 1),
+    ]
+    assert comments["other thread"]["thread"] == []
+    # post, top-level comments, replies, both subtrees in one range query
+    assert len(queries) == 4
+
+    res = Client(schema).execute(
+        'mutation($post: ID!, $parent: ID) { createComment(postId: $post, parentId: $parent, content: "x") { comment { id } } }',
+        variables={"post": Post.objects.create(author=alice, content="elsewhere").pk, "parent": root["id"]},
+        context_value=type("Request", (), {"user": alice})(),
+    )
+    assert res["errors"][0]["message"] == "Parent comment not found"
+
+
+@pytest.mark.django_db
+@override_settings(FEED_COMMENT_MAX_DEPTH=2)
+def test_replies_past_max_depth_attach_to_the_parent(make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="topic")
+    root = build_comment(post.pk, alice, "root")
+    root.save()
+    child = build_comment(post.pk, alice, "child", root)
+    child.save()
+
+    too_deep = build_comment(post.pk, alice, "too deep", child)
+
+    assert (too_deep.parent_id, too_deep.depth) == (root.pk, 1)
+    assert too_deep.path.startswith(root.path) and len(too_deep.path) == len(child.path)
+
+
+@pytest.mark.django_db
+def test_comment_likes_are_idempotent_and_counted(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    comment = Comment.objects.create(post=Post.objects.create(author=alice, content="p"), author=alice, content="c")
+    like = 'mutation($id: ID!) { likeComment(commentId: $id) { ok likesCount } }'
+
+    assert execute(like, bob, id=comment.pk)["likeComment"] == {"ok": True, "likesCount": 1}
+    assert execute(like, bob, id=comment.pk)["likeComment"] == {"ok": True, "likesCount": 1}
+    assert execute(like, alice, id=comment.pk)["likeComment"]["likesCount"] == 2
+    assert execute(
+        'mutation($id: ID!) { unlikeComment(commentId: $id) { likesCount } }', bob, id=comment.pk
+    )["unlikeComment"]["likesCount"] == 1
+
+    data = execute(
+        'query($id: ID!) { post(postId: $id) { comments { edges { node { likesCount viewerHasLiked } } } } }',
+        alice, id=comment.post_id,
+    )
+    assert data["post"]["comments"]["edges"][0]["node"] == {"likesCount": 1, "viewerHasLiked": True}
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from django.test import override_settings
+from graphql import parse, validate
+
+from backend import cost
+from feed.schema import schema
+
+
+def analyze(query, variables=None):
+    return cost.analyze(schema.graphql_schema, parse(query), variables=variables)
+
+
+def post(client, **body):
+    return client.post("/graphql/", json.dumps(body), content_type="application/json")
+
+
+def test_list_multiplier_comes_from_first():
+    query = "query($n: Int) { posts(first: $n) { id author { id username } } }"
+
+    assert analyze(query, {"n": 10}) == {"requested": 1 + 10 * 1, "depth": 3}
+    assert analyze(query, {"n": 50})["requested"] == 51
+
+
+@override_settings(FEED_DEFAULT_PAGE_SIZE=20, GRAPHQL_DEFAULT_LIST_SIZE=1000)
+def test_lists_without_first_are_priced_at_their_real_limit():
+    # paginated fields fall back to the default page size
+    assert analyze("{ posts { author { id } } }")["requested"] == 1 + 20 * 1
+    assert analyze("{ postsConnection { edges { node { author { id } } } } }")["requested"] == 1 + 1 + 20 * 2
+    # a thread has no page limit: priced at the ceiling
+    thread = "{ post(postId: \"x\") { comments(first: 1) { edges { node { thread { author { id } } } } } } }"
+    assert analyze(thread)["requested"] == 1 + 1 + 1 + 1 * (1 + 1 + 1000 * 1)
+    # users expose no reverse list to nest posts through
+    errors = validate(schema.graphql_schema, parse("{ posts { author { posts { id } } } }"))
+    assert "Cannot query field 'posts' on type 'UserType'." in [error.message for error in errors]
+
+
+def test_connection_edges_are_not_counted_twice():
+    report = analyze(
+        "{ postsConnection(first: 20) { edges { node { id author { id } } } pageInfo { hasNextPage } } }"
+    )
+
+    # postsConnection + edges + 20 * (node + author) + pageInfo
+    assert report == {"requested": 1 + 1 + 20 * 2 + 1, "depth": 5}
+
+
+def test_fragments_and_field_overrides():
+    query = """
+        { posts(first: 2) { ...P } }
+        fragment P on PostType { author { id } }
+    """
+    assert analyze(query)["requested"] == 3
+    with override_settings(GRAPHQL_FIELD_COSTS={"PostType.author": 5}):
+        assert analyze(query)["requested"] == 11
+
+
+@pytest.mark.django_db
+def test_cost_is_reported_in_extensions(client):
+    res = post(client, query="{ posts(first: 5) { id } }")
+
+    assert res.status_code == 200
+    assert res.json()["extensions"]["cost"] == {"requested": 1, "depth": 2, "maximum": 5000, "maxDepth": 10}
+
+
+@pytest.mark.django_db
+@override_settings(GRAPHQL_MAX_COST=100)
+def test_expensive_query_is_rejected_before_execution(client, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        res = post(client, query="{ posts(first: 1000) { author { id } } }")
+
+    assert res.status_code == 400
+    error = res.json()["errors"][0]
+    assert error["extensions"]["code"] == "QUERY_TOO_COMPLEX"
+    assert "data" not in res.json()
+
+
+@pytest.mark.django_db
+@override_settings(GRAPHQL_MAX_DEPTH=3)
+def test_deep_query_is_rejected(client):
+    res = post(client, query="{ postsConnection(first: 1) { edges { node { author { id } } } } }")
+
+    assert res.status_code == 400
+    assert res.json()["errors"][0]["extensions"]["code"] == "QUERY_TOO_DEEP"
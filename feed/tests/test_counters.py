@@ -0,0 +1,111 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed import counters
+from feed.loaders import LoaderMiddleware
+from feed.models import Comment, CounterDelta, Post, PostLike
+
+
+def execute(query, user=None, **variables):
+    request = RequestFactory().post("/graphql/")
+    if user is not None:
+        request.user = user
+    res = Client(schema, middleware=[LoaderMiddleware()]).execute(query, variables=variables, context_value=request)
+    assert "errors" not in res, res.get("errors")
+    return res["data"]
+
+
+@pytest.mark.django_db
+def test_likes_are_buffered_and_read_exactly_until_flushed(make_user):
+    author = make_user("author")
+    post = Post.objects.create(author=author, content="viral")
+    fans = [make_user(f"fan{i}") for i in range(3)]
+
+    for fan in fans:
+        data = execute('mutation($id: ID!) { likePost(postId: $id) { likesCount } }', fan, id=post.pk)
+    execute('mutation($id: ID!) { sharePost(postId: $id) { sharesCount } }', fans[0], id=post.pk)
+
+    assert data["likePost"]["likesCount"] == 3
+    post.refresh_from_db()
+    assert post.likes_count == 0
+    feed = execute("{ posts { likesCount sharesCount } }")
+    assert feed["posts"] == [{"likesCount": 3, "sharesCount": 1}]
+
+    counters.flush()
+
+    post.refresh_from_db()
+    assert (post.likes_count, post.shares_count) == (3, 1)
+    assert not CounterDelta.objects.exists()
+    assert execute("{ posts { likesCount } }")["posts"] == [{"likesCount": 3}]
+
+
+@pytest.mark.django_db
+def test_flush_issues_one_update_per_row(make_user):
+    author = make_user("author")
+    posts = [Post.objects.create(author=author, content=str(i)) for i in range(2)]
+    for post in posts:
+        for _ in range(5):
+            counters.incr(Post, post.pk, "likes_count", 1)
+        counters.incr(Post, post.pk, "comments_count", 2)
+
+    with CaptureQueriesContext(connection) as queries:
+        counters.flush()
+
+    updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+    assert len(updates) == 2
+    assert sorted(Post.objects.values_list("likes_count", "comments_count")) == [(5, 2), (5, 2)]
+
+
+@pytest.mark.django_db
+def test_pending_counters_are_loaded_once_per_page(make_user):
+    author = make_user("author")
+    for i in range(5):
+        post = Post.objects.create(author=author, content=str(i))
+        counters.incr(Post, post.pk, "likes_count", 1)
+
+    with CaptureQueriesContext(connection) as queries:
+        data = execute("{ posts { likesCount commentsCount } }")
+
+    assert [p["likesCount"] for p in data["posts"]] == [1] * 5
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_reconcile_rebuilds_counters_from_source_rows(make_user):
+    author, fan = make_user("author"), make_user("fan")
+    post = Post.objects.create(author=author, content="x", likes_count=42, comments_count=7)
+    PostLike.objects.create(post=post, user=fan)
+    counters.incr(Post, post.pk, "likes_count", 10)
+
+    call_command("reconcile_counters")
+
+    post.refresh_from_db(); author.refresh_from_db()
+    assert (post.likes_count, post.comments_count, post.shares_count) == (1, 0, 0)
+    assert author.posts_count == 1
+    assert not CounterDelta.objects.exists()
+
+
+@pytest.mark.django_db
+def test_pending_comment_likes_are_read_from_the_memory_backend(
+    settings, django_capture_on_commit_callbacks, make_user
+):
+    settings.FEED_COUNTER_BACKEND = "feed.counters.MemoryCounterBackend"
+    alice, bob = make_user("alice"), make_user("bob")
+    comment = Comment.objects.create(post=Post.objects.create(author=alice, content="p"), author=alice, content="c")
+
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            execute('mutation($id: ID!) { likeComment(commentId: $id) { ok } }', bob, id=comment.pk)
+        data = execute(
+            'query($id: ID!) { post(postId: $id) { comments { edges { node { likesCount } } } } }',
+            alice, id=comment.post_id,
+        )
+        assert Comment.objects.get(pk=comment.pk).likes_count == 0
+        assert data["post"]["comments"]["edges"][0]["node"]["likesCount"] == 1
+    finally:
+        counters.get_backend().discard()
@@ -0,0 +1,71 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from graphql_jwt.shortcuts import get_token
+
+from backend import db_router
+from feed.models import Post
+
+
+@pytest.fixture(autouse=True)
+def clear_pins():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def post(client, query, user=None):
+    headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"} if user else {}
+    return client.post("/graphql/", json.dumps({"query": query}), content_type="application/json", **headers).json()
+
+
+@override_settings(DATABASE_REPLICAS=["replica0", "replica1"])
+def test_reads_use_one_replica_per_block_and_writes_the_primary():
+    router = db_router.ReplicaRouter()
+    assert router.db_for_read(Post) == "default"
+
+    with db_router.replica_reads() as alias:
+        assert alias in ("replica0", "replica1")
+        assert {router.db_for_read(Post) for _ in range(20)} == {alias}
+        assert router.db_for_write(Post) == "default"
+
+    assert router.db_for_read(Post) == "default"
+    assert router.allow_migrate("replica0", "feed") is False
+
+
+@override_settings(DATABASE_REPLICAS=[])
+def test_without_replicas_everything_uses_the_primary():
+    with db_router.replica_reads() as alias:
+        assert alias is None
+        assert db_router.ReplicaRouter().db_for_read(Post) == "default"
+
+
+@pytest.mark.django_db
+# "default" stands in for a replica: the test database has no other alias
+@override_settings(DATABASE_REPLICAS=["default"])
+def test_mutations_pin_their_user_to_the_primary(client, monkeypatch, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    routed = []
+    replica_reads = db_router.replica_reads
+
+    @contextmanager
+    def recording(user=None):
+        with replica_reads(user) as alias:
+            routed.append((user.username, alias))
+            yield alias
+
+    monkeypatch.setattr(db_router, "replica_reads", recording)
+
+    res = post(client, 'mutation { createPost(content: "hi") { post { id } } }', alice)
+    assert "errors" not in res, res
+    assert db_router.is_pinned(alice) and not db_router.is_pinned(bob)
+
+    for user in (alice, bob):
+        assert post(client, "{ posts { content } }", user)["data"] == {"posts": [{"content": "hi"}]}
+
+    # the mutation ran on the primary; alice then reads her own post from
+    # the primary too, while bob's query may go to a lagging replica
+    assert routed == [("alice", None), ("bob", "default")]
@@ -0,0 +1,160 @@
+import gzip
+import json
+
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+
+from feed import cache as feed_cache, counters
+from feed.cache import LRUCacheBackend
+from feed.models import Post
+
+FEED = "query Feed { posts { id content likesCount } }"
+SINGLE = "query Single($postId: ID!) { post(postId: $postId) { id likesCount } }"
+
+
+@pytest.fixture(autouse=True)
+def shared_versions(monkeypatch):
+    # the test client runs in this process, so its in-process versions are shared
+    monkeypatch.setattr(LRUCacheBackend, "shared", True)
+
+
+def get(client, query, variables=None, etag=None, **headers):
+    params = {"query": query}
+    if variables:
+        params["variables"] = json.dumps(variables)
+    if etag:
+        headers["HTTP_IF_NONE_MATCH"] = etag
+    return client.get("/graphql/", params, HTTP_ACCEPT="application/json", **headers)
+
+
+def like(client, user, post_id, callbacks):
+    with callbacks(execute=True):
+        res = client.post(
+            "/graphql/",
+            json.dumps({"query": "mutation($id: ID!) { likePost(postId: $id) { ok } }", "variables": {"id": post_id}}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"JWT {get_token(user)}",
+        )
+    assert res.json()["data"]["likePost"]["ok"] is True
+
+
+@pytest.mark.django_db
+def test_a_matching_etag_is_answered_before_executing(client, make_user):
+    alice = make_user("alice")
+    Post.objects.create(author=alice, content="hi")
+
+    first = get(client, FEED)
+    assert first.status_code == 200
+    assert first["Cache-Control"] == "public, max-age=0, must-revalidate"
+    assert "Authorization" in first["Vary"]
+    assert get(client, FEED)["ETag"] == first["ETag"]
+
+    with CaptureQueriesContext(connection) as captured:
+        again = get(client, FEED, etag=first["ETag"])
+    assert again.status_code == 304
+    assert again["ETag"] == first["ETag"]
+    assert again.content == b""
+    assert len(captured) == 0
+
+
+@pytest.mark.django_db
+def test_no_etags_without_a_shared_cache_backend(client, monkeypatch, make_user):
+    monkeypatch.setattr(LRUCacheBackend, "shared", False)
+    Post.objects.create(author=make_user("alice"), content="hi")
+
+    response = get(client, FEED)
+    assert response.status_code == 200
+    assert not response.has_header("ETag")
+    assert response["Cache-Control"] == "private, no-store"
+    assert get(client, FEED, etag="*").status_code == 200
+
+
+@pytest.mark.django_db
+def test_mutations_bump_the_versions_of_the_posts_they_touch(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    liked = Post.objects.create(author=alice, content="liked")
+    other = Post.objects.create(author=alice, content="other")
+
+    feed = get(client, FEED)["ETag"]
+    liked_etag = get(client, SINGLE, {"postId": liked.pk})["ETag"]
+    other_etag = get(client, SINGLE, {"postId": other.pk})["ETag"]
+
+    like(client, alice, liked.pk, django_capture_on_commit_callbacks)
+
+    fresh = get(client, SINGLE, {"postId": liked.pk}, etag=liked_etag)
+    assert fresh.status_code == 200
+    assert fresh.json()["data"]["post"]["likesCount"] == 1
+    assert fresh["ETag"] != liked_etag
+    assert get(client, FEED, etag=feed).status_code == 200
+    assert get(client, SINGLE, {"postId": other.pk}, etag=other_etag).status_code == 304
+
+
+@pytest.mark.django_db
+@override_settings(FEED_COUNTER_EXACT_READS=False)
+def test_counter_flushes_invalidate_etags(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    liked = Post.objects.create(author=alice, content="liked")
+    counters.incr(Post, liked.pk, "likes_count", 1)
+
+    etag = get(client, SINGLE, {"postId": liked.pk})["ETag"]
+    with django_capture_on_commit_callbacks(execute=True):
+        counters.flush()
+
+    fresh = get(client, SINGLE, {"postId": liked.pk}, etag=etag)
+    assert fresh.status_code == 200
+    assert fresh.json()["data"]["post"]["likesCount"] == 1
+
+
+@pytest.mark.django_db
+def test_reconcile_invalidates_etags_without_resetting_versions(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="hi")
+    like(client, alice, post.pk, django_capture_on_commit_callbacks)
+    Post.objects.filter(pk=post.pk).update(likes_count=4)
+    before = feed_cache.data_versions([feed_cache.FEED_VERSION, feed_cache.USERS_VERSION])
+
+    feed = get(client, FEED)["ETag"]
+    single = get(client, SINGLE, {"postId": post.pk})
+    assert single.json()["data"]["post"]["likesCount"] == 5
+    with django_capture_on_commit_callbacks(execute=True):
+        counters.reconcile()
+
+    # versions only move forward, so no worker can match an ETag from before
+    after = feed_cache.data_versions([feed_cache.FEED_VERSION, feed_cache.USERS_VERSION])
+    assert all(new > old for new, old in zip(after, before))
+    fresh = get(client, SINGLE, {"postId": post.pk}, etag=single["ETag"])
+    assert fresh.status_code == 200
+    assert fresh.json()["data"]["post"]["likesCount"] == 1
+    assert get(client, FEED, etag=feed).status_code == 200
+
+
+@pytest.mark.django_db
+@override_settings(GRAPHQL_CACHE_CONTROL={"Feed": "public, max-age=30"})
+def test_cache_control_per_operation_and_no_caching_for_users(client, make_user):
+    alice = make_user("alice")
+    Post.objects.create(author=alice, content="hi")
+
+    assert get(client, FEED)["Cache-Control"] == "public, max-age=30"
+    assert get(client, "query Other { posts { id } }")["Cache-Control"] == "public, max-age=0, must-revalidate"
+
+    signed_in = get(client, FEED, HTTP_AUTHORIZATION=f"JWT {get_token(alice)}")
+    assert signed_in.status_code == 200
+    assert not signed_in.has_header("ETag")
+    assert signed_in["Cache-Control"] == "private, no-store"
+    # fields whose data has no version are never cached
+    assert not get(client, "{ homeFeed { edges { node { id } } } }").has_header("ETag")
+
+
+@pytest.mark.django_db
+def test_responses_are_compressed(client, make_user):
+    alice = make_user("alice")
+    Post.objects.bulk_create([Post(author=alice, content=f"post number {i}") for i in range(20)])
+
+    res = get(client, FEED, HTTP_ACCEPT_ENCODING="gzip")
+    assert res["Content-Encoding"] == "gzip"
+    assert res["ETag"].startswith('W/"')
+    assert len(json.loads(gzip.decompress(res.content))["data"]["posts"]) == 20
+    assert get(client, FEED, etag=res["ETag"], HTTP_ACCEPT_ENCODING="gzip").status_code == 304
@@ -0,0 +1,36 @@
+import uuid
+
+import pytest
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.ids import uuid7
+from feed.models import Post
+
+
+def test_uuid7_ids_increase_and_carry_their_version():
+    ids = [uuid7() for _ in range(10000)]
+
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert {(value.version, value.variant) for value in ids} == {(7, uuid.RFC_4122)}
+
+
+@pytest.mark.django_db
+def test_ids_are_time_ordered_hex(make_user):
+    alice = make_user("alice")
+    posts = [Post.objects.create(author=alice, content=str(i)) for i in range(5)]
+
+    assert all(len(post.pk) == 32 and int(post.pk, 16) for post in posts)
+    assert list(Post.objects.order_by("pk").values_list("content", flat=True)) == ["0", "1", "2", "3", "4"]
+    assert Post.objects.get(pk=str(uuid.UUID(posts[0].pk))) == posts[0]
+
+
+@pytest.mark.django_db
+def test_malformed_ids_are_not_found(make_user):
+    alice = make_user("alice")
+    Post.objects.create(author=alice, content="hi")
+
+    assert not Post.objects.filter(pk="not-an-id").exists()
+    assert not Post.objects.filter(author_id__in=["nope", alice.pk[:-1]]).exists()
+    res = Client(schema).execute('{ post(postId: "not-an-id") { id } }')
+    assert res["errors"][0]["message"] == "Post not found"
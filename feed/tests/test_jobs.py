@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+from django.db import transaction
+from graphql_jwt.shortcuts import get_token
+
+from feed import counters, jobs, search
+from feed.models import Post
+from feed.tracing import metrics
+
+
+@pytest.fixture(autouse=True)
+def queued_jobs(settings):
+    settings.FEED_JOBS_EAGER = False
+    settings.FEED_JOBS_RETRY_DELAY = 0
+
+
+@pytest.fixture
+def collected(monkeypatch):
+    batches = []
+    monkeypatch.setitem(jobs.HANDLERS, "test.collect", batches.append)
+    return batches
+
+
+@pytest.mark.django_db
+def test_same_kind_jobs_run_in_one_batch_after_commit(collected, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        for i in range(3):
+            jobs.enqueue("test.collect", i)
+        assert jobs.stats() == {}
+    assert jobs.stats()["test.collect"]["depth"] == 3
+
+    assert jobs.run_pending() == 3
+    assert collected == [[0, 1, 2]]
+    assert jobs.stats()["test.collect"]["depth"] == 0
+
+
+@pytest.mark.django_db
+def test_rolled_back_mutations_queue_nothing(collected, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(RuntimeError), transaction.atomic():
+            jobs.enqueue("test.collect", 1)
+            raise RuntimeError
+    assert jobs.run_pending() == 0
+    with pytest.raises(ValueError):
+        jobs.enqueue("test.unknown")
+
+
+@pytest.mark.django_db
+def test_a_burst_of_increments_queues_one_flush(settings, django_capture_on_commit_callbacks, make_user):
+    settings.FEED_COUNTER_FLUSH_INTERVAL = 0.05
+    post = Post.objects.create(author=make_user("alice"), content="hi")
+
+    for _ in range(5):
+        with django_capture_on_commit_callbacks(execute=True):
+            counters.incr(Post, post.pk, "likes_count", 1)
+    assert jobs.stats()["counters.flush"]["depth"] == 1
+    assert jobs.run_pending() == 0  # not due yet
+
+    time.sleep(0.06)
+    assert jobs.run_pending() == 1
+    assert Post.objects.filter(pk=post.pk).values_list("likes_count", flat=True).get() == 5
+
+
+@pytest.mark.django_db
+def test_failed_batches_are_retried_with_backoff_then_dropped(settings, monkeypatch):
+    calls = []
+
+    def fail(payloads):
+        calls.append(payloads)
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(jobs.HANDLERS, "test.fail", fail)
+    settings.FEED_JOBS_MAX_ATTEMPTS = 3
+    failed = metrics.value("feed_jobs_failed_total", kind="test.fail")
+    jobs.get_queue().push(jobs._job("test.fail", "x", None, 0))
+
+    settings.FEED_JOBS_RETRY_DELAY = 60
+    assert jobs.run_pending() == 1
+    retried = jobs.get_queue()._jobs["test.fail"][0]
+    assert retried["attempts"] == 1 and retried["run_at"] >= time.time() + 59
+    assert jobs.run_pending() == 0
+
+    retried["run_at"] = 0
+    settings.FEED_JOBS_RETRY_DELAY = 0
+    assert jobs.run_pending() == 2
+    assert calls == [["x"]] * 3
+    assert jobs.stats()["test.fail"]["depth"] == 0
+    assert metrics.value("feed_jobs_failed_total", kind="test.fail") == failed + 3
+
+
+@pytest.mark.django_db
+def test_mutations_queue_fan_out_and_indexing(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    with django_capture_on_commit_callbacks(execute=True):
+        res = client.post(
+            "/graphql/",
+            json.dumps({"query": 'mutation { createPost(content: "queued") { post { id } } }'}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"JWT {get_token(alice)}",
+        ).json()
+    assert res["data"]["createPost"]["post"]["id"]
+
+    queued = jobs.stats()
+    assert queued["timeline.fan_out"]["depth"] == queued["search.index_posts"]["depth"] == 1
+    assert jobs.run_pending() == 2
+
+
+@pytest.mark.django_db
+def test_search_backends_kept_current_by_the_database_get_no_jobs(
+    settings, django_capture_on_commit_callbacks, make_user
+):
+    settings.FEED_SEARCH_BACKEND = "feed.search.PostgresSearchBackend"
+    post = Post.objects.create(author=make_user("alice"), content="hi")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        search.index_posts_later([post])
+        search.post_deleted_later(post.pk)
+
+    assert jobs.stats() == {}
+
+
+@pytest.mark.django_db
+def test_queue_depth_and_lag_are_exported(client, collected):
+    jobs.get_queue().push({**jobs._job("test.collect", 1, None, 0), "run_at": time.time() - 30})
+    jobs.get_queue().push(jobs._job("test.collect", 2, None, 0))
+
+    body = client.get("/metrics/").content.decode()
+    assert 'feed_jobs_queued{kind="test.collect"} 2' in body
+    lag = next(line for line in body.splitlines() if line.startswith('feed_jobs_lag_seconds{kind="test.collect"}'))
+    assert float(lag.split()[-1]) >= 30
@@ -0,0 +1,121 @@
+import uuid
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed import jobs, likes
+from feed.loaders import LoaderMiddleware
+from feed.models import CounterDelta, Post, PostLike
+
+LIKE = 'mutation($id: ID!) { likePost(postId: $id) { ok likesCount } }'
+UNLIKE = 'mutation($id: ID!) { unlikePost(postId: $id) { ok likesCount } }'
+
+
+def execute(query, user=None, **variables):
+    request = RequestFactory().post("/graphql/")
+    if user is not None:
+        request.user = user
+    return Client(schema, middleware=[LoaderMiddleware()]).execute(query, variables=variables, context_value=request)
+
+
+@pytest.mark.django_db
+def test_like_and_unlike_are_idempotent(make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="x")
+
+    assert execute(LIKE, alice, id=post.pk)["data"]["likePost"] == {"ok": True, "likesCount": 1}
+    assert execute(LIKE, alice, id=post.pk)["data"]["likePost"] == {"ok": True, "likesCount": 1}
+    assert PostLike.objects.count() == 1
+
+    assert execute(UNLIKE, alice, id=post.pk)["data"]["unlikePost"] == {"ok": True, "likesCount": 0}
+    assert execute(UNLIKE, alice, id=post.pk)["data"]["unlikePost"] == {"ok": True, "likesCount": 0}
+    assert not PostLike.objects.exists()
+
+
+@pytest.mark.django_db
+def test_like_missing_post_reports_not_found(make_user):
+    alice = make_user("alice")
+
+    res = execute(LIKE, alice, id="missing")
+
+    assert res["errors"][0]["message"] == "Post not found"
+
+
+@pytest.mark.django_db
+def test_viewer_has_liked_is_resolved_in_one_query_per_page(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    posts = [Post.objects.create(author=bob, content=str(i)) for i in range(6)]
+    for post in posts[::2]:
+        PostLike.objects.create(user=alice, post=post)
+
+    with CaptureQueriesContext(connection) as queries:
+        res = execute("{ posts { id viewerHasLiked } }", alice)
+
+    liked = {p["id"]: p["viewerHasLiked"] for p in res["data"]["posts"]}
+    assert liked == {p.pk: i % 2 == 0 for i, p in enumerate(posts)}
+    assert len(queries) == 2
+
+    anonymous = execute("{ posts { viewerHasLiked } }")
+    assert not any(p["viewerHasLiked"] for p in anonymous["data"]["posts"])
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    vendor = "postgresql"
+
+    def cursor(self):
+        # the statement liked the post: one like, one changed row
+        return FakeCursor((1, 1))
+
+
+@pytest.mark.django_db
+def test_single_statement_likes_schedule_a_counter_flush(monkeypatch, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="x")
+    monkeypatch.setattr(likes, "_single_statement", lambda: True)
+    monkeypatch.setattr(likes, "connection", FakeConnection())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert likes.like_post(alice, post.pk) == (True, 1)
+
+    assert jobs.stats()["counters.flush"]["depth"] == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="the single-statement like needs PostgreSQL")
+def test_single_statement_like_and_unlike_on_postgresql(django_capture_on_commit_callbacks, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    post = Post.objects.create(author=alice, content="x")
+    assert likes._single_statement()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert likes.like_post(alice, post.pk) == (True, 1)
+        assert likes.like_post(alice, post.pk) == (False, 1)
+        assert likes.like_post(bob, post.pk) == (True, 2)
+        assert likes.unlike_post(bob, post.pk) == (True, 1)
+        assert likes.unlike_post(bob, post.pk) == (False, 1)
+    assert list(PostLike.objects.values_list("user", flat=True)) == [alice.pk]
+    assert sorted(CounterDelta.objects.filter(object_id=post.pk).values_list("delta", flat=True)) == [-1, 1, 1]
+
+    with pytest.raises(Post.DoesNotExist):
+        likes.like_post(alice, uuid.uuid4().hex)
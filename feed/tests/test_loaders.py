@@ -0,0 +1,58 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.loaders import LoaderMiddleware, LoaderRegistry
+from feed.models import Comment, Post, User
+
+
+def execute(query, **kwargs):
+    client = Client(schema, middleware=[LoaderMiddleware()])
+    return client.execute(query, context_value=RequestFactory().post("/graphql/"), **kwargs)
+
+
+@pytest.mark.django_db
+def test_post_authors_are_loaded_in_one_query(make_feed):
+    make_feed()
+
+    with CaptureQueriesContext(connection) as queries:
+        res = execute("{ posts(first: 50) { id author { username } } }")
+
+    assert "errors" not in res, res.get("errors")
+    assert len(res["data"]["posts"]) == 15
+    assert all(p["author"]["username"].startswith("user") for p in res["data"]["posts"])
+    # one query for the posts page, one IN (...) query for all authors
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_registry_batches_reverse_relations_and_foreign_keys(make_feed):
+    authors, posts = make_feed(users=3, posts_per_user=2)
+    for post in posts:
+        Comment.objects.create(post=post, author=authors[0], content="nice")
+    loaders = LoaderRegistry()
+
+    with CaptureQueriesContext(connection) as queries:
+        loaders.prime(posts, {"comments", "author"})
+        comments = [loaders.for_relation(Post, "comments").load(p.pk) for p in posts]
+        authors_loaded = [loaders.for_model(User).load(p.author_id) for p in posts]
+
+    assert [len(c) for c in comments] == [1] * len(posts)
+    assert {a.username for a in authors_loaded} == {"user0", "user1", "user2"}
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_single_post_author_resolves_without_middleware(make_feed):
+    _, posts = make_feed(users=1, posts_per_user=1)
+
+    res = Client(schema).execute(
+        '{ post(postId: "%s") { author { username } } }' % posts[0].pk,
+        context_value=RequestFactory().post("/graphql/"),
+    )
+
+    assert "errors" not in res, res.get("errors")
+    assert res["data"]["post"]["author"]["username"] == "user0"
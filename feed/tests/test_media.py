@@ -0,0 +1,175 @@
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+from PIL import Image
+
+from feed import jobs, media
+from feed.models import Media, Post
+
+REQUEST = """
+mutation($postId: ID!, $contentType: String!, $size: Int!) {
+  requestMediaUpload(postId: $postId, contentType: $contentType, size: $size) {
+    upload { url method headers media { id status } }
+  }
+}
+"""
+
+COMPLETE = "mutation($id: ID!) { completeMediaUpload(mediaId: $id) { media { id status } } }"
+
+
+@pytest.fixture(autouse=True)
+def media_root(tmp_path, settings):
+    settings.MEDIA_ROOT = tmp_path
+    settings.FEED_MEDIA_UPLOADER = "feed.media.LocalUploader"
+    settings.FEED_MEDIA_VARIANTS = {"thumbnail": 32, "medium": 64}
+    return tmp_path
+
+
+def png(width=200, height=100):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def post(client, query, variables, user):
+    return client.post(
+        "/graphql/",
+        json.dumps({"query": query, "variables": variables}),
+        content_type="application/json",
+        HTTP_AUTHORIZATION=f"JWT {get_token(user)}",
+    ).json()
+
+
+def request_upload(client, user, post_id, body, content_type="image/png"):
+    res = post(client, REQUEST, {"postId": post_id, "contentType": content_type, "size": len(body)}, user)
+    return res if res.get("errors") else res["data"]["requestMediaUpload"]["upload"]
+
+
+@pytest.mark.django_db
+def test_upload_and_render_variants(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    target = Post.objects.create(author=alice, content="look")
+    body = png()
+
+    upload = request_upload(client, alice, target.pk, body)
+    assert upload["method"] == "PUT" and upload["media"]["status"] == "PENDING"
+    put = client.put(upload["url"], body, content_type=upload["headers"]["Content-Type"])
+    assert put.status_code == 204
+
+    with django_capture_on_commit_callbacks(execute=True):
+        res = post(client, COMPLETE, {"id": upload["media"]["id"]}, alice)
+    assert res["data"]["completeMediaUpload"]["media"]["status"] == "PROCESSING"
+
+    stored = Media.objects.get(pk=upload["media"]["id"])
+    assert stored.status == Media.READY
+    assert set(stored.variants) == {"thumbnail", "medium"}
+    assert stored.thumbnail == stored.variants["thumbnail"]
+    with default_storage.open("media/%s/thumbnail.jpg" % stored.pk) as thumbnail:
+        assert Image.open(thumbnail).size == (32, 16)
+
+
+@pytest.mark.django_db
+def test_uploads_are_checked(client, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    target = Post.objects.create(author=alice, content="look")
+    body = png()
+
+    unsupported = request_upload(client, alice, target.pk, body, "text/html")
+    assert unsupported["errors"][0]["message"] == "Unsupported content type text/html"
+    assert "Not authorized" in request_upload(client, bob, target.pk, body)["errors"][0]["message"]
+
+    upload = request_upload(client, alice, target.pk, body)
+    assert client.put(upload["url"], body, content_type="image/jpeg").status_code == 400
+    assert client.put(upload["url"], body + b"extra", content_type="image/png").status_code == 400
+    assert client.put(upload["url"][:-3] + "xx/", body, content_type="image/png").status_code == 403
+
+    res = post(client, COMPLETE, {"id": upload["media"]["id"]}, alice)
+    assert res["errors"][0]["message"] == "The file has not been uploaded"
+
+
+@pytest.mark.django_db
+def test_unreadable_images_fail(client, django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    target = Post.objects.create(author=alice, content="look")
+    body = b"not an image at all"
+
+    upload = request_upload(client, alice, target.pk, body)
+    client.put(upload["url"], body, content_type="image/png")
+    with django_capture_on_commit_callbacks(execute=True):
+        post(client, COMPLETE, {"id": upload["media"]["id"]}, alice)
+
+    assert Media.objects.get(pk=upload["media"]["id"]).status == Media.FAILED
+
+
+@pytest.mark.django_db
+def test_feed_page_loads_media_in_one_query(client, make_user):
+    alice = make_user("alice")
+    posts = [Post.objects.create(author=alice, content=f"post {i}") for i in range(4)]
+    for item in posts[:3]:
+        Media.objects.create(post=item, type=Media.IMAGE, url=f"https://cdn.example.com/{item.pk}.jpg")
+
+    with CaptureQueriesContext(connection) as queries:
+        res = post(client, "{ posts { id media { url status } } }", {}, alice)
+
+    found = {p["id"]: p["media"] for p in res["data"]["posts"]}
+    assert found[posts[0].pk] == {"url": f"https://cdn.example.com/{posts[0].pk}.jpg", "status": "READY"}
+    assert found[posts[3].pk] is None
+    assert len([q for q in queries if 'FROM "feed_media"' in q["sql"]]) == 1
+
+
+@pytest.mark.django_db
+def test_unfinished_media_are_only_shown_to_the_author(client, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    target = Post.objects.create(author=alice, content="look")
+    request_upload(client, alice, target.pk, png())
+    query = "{ posts { media { status } } }"
+
+    assert post(client, query, {}, alice)["data"]["posts"] == [{"media": {"status": "PENDING"}}]
+    assert post(client, query, {}, bob)["data"]["posts"] == [{"media": None}]
+
+
+@pytest.mark.django_db
+def test_stale_processing_media_are_queued_again(settings, django_capture_on_commit_callbacks, make_user):
+    settings.FEED_JOBS_EAGER = False
+    alice = make_user("alice")
+    stale = Media.objects.create(
+        post=Post.objects.create(author=alice, content="old"), type=Media.IMAGE, status=Media.PROCESSING,
+        key="media/missing/original.png", processing_at=timezone.now() - timedelta(hours=1),
+    )
+    Media.objects.create(
+        post=Post.objects.create(author=alice, content="new"), type=Media.IMAGE, status=Media.PROCESSING,
+        key="media/new/original.png", processing_at=timezone.now(),
+    )
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert media.requeue_stale() == [stale.pk]
+    assert jobs.stats()["media.process"]["depth"] == 1
+
+    assert jobs.run_pending() == 1
+    # the original is gone, so the media cannot be rendered
+    assert Media.objects.get(pk=stale.pk).status == Media.FAILED
+
+
+@override_settings(
+    STORAGES={"default": {"BACKEND": "storages.backends.s3.S3Storage"}},
+    AWS_STORAGE_BUCKET_NAME="feed-media",
+    AWS_S3_ENDPOINT_URL="http://minio.local:9000",
+    AWS_S3_REGION_NAME="us-east-1",
+    AWS_ACCESS_KEY_ID="key",
+    AWS_SECRET_ACCESS_KEY="secret",
+)
+def test_s3_uploads_are_presigned_posts():
+    upload = media.S3Uploader().presign("media/abc/original.png", "image/png", 1234)
+    assert upload.method == "POST"
+    assert upload.url.startswith("http://minio.local:9000/feed-media")
+    assert upload.fields["key"] == "media/abc/original.png"
+    assert upload.fields["Content-Type"] == "image/png"
+    assert "policy" in upload.fields
@@ -0,0 +1,109 @@
+import pytest
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.loaders import LoaderMiddleware
+from feed.models import Post, User
+
+PAGE = """
+query Page($first: Int, $after: String) {
+  postsConnection(first: $first, after: $after) {
+    edges { cursor node { id author { username } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+
+def execute(query, **variables):
+    client = Client(schema, middleware=[LoaderMiddleware()])
+    return client.execute(query, variables=variables, context_value=RequestFactory().post("/graphql/"))
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(email="a@example.com", username="author", name="Author", password="pw")
+
+
+def walk(first):
+    seen, after = [], None
+    while True:
+        res = execute(PAGE, first=first, after=after)
+        assert "errors" not in res, res.get("errors")
+        conn = res["data"]["postsConnection"]
+        seen.extend(edge["node"]["id"] for edge in conn["edges"])
+        if not conn["pageInfo"]["hasNextPage"]:
+            return seen
+        after = conn["pageInfo"]["endCursor"]
+
+
+@pytest.mark.django_db
+def test_walks_every_post_once_newest_first(author):
+    posts = [Post.objects.create(author=author, content=str(i)) for i in range(25)]
+
+    seen = walk(first=10)
+
+    expected = [p.pk for p in sorted(posts, key=lambda p: (p.created_at, p.pk), reverse=True)]
+    assert seen == expected
+
+
+@pytest.mark.django_db
+def test_cursor_is_stable_across_inserts(author):
+    for i in range(5):
+        Post.objects.create(author=author, content=str(i))
+    first_page = execute(PAGE, first=2)["data"]["postsConnection"]
+    cursor = first_page["pageInfo"]["endCursor"]
+    expected = execute(PAGE, first=2, after=cursor)["data"]["postsConnection"]["edges"]
+
+    Post.objects.create(author=author, content="new")
+
+    again = execute(PAGE, first=2, after=cursor)["data"]["postsConnection"]["edges"]
+    assert [e["node"]["id"] for e in again] == [e["node"]["id"] for e in expected]
+
+
+@pytest.mark.django_db
+@override_settings(FEED_MAX_PAGE_SIZE=3)
+def test_page_size_is_capped(author):
+    for i in range(5):
+        Post.objects.create(author=author, content=str(i))
+
+    conn = execute(PAGE, first=1000)["data"]["postsConnection"]
+
+    assert len(conn["edges"]) == 3
+    assert conn["pageInfo"]["hasNextPage"] is True
+
+
+@pytest.mark.django_db
+def test_deep_page_costs_the_same_queries(author):
+    for i in range(30):
+        Post.objects.create(author=author, content=str(i))
+    cursor = execute(PAGE, first=20)["data"]["postsConnection"]["pageInfo"]["endCursor"]
+
+    with CaptureQueriesContext(connection) as queries:
+        res = execute(PAGE, first=5, after=cursor)
+
+    assert len(res["data"]["postsConnection"]["edges"]) == 5
+    assert len(queries) == 2
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_is_rejected():
+    res = execute(PAGE, first=5, after="not-a-cursor")
+
+    assert res["errors"][0]["message"] == "Invalid cursor"
+
+
+@pytest.mark.django_db
+@override_settings(FEED_DEFAULT_PAGE_SIZE=3, FEED_MAX_PAGE_SIZE=4)
+def test_plain_post_lists_are_paged_too(author):
+    for i in range(6):
+        Post.objects.create(author=author, content=str(i))
+
+    assert len(execute("{ posts { id } }")["data"]["posts"]) == 3
+    assert len(execute("{ posts(first: 1000) { id } }")["data"]["posts"]) == 4
+
+    res = execute("{ posts(first: -1) { id } }")
+    assert res["errors"][0]["message"] == "`first` must be a non-negative integer"
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from feed import partitions
+from feed.models import Post, User
+from feed.pagination import encode_cursor, keyset_slice
+
+
+@pytest.fixture
+def spread_posts(db):
+    author = User.objects.create_user(email="a@example.com", username="author", name="Author", password="pw")
+    now = timezone.now()
+    posts = Post.objects.bulk_create([Post(author=author, content=str(i)) for i in range(30)])
+    # one post every two days, so a 7-day window holds about four of them
+    for i, post in enumerate(posts):
+        Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(days=2 * i, minutes=1))
+    return [str(i) for i in range(30)]
+
+
+def walk(first):
+    seen, after = [], None
+    while True:
+        rows, has_next = keyset_slice(Post.objects.all(), first, after)
+        seen.extend(post.content for post in rows)
+        if not has_next:
+            return seen
+        after = encode_cursor(rows[-1])
+
+
+@override_settings(FEED_PARTITION_PRUNE_DAYS=7)
+def test_windowed_pages_match_an_unbounded_scan(spread_posts):
+    assert walk(3) == spread_posts
+    assert walk(10) == spread_posts
+
+
+@override_settings(FEED_PARTITION_PRUNE_DAYS=7)
+def test_a_page_inside_the_window_is_one_query(spread_posts):
+    with CaptureQueriesContext(connection) as queries:
+        rows, has_next = keyset_slice(Post.objects.all(), 2)
+
+    assert [post.content for post in rows] == ["0", "1"] and has_next
+    assert len(queries) == 1
+    assert '"created_at" >=' in queries[0]["sql"]
+
+
+def test_month_arithmetic_and_names():
+    october = datetime(2026, 10, 1, tzinfo=dt_timezone.utc)
+
+    # partitions are cut at UTC month boundaries
+    eastern_halloween = datetime(2026, 10, 31, 22, 0, tzinfo=dt_timezone(timedelta(hours=-5)))
+    assert partitions.month_start(eastern_halloween) == datetime(2026, 11, 1, tzinfo=dt_timezone.utc)
+    assert partitions.add_months(october, 3) == datetime(2027, 1, 1, tzinfo=dt_timezone.utc)
+    assert partitions.add_months(october, -10) == datetime(2025, 12, 1, tzinfo=dt_timezone.utc)
+    assert partitions.partition_name("feed_post", october) == "feed_post_p2026_10"
+    assert partitions.partition_month("feed_post_p2026_10") == october
+    assert partitions.partition_month("feed_post_default") is None
+
+
+@pytest.mark.django_db
+def test_command_needs_partitioned_tables():
+    with pytest.raises(CommandError):
+        call_command("manage_partitions")
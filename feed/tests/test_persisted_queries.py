@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+import pytest
+from django.test import override_settings
+
+from backend import persisted_queries
+
+QUERY = "{ posts(first: 5) { id } }"
+HASH = hashlib.sha256(QUERY.encode()).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def clear_persisted_queries():
+    persisted_queries.clear()
+    persisted_queries._load_allowlist.cache_clear()
+    yield
+    persisted_queries.clear()
+    persisted_queries._load_allowlist.cache_clear()
+
+
+def post(client, **body):
+    return client.post("/graphql/", json.dumps(body), content_type="application/json").json()
+
+
+def apq(query_hash):
+    return {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+
+
+@pytest.mark.django_db
+def test_hash_only_request_is_registered_then_served(client):
+    missing = post(client, extensions=apq(HASH))
+    assert missing["errors"][0]["message"] == "PersistedQueryNotFound"
+    assert missing["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    registered = post(client, query=QUERY, extensions=apq(HASH))
+    assert registered["data"] == {"posts": []}
+
+    assert post(client, extensions=apq(HASH))["data"] == {"posts": []}
+
+    res = client.get("/graphql/", {"extensions": json.dumps(apq(HASH))}, HTTP_ACCEPT="application/json")
+    assert res.json()["data"] == {"posts": []}
+
+
+@pytest.mark.django_db
+def test_mismatched_hash_is_rejected(client):
+    res = post(client, query=QUERY, extensions=apq("0" * 64))
+
+    assert res["errors"][0]["extensions"]["code"] == "INVALID_PERSISTED_QUERY"
+
+
+@pytest.mark.django_db
+def test_documents_are_parsed_once(client, monkeypatch):
+    calls = []
+    real_parse = persisted_queries.parse
+    monkeypatch.setattr(persisted_queries, "parse", lambda q: calls.append(q) or real_parse(q))
+
+    for _ in range(3):
+        assert post(client, query=QUERY)["data"] == {"posts": []}
+
+    assert calls == [QUERY]
+
+
+@pytest.mark.django_db
+def test_strict_mode_only_runs_allow_listed_queries(client, tmp_path):
+    allowlist = tmp_path / "allowlist.json"
+    allowlist.write_text(json.dumps({HASH: QUERY}))
+
+    with override_settings(GRAPHQL_PERSISTED_QUERIES_STRICT=True, GRAPHQL_PERSISTED_QUERIES_ALLOWLIST=str(allowlist)):
+        assert post(client, extensions=apq(HASH))["data"] == {"posts": []}
+        assert post(client, query=QUERY)["data"] == {"posts": []}
+        rejected = post(client, query="{ posts { id content } }")
+
+    assert rejected["errors"][0]["message"] == "PersistedQueryNotAllowed"
@@ -0,0 +1,95 @@
+import pytest
+from django.test import RequestFactory
+from graphene.test import Client
+
+from backend.schema import schema
+from feed import search
+from feed.loaders import LoaderMiddleware
+from feed.models import Comment, Post
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    search._load_backend.cache_clear()
+    yield
+    search._load_backend.cache_clear()
+
+
+def execute(query, user=None, **variables):
+    request = RequestFactory().post("/graphql/")
+    if user is not None:
+        request.user = user
+    res = Client(schema, middleware=[LoaderMiddleware()]).execute(query, variables=variables, context_value=request)
+    assert "errors" not in res, res.get("errors")
+    return res["data"]
+
+
+SEARCH = """
+query($q: String!, $first: Int, $after: String) {
+  searchPosts(query: $q, first: $first, after: $after) {
+    edges { node { content } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+
+def search_contents(q, **variables):
+    data = execute(SEARCH, q=q, **variables)["searchPosts"]
+    return [e["node"]["content"] for e in data["edges"]], data["pageInfo"]
+
+
+def test_tokenize_drops_stop_words_and_plurals():
+    assert search.tokenize("The Cats and the DOGS of Glass") == ["cat", "dog", "glass"]
+
+
+@pytest.mark.django_db
+def test_results_are_ranked_and_paginated(make_user):
+    author = make_user("author")
+    Post.objects.create(author=author, content="Sourdough bread, more sourdough, always sourdough")
+    Post.objects.create(author=author, content="Baking sourdough bread today")
+    Post.objects.create(author=author, content="Nothing to see here")
+    commented = Post.objects.create(author=author, content="Weekend plans")
+    Comment.objects.create(post=commented, author=author, content="bring sourdough")
+
+    contents, page_info = search_contents("sourdough", first=2)
+    assert contents == ["Sourdough bread, more sourdough, always sourdough", "Baking sourdough bread today"]
+    assert page_info["hasNextPage"] is True
+
+    contents, page_info = search_contents("sourdough", first=2, after=page_info["endCursor"])
+    # matched through its comment, which ranks below the posts' own content
+    assert contents == ["Weekend plans"]
+    assert page_info["hasNextPage"] is False
+
+    assert search_contents("sourdough bread")[0] == [
+        "Sourdough bread, more sourdough, always sourdough", "Baking sourdough bread today",
+    ]
+    assert search_contents("the")[0] == []
+
+
+@pytest.mark.django_db
+def test_index_follows_mutations(django_capture_on_commit_callbacks, make_user):
+    alice = make_user("alice")
+    post = Post.objects.create(author=alice, content="morning run")
+    assert search_contents("run")[0] == ["morning run"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        execute('mutation { createPosts(contents: ["evening run", "quiet day"]) { results { ok } } }', alice)
+        execute(
+            'mutation($id: ID!) { updatePost(postId: $id, content: "morning swim") { post { id } } }',
+            alice, id=post.pk,
+        )
+    assert search_contents("run")[0] == ["evening run"]
+    assert search_contents("swim")[0] == ["morning swim"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        execute(
+            'mutation($id: ID!) { createComment(postId: $id, content: "see you at the pool") { comment { id } } }',
+            alice, id=post.pk,
+        )
+    assert search_contents("pool")[0] == ["morning swim"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        execute('mutation($id: ID!) { deletePost(postId: $id) { ok } }', alice, id=post.pk)
+    assert search_contents("pool")[0] == []
+    assert search_contents("swim")[0] == []
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import msgpack
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from feed import counters, snapshot
+from feed.models import Comment, Follow, Post, PostLike, PostShare, User
+
+
+@pytest.fixture
+def graph(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    post = Post.objects.create(author=alice, content="tab\there\nand a \\ backslash")
+    Post.objects.filter(pk=post.pk).update(created_at=timezone.now() - timedelta(days=40))
+    root = Comment.objects.create(post=post, author=bob, content="first")
+    Comment.objects.create(post=post, author=alice, content="reply", parent=root, depth=1)
+    PostLike.objects.create(post=post, user=bob)
+    PostShare.objects.create(post=post, user=bob)
+    Follow.objects.create(follower=bob, followee=alice)
+    counters.reconcile()
+    return post
+
+
+def rows(model):
+    return list(model.objects.order_by("pk").values_list(*[f.attname for f in snapshot.export_fields(model)]))
+
+
+def test_a_snapshot_round_trips_every_row(graph, tmp_path):
+    before = {model: rows(model) for model in (User, Post, Comment, PostLike, PostShare, Follow)}
+
+    exported = snapshot.export_snapshot(tmp_path, chunk_size=2)
+    assert exported["feed.Comment"] == 2
+    for model in reversed(list(before)):
+        model.objects.all().delete()
+
+    imported = snapshot.import_snapshot(tmp_path, chunk_size=2)
+
+    assert imported == exported
+    assert {model: rows(model) for model in before} == before
+    post = Post.objects.get()
+    assert (post.likes_count, post.comments_count, post.shares_count) == (1, 2, 1)
+    assert post.content == graph.content and post.created_at < timezone.now() - timedelta(days=39)
+
+
+def test_files_are_a_header_then_one_array_per_row(graph, tmp_path):
+    snapshot.export_model("feed.Post", tmp_path)
+
+    with open(snapshot.snapshot_path(tmp_path, "feed.Post"), "rb") as stream:
+        header, *body = msgpack.Unpacker(stream, raw=False, timestamp=3)
+    assert header["model"] == "feed.Post" and header["version"] == snapshot.FORMAT_VERSION
+    assert "search_vector" not in header["fields"]
+    assert [dict(zip(header["fields"], row))["id"] for row in body] == [graph.pk]
+
+
+@pytest.mark.django_db
+def test_import_rejects_unknown_fields(tmp_path):
+    with open(snapshot.snapshot_path(tmp_path, "feed.User"), "wb") as out:
+        out.write(msgpack.packb({"model": "feed.User", "fields": ["shoe_size"], "version": 1}))
+
+    with pytest.raises(Exception, match="unknown fields"):
+        call_command("import_feed", str(tmp_path))
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from django.test import override_settings
+from graphql_jwt.shortcuts import get_token
+
+from backend.asgi import application
+from feed import events
+from feed.models import Comment, Post
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures("in_memory_channel_layer"),
+]
+
+
+@pytest.fixture
+def in_memory_channel_layer():
+    with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+        yield
+
+
+class Socket(ApplicationCommunicator):
+    """Minimal WebSocket client for the ASGI app (channels.testing needs daphne)."""
+
+    def __init__(self):
+        super().__init__(application, {
+            "type": "websocket", "path": "/graphql/", "query_string": b"", "headers": [],
+            "subprotocols": ["graphql-transport-ws"],
+        })
+
+    async def connect(self):
+        await self.send_input({"type": "websocket.connect"})
+        return await self.receive_output(2)
+
+    async def send_json_to(self, data):
+        await self.send_input({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json_from(self, timeout=2):
+        return json.loads((await self.receive_output(timeout))["text"])
+
+    async def disconnect(self):
+        await self.send_input({"type": "websocket.disconnect", "code": 1000})
+        await self.wait(1)
+
+
+async def connect(token=None):
+    communicator = Socket()
+    assert await communicator.connect() == {"type": "websocket.accept", "subprotocol": "graphql-transport-ws"}
+    payload = {"authorization": f"JWT {token}"} if token else {}
+    await communicator.send_json_to({"type": "connection_init", "payload": payload})
+    assert await communicator.receive_json_from() == {"type": "connection_ack"}
+    return communicator
+
+
+async def subscribe(communicator, id, query, variables=None):
+    await communicator.send_json_to(
+        {"id": id, "type": "subscribe", "payload": {"query": query, "variables": variables or {}}}
+    )
+    # let the subscription join its channel-layer group
+    await asyncio.sleep(0.05)
+
+
+def test_post_created_and_comment_added_are_pushed(make_user):
+    user = make_user("alice")
+    post = Post.objects.create(author=user, content="first")
+
+    async def scenario():
+        communicator = await connect(get_token(user))
+        await subscribe(communicator, "1", "subscription { postCreated { content author { username } } }")
+        await subscribe(
+            communicator, "2",
+            "subscription($id: ID!) { commentAdded(postId: $id) { content } }", {"id": post.pk},
+        )
+
+        await database_sync_to_async(
+            lambda: events.posts_created([Post.objects.create(author=user, content="hello")])
+        )()
+        assert await communicator.receive_json_from(timeout=2) == {
+            "id": "1", "type": "next",
+            "payload": {"data": {"postCreated": {"content": "hello", "author": {"username": "alice"}}}},
+        }
+
+        await database_sync_to_async(
+            lambda: events.comments_added([Comment.objects.create(post=post, author=user, content="nice")])
+        )()
+        assert await communicator.receive_json_from(timeout=2) == {
+            "id": "2", "type": "next", "payload": {"data": {"commentAdded": {"content": "nice"}}},
+        }
+
+        await communicator.send_json_to({"id": "1", "type": "complete"})
+        await communicator.disconnect()
+
+    async_to_sync(scenario)()
+
+
+@override_settings(FEED_SUBSCRIPTION_COUNTER_INTERVAL=0.3)
+def test_counter_updates_are_coalesced_per_interval(make_user):
+    post = Post.objects.create(author=make_user("bob"), content="viral", likes_count=1)
+
+    async def scenario():
+        communicator = await connect()
+        await subscribe(
+            communicator, "c",
+            "subscription($id: ID!) { postCountersChanged(postId: $id) { likesCount } }", {"id": post.pk},
+        )
+        for likes in (2, 3, 4):
+            await Post.objects.filter(pk=post.pk).aupdate(likes_count=likes)
+            await database_sync_to_async(events.counters_changed)([post.pk])
+
+        first = await communicator.receive_json_from(timeout=2)
+        trailing = await communicator.receive_json_from(timeout=2)
+        assert first["payload"]["data"]["postCountersChanged"]["likesCount"] >= 2
+        assert trailing["payload"]["data"]["postCountersChanged"] == {"likesCount": 4}
+        assert await communicator.receive_nothing(timeout=0.5)
+        await communicator.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_non_subscription_operations_are_rejected():
+    async def scenario():
+        communicator = await connect()
+        await communicator.send_json_to({"id": "q", "type": "subscribe", "payload": {"query": "{ posts { id } }"}})
+        message = await communicator.receive_json_from(timeout=2)
+        assert message["type"] == "error" and message["id"] == "q"
+        await communicator.disconnect()
+
+    async_to_sync(scenario)()
@@ -0,0 +1,153 @@
+import uuid
+
+import pytest
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+
+from backend.schema import schema
+from feed.models import Follow, Post, TimelineEntry
+from feed.timeline import DatabaseTimelineStore
+
+HOME = """
+query Home($first: Int, $after: String) {
+  homeFeed(first: $first, after: $after) {
+    edges { node { id content } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+
+def execute(query, user, **variables):
+    request = RequestFactory().post("/graphql/")
+    request.user = user
+    return Client(schema).execute(query, variables=variables, context_value=request)
+
+
+def follow(follower, followee):
+    res = execute('mutation($id: ID!) { followUser(userId: $id) { ok } }', follower, id=followee.pk)
+    assert "errors" not in res, res.get("errors")
+
+
+def post(author, content):
+    res = execute(
+        'mutation($c: String!) { createPost(content: $c) { post { id } } }', author, c=content
+    )
+    assert "errors" not in res, res.get("errors")
+    return res["data"]["createPost"]["post"]["id"]
+
+
+def home(user, **variables):
+    res = execute(HOME, user, **variables)
+    assert "errors" not in res, res.get("errors")
+    return res["data"]["homeFeed"]
+
+
+@pytest.mark.django_db
+def test_follow_and_unfollow_keep_counters_consistent(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+
+    follow(alice, bob)
+    again = execute('mutation($id: ID!) { followUser(userId: $id) { ok } }', alice, id=bob.pk)
+
+    assert again["errors"][0]["message"] == "Already following"
+    alice.refresh_from_db(); bob.refresh_from_db()
+    assert (alice.following_count, bob.followers_count) == (1, 1)
+
+    res = execute('mutation($id: ID!) { unfollowUser(userId: $id) { ok user { followersCount } } }', alice, id=bob.pk)
+    assert res["data"]["unfollowUser"] == {"ok": True, "user": {"followersCount": 0}}
+    alice.refresh_from_db()
+    assert alice.following_count == 0
+    assert not Follow.objects.exists()
+
+
+@pytest.mark.django_db
+def test_users_cannot_follow_themselves_under_another_spelling(make_user):
+    alice = make_user("alice")
+    dashed = str(uuid.UUID(hex=alice.pk)).upper()
+
+    for spelling in (alice.pk, dashed):
+        res = execute('mutation($id: ID!) { followUser(userId: $id) { ok } }', alice, id=spelling)
+        assert res["errors"][0]["message"] == "You cannot follow yourself"
+    assert not Follow.objects.exists()
+
+
+@pytest.mark.django_db
+def test_posts_fan_out_to_followers_and_are_retracted_on_delete(make_user):
+    alice, bob, carol = make_user("alice"), make_user("bob"), make_user("carol")
+    follow(alice, bob)
+    bob_post = post(bob, "from bob")
+    post(carol, "from carol")
+
+    assert [e["node"]["id"] for e in home(alice)["edges"]] == [bob_post]
+
+    execute('mutation($id: ID!) { deletePost(postId: $id) { ok } }', bob, id=bob_post)
+    assert home(alice)["edges"] == []
+
+
+@pytest.mark.django_db
+def test_follow_backfills_and_unfollow_clears_timeline(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    ids = [post(bob, str(i)) for i in range(3)]
+
+    follow(alice, bob)
+    assert {e["node"]["id"] for e in home(alice)["edges"]} == set(ids)
+
+    execute('mutation($id: ID!) { unfollowUser(userId: $id) { ok } }', alice, id=bob.pk)
+    assert home(alice)["edges"] == []
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CELEBRITY_THRESHOLD=1)
+def test_celebrity_posts_are_merged_on_read(make_user):
+    alice, star = make_user("alice"), make_user("star")
+    follow(alice, star)
+    own = post(alice, "mine")
+    star_posts = [post(star, f"star {i}") for i in range(3)]
+
+    assert not TimelineEntry.objects.filter(owner=alice, post__author=star).exists()
+    page = home(alice, first=2)
+    assert [e["node"]["id"] for e in page["edges"]] == star_posts[::-1][:2]
+    assert page["pageInfo"]["hasNextPage"] is True
+
+    rest = home(alice, first=10, after=page["pageInfo"]["endCursor"])
+    assert [e["node"]["id"] for e in rest["edges"]] == [star_posts[0], own]
+    assert rest["pageInfo"]["hasNextPage"] is False
+
+
+@pytest.mark.django_db
+@override_settings(FEED_TIMELINE_MAX_LENGTH=2)
+def test_timeline_is_capped(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    follow(alice, bob)
+    for i in range(4):
+        post(bob, str(i))
+
+    assert TimelineEntry.objects.filter(owner=alice).count() == 2
+    assert Post.objects.filter(author=bob).count() == 4
+
+
+@pytest.mark.django_db
+def test_the_database_store_only_touches_the_given_owners(make_user):
+    alice, bob, carol = make_user("alice"), make_user("bob"), make_user("carol")
+    store = DatabaseTimelineStore()
+    posts = [Post.objects.create(author=bob, content=str(i)) for i in range(3)]
+    store.add_posts([alice.pk, carol.pk], [(p.pk, p.created_at) for p in posts])
+
+    store.remove([alice.pk], posts[0].pk)
+    assert not TimelineEntry.objects.filter(owner=alice, post=posts[0]).exists()
+    assert TimelineEntry.objects.filter(owner=carol, post=posts[0]).exists()
+
+    newer, newest = (Post.objects.create(author=bob, content=c) for c in ("newer", "newest"))
+    with override_settings(FEED_TIMELINE_MAX_LENGTH=3), CaptureQueriesContext(connection) as captured:
+        store.add([alice.pk], newer.pk, newer.created_at)
+    # alice is at the cap, not over it: nothing to trim
+    assert not any(query["sql"].startswith("DELETE") for query in captured)
+
+    with override_settings(FEED_TIMELINE_MAX_LENGTH=2):
+        store.add([alice.pk], newest.pk, newest.created_at)
+    assert store.page(alice.pk, 10) == [newest.pk, newer.pk]
+    # carol is over the new cap but got nothing, so her timeline is left alone
+    assert TimelineEntry.objects.filter(owner=carol).count() == 3
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+from django.test import override_settings
+from graphql_jwt.shortcuts import get_token
+
+from backend import persisted_queries
+from feed.models import Post
+from feed.tracing import metrics
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    metrics.clear()
+    yield
+    metrics.clear()
+
+
+def post(client, query, user=None, trace=False):
+    headers = {"HTTP_AUTHORIZATION": f"JWT {get_token(user)}"} if user else {}
+    if trace:
+        headers["HTTP_X_GRAPHQL_TRACE"] = "1"
+    return client.post("/graphql/", json.dumps({"query": query}), content_type="application/json", **headers).json()
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CACHE_ENABLED=False)
+def test_staff_get_resolver_and_sql_timings(client, make_user):
+    admin = make_user("admin", is_staff=True)
+    Post.objects.create(author=admin, content="hi")
+
+    res = post(client, "query Feed { posts { content author { username } } }", admin, trace=True)
+    tracing = res["extensions"]["tracing"]
+
+    assert set(tracing["phases"]) == {"prepare", "auth", "execute"}
+    resolvers = {tuple(r["path"]): r for r in tracing["resolvers"]}
+    assert resolvers[("posts",)]["parentType"] == "Query"
+    assert resolvers[("posts",)]["sqlCount"] >= 1
+    assert ("posts", 0, "author", "username") in resolvers
+    assert tracing["sql"]["count"] == len(tracing["sql"]["queries"]) >= 2
+    assert tracing["sql"]["duplicates"] == []
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CACHE_ENABLED=False, DEBUG=False)
+def test_the_trace_needs_the_header_and_a_staff_user(client, make_user):
+    alice = make_user("alice")
+    assert "tracing" not in post(client, "{ posts { id } }", alice)["extensions"]
+    assert "tracing" not in post(client, "{ posts { id } }", alice, trace=True)["extensions"]
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CACHE_ENABLED=False, DEBUG=True)
+def test_repeated_statements_are_reported(client, make_user):
+    alice = make_user("alice")
+    post_id = Post.objects.create(author=alice, content="hi").pk
+
+    res = post(client, f'{{ a: post(postId: "{post_id}") {{ id }} b: post(postId: "{post_id}") {{ id }} }}', trace=True)
+
+    [duplicate] = res["extensions"]["tracing"]["sql"]["duplicates"]
+    assert duplicate["count"] == 2 and "feed_post" in duplicate["sql"]
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CACHE_ENABLED=False, METRICS_TOKEN="secret", GRAPHQL_METRICS_OPERATIONS=["Create"])
+def test_metrics_endpoint_aggregates_resolvers_and_mutations(client, make_user):
+    alice = make_user("alice")
+    post(client, 'mutation Create { createPost(content: "hi") { post { id } } }', alice)
+    post(client, "query Feed { posts { content } }", alice)
+
+    assert client.get("/metrics/").status_code == 403
+    body = client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret").content.decode()
+
+    assert 'graphql_operations_total{name="Create",type="mutation"} 1' in body
+    assert 'graphql_resolver_seconds_count{field="createPost",type="Mutation"} 1' in body
+    assert 'graphql_resolver_seconds_count{field="content",type="PostType"} 1' in body
+    assert 'graphql_resolver_sql_queries_total{field="posts",type="Query"}' in body
+    assert "# TYPE graphql_resolver_seconds summary" in body
+
+
+@pytest.mark.django_db
+@override_settings(FEED_CACHE_ENABLED=False)
+def test_only_known_operation_names_are_labelled(client, tmp_path):
+    known = "query Known { posts { id } }"
+    allowlist = tmp_path / "allowlist.json"
+    allowlist.write_text(json.dumps({persisted_queries.sha256(known): known}))
+
+    with override_settings(GRAPHQL_PERSISTED_QUERIES_ALLOWLIST=str(allowlist)):
+        for i in range(3):
+            post(client, f"query Random{i} {{ posts {{ id }} }}")
+        post(client, known)
+        post(client, "{ posts { id } }")
+    persisted_queries._load_allowlist.cache_clear()
+
+    body = metrics.render()
+    assert 'graphql_operations_total{name="other",type="query"} 3' in body
+    assert 'graphql_operations_total{name="Known",type="query"} 1' in body
+    assert 'graphql_operations_total{name="",type="query"} 1' in body
+    assert "Random" not in body
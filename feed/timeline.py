@@ -0,0 +1,240 @@
+"""
+Home timelines: fan-out on write with a fan-out-on-read path for celebrities.
+
+When a post is created its id is pushed into the materialized timeline of
+every follower (and the author), so reading a home feed is one bounded range
+read on the owner's timeline. Authors with at least
+``FEED_CELEBRITY_THRESHOLD`` followers are skipped at write time; their
+recent posts are merged in at read time instead. Mutations fan out and
+retract through background jobs (``fan_out_later``, ``retract_later``).
+
+The store is pluggable through ``FEED_TIMELINE_BACKEND``:
+``feed.timeline.DatabaseTimelineStore`` (default) or
+``feed.timeline.RedisTimelineStore``.
+"""
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count, F, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from . import jobs
+from .models import Follow, Post, TimelineEntry, User
+from .pagination import decode_cursor, keyset_filter, keyset_slice
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def max_length():
+    return getattr(settings, "FEED_TIMELINE_MAX_LENGTH", 800)
+
+
+def celebrity_threshold():
+    return getattr(settings, "FEED_CELEBRITY_THRESHOLD", 10000)
+
+
+def is_celebrity(user_id):
+    # read the counter fresh: the request's user instance may predate recent follows
+    count = User.objects.filter(pk=user_id).values_list("followers_count", flat=True).first()
+    return (count or 0) >= celebrity_threshold()
+
+
+class DatabaseTimelineStore:
+    """Timelines kept as ``TimelineEntry`` rows indexed on (owner, created_at)."""
+
+    def add(self, owner_ids, post_id, created_at):
+        self.add_posts(owner_ids, [(post_id, created_at)])
+
+    def add_posts(self, owner_ids, posts):
+        if not posts:
+            return
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(owner_id=owner, post_id=pk, created_at=created_at)
+                for owner in owner_ids
+                for pk, created_at in posts
+            ],
+            ignore_conflicts=True,
+        )
+        self.trim(owner_ids)
+
+    def remove(self, owner_ids, post_id):
+        TimelineEntry.objects.filter(owner_id__in=list(owner_ids), post_id=post_id).delete()
+
+    def remove_author(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, post__author_id=author_id).delete()
+
+    def page(self, owner_id, first, after=None):
+        qs = keyset_filter(TimelineEntry.objects.filter(owner_id=owner_id), after, tiebreak="post_id")
+        return list(qs.values_list("post_id", flat=True)[:first])
+
+    def trim(self, owner_ids):
+        """Drop the oldest entries of the ``owner_ids`` timelines that are over the cap."""
+        over = list(
+            TimelineEntry.objects.filter(owner_id__in=list(owner_ids))
+            .values("owner_id")
+            .annotate(length=Count("pk"))
+            .filter(length__gt=max_length())
+            .values_list("owner_id", flat=True)
+        )
+        if not over:
+            return
+        ranked = TimelineEntry.objects.filter(owner_id__in=over).annotate(
+            rank=Window(
+                RowNumber(),
+                partition_by=[F("owner_id")],
+                order_by=[F("created_at").desc(), F("post_id").desc()],
+            )
+        )
+        overflow = ranked.filter(rank__gt=max_length()).values("pk")
+        TimelineEntry.objects.filter(pk__in=Subquery(overflow)).delete()
+
+
+class RedisTimelineStore:
+    """Timelines kept as Redis sorted sets scored by creation time in microseconds."""
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    @staticmethod
+    def key(owner_id):
+        return f"timeline:{owner_id}"
+
+    @staticmethod
+    def score(created_at):
+        return (created_at - EPOCH) // timedelta(microseconds=1)
+
+    def add(self, owner_ids, post_id, created_at):
+        self.add_posts(owner_ids, [(post_id, created_at)])
+
+    def add_posts(self, owner_ids, posts):
+        if not posts:
+            return
+        members = {pk: self.score(created_at) for pk, created_at in posts}
+        with self.client.pipeline(transaction=False) as pipe:
+            for owner in owner_ids:
+                pipe.zadd(self.key(owner), members)
+                pipe.zremrangebyrank(self.key(owner), 0, -max_length() - 1)
+            pipe.execute()
+
+    def remove(self, owner_ids, post_id):
+        with self.client.pipeline(transaction=False) as pipe:
+            for owner in owner_ids:
+                pipe.zrem(self.key(owner), post_id)
+            pipe.execute()
+
+    def remove_author(self, owner_id, author_id):
+        post_ids = list(Post.objects.filter(author_id=author_id).values_list("pk", flat=True))
+        if post_ids:
+            self.client.zrem(self.key(owner_id), *post_ids)
+
+    def page(self, owner_id, first, after=None):
+        key = self.key(owner_id)
+        if not after:
+            return [m.decode() for m in self.client.zrevrange(key, 0, first - 1)]
+        created_at, cursor_pk = decode_cursor(after)
+        max_score = self.score(created_at)
+        # equal scores come back in reverse member order, which matches the -pk tiebreak
+        rows = self.client.zrevrangebyscore(key, max_score, "-inf", start=0, num=first + 16, withscores=True)
+        ids = [m.decode() for m, s in rows if s < max_score or m.decode() < cursor_pk]
+        return ids[:first]
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_timeline_store():
+    return _load_store(getattr(settings, "FEED_TIMELINE_BACKEND", "feed.timeline.DatabaseTimelineStore"))
+
+
+def follower_ids(user_id):
+    return list(Follow.objects.filter(followee_id=user_id).values_list("follower_id", flat=True))
+
+
+def fan_out_post(post):
+    """Push a new post into its author's timeline and, unless they are a celebrity, their followers'."""
+    fan_out_posts([post])
+
+
+def fan_out_posts(posts):
+    """Fan out several posts, resolving each author's audience once."""
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.author_id, []).append((post.pk, post.created_at))
+    store = get_timeline_store()
+    for author_id, entries in by_author.items():
+        owners = [author_id]
+        if not is_celebrity(author_id):
+            owners += follower_ids(author_id)
+        store.add_posts(owners, entries)
+
+
+def retract_post(post):
+    get_timeline_store().remove([post.author_id] + follower_ids(post.author_id), post.pk)
+
+
+def fan_out_later(posts):
+    """Fan ``posts`` out in a background job once the mutation commits."""
+    for post in posts:
+        jobs.enqueue("timeline.fan_out", post.pk, key=post.pk)
+
+
+def retract_later(post):
+    jobs.enqueue("timeline.retract", [post.pk, post.author_id])
+
+
+@jobs.handler("timeline.fan_out")
+def _fan_out_job(post_ids):
+    # posts deleted in the meantime are skipped
+    fan_out_posts(list(Post.objects.filter(pk__in=post_ids)))
+
+
+@jobs.handler("timeline.retract")
+def _retract_job(entries):
+    store = get_timeline_store()
+    for post_id, author_id in entries:
+        store.remove([author_id] + follower_ids(author_id), post_id)
+
+
+def on_follow(follower, followee):
+    """Backfill the followee's recent posts into the follower's timeline."""
+    if is_celebrity(followee.pk):
+        return
+    recent = Post.objects.filter(author=followee).order_by("-created_at")[: max_length()]
+    get_timeline_store().add_posts([follower.pk], list(recent.values_list("pk", "created_at")))
+
+
+def on_unfollow(follower, followee):
+    get_timeline_store().remove_author(follower.pk, followee.pk)
+
+
+def home_feed_page(user, first, after=None):
+    """
+    Return ``(posts, has_next_page)`` for ``user``'s home feed.
+
+    Reads ``first + 1`` ids from the materialized timeline and merges in the
+    same window of posts from followed celebrities, so the cost depends only
+    on the page size.
+    """
+    post_ids = get_timeline_store().page(user.pk, first + 1, after)
+    posts = Post.objects.in_bulk(post_ids)
+    has_more = len(post_ids) > first
+
+    celebrity_ids = list(
+        Follow.objects.filter(follower=user, followee__followers_count__gte=celebrity_threshold())
+        .values_list("followee_id", flat=True)
+    )
+    if celebrity_ids:
+        pulled, pulled_more = keyset_slice(Post.objects.filter(author_id__in=celebrity_ids), first, after)
+        for post in pulled:
+            posts.setdefault(post.pk, post)
+        has_more = has_more or pulled_more
+
+    merged = sorted(posts.values(), key=lambda p: (p.created_at, p.pk), reverse=True)
+    return merged[:first], has_more or len(merged) > first
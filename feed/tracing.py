@@ -0,0 +1,288 @@
+"""
+Per-request tracing of GraphQL operations and process-wide metrics.
+
+The GraphQL views open a ``Trace`` for every request (``trace_request``).
+It times the phases of the request (``prepare``: persisted-query lookup,
+parsing, validation and cost analysis; ``auth``: JWT verification, see
+``feed.auth``; ``execute``), and ``TracingMiddleware`` times every field's
+resolver. An execute wrapper installed on each database connection
+attributes SQL statements to the field whose resolver was running when they
+were sent; statements that DataLoaders batch are attributed to the field
+that triggered the batch. Statements sent more than once with the same
+parameters in one request are reported as duplicates.
+
+A request with the ``GRAPHQL_TRACING_HEADER`` header (``X-GraphQL-Trace``)
+gets the trace back in ``extensions.tracing`` when ``DEBUG`` is on or the
+user is staff, since it contains the SQL of the request.
+
+Every trace is also aggregated into ``metrics``, served in the Prometheus
+text format at ``/metrics/``. The registry is per process: scrape each
+worker, or run one worker per metrics target. Operation names come from the
+client, so only allow-listed persisted queries and the names listed in
+``GRAPHQL_METRICS_OPERATIONS`` are labelled by name; other named operations
+are counted as ``other``.
+"""
+import inspect
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_trace = ContextVar("graphql_trace", default=None)
+_field = ContextVar("graphql_field", default=None)
+
+
+def tracing_header():
+    return getattr(settings, "GRAPHQL_TRACING_HEADER", "X-GraphQL-Trace")
+
+
+def metrics_operations():
+    return getattr(settings, "GRAPHQL_METRICS_OPERATIONS", ())
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class Metrics:
+    """Counters and summaries kept in process and rendered for Prometheus."""
+
+    FAMILIES = {
+        "graphql_operations_total": ("counter", "GraphQL operations executed."),
+        "graphql_operation_seconds": ("summary", "Time spent in each phase of a GraphQL request."),
+        "graphql_resolver_seconds": ("summary", "Time spent resolving a field, including its SQL."),
+        "graphql_resolver_sql_queries_total": ("counter", "SQL statements sent while resolving a field."),
+        "graphql_resolver_sql_seconds": ("summary", "Time spent in SQL while resolving a field."),
+        "graphql_duplicate_sql_queries_total": ("counter", "SQL statements repeated with the same parameters."),
+        "feed_jobs_queued": ("gauge", "Background jobs waiting in the queue (see feed.jobs)."),
+        "feed_jobs_lag_seconds": ("gauge", "How long the oldest due background job has waited."),
+        "feed_jobs_processed_total": ("counter", "Background jobs run successfully."),
+        "feed_jobs_failed_total": ("counter", "Background job batches whose handler raised."),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._values[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name, labels, seconds):
+        labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[name + "_count", labels] += 1
+            self._values[name + "_sum", labels] += seconds
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._values[name, tuple(sorted(labels.items()))] = value
+
+    def clear_family(self, name):
+        with self._lock:
+            for key in [key for key in self._values if key[0] == name]:
+                del self._values[key]
+
+    def value(self, name, **labels):
+        with self._lock:
+            return self._values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        for family, (kind, help_text) in self.FAMILIES.items():
+            samples = [
+                (name, labels, value) for (name, labels), value in values
+                if name in (family, family + "_count", family + "_sum")
+            ]
+            if not samples:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, labels, value in samples:
+                rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f"{name}{{{rendered}}} {value:g}" if rendered else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+
+
+class FieldTrace:
+    __slots__ = ("parent_type", "field_name", "path", "duration", "sql_count", "sql_duration")
+
+    def __init__(self, info):
+        self.parent_type = info.parent_type.name
+        self.field_name = info.field_name
+        self.path = info.path
+        self.duration = self.sql_duration = 0.0
+        self.sql_count = 0
+
+    def finish(self, started):
+        self.duration = time.perf_counter() - started
+        labels = {"type": self.parent_type, "field": self.field_name}
+        metrics.observe("graphql_resolver_seconds", labels, self.duration)
+        if self.sql_count:
+            metrics.inc("graphql_resolver_sql_queries_total", labels, self.sql_count)
+            metrics.observe("graphql_resolver_sql_seconds", labels, self.sql_duration)
+        trace = _trace.get()
+        if trace is not None and trace.detailed:
+            trace.fields.append(self)
+
+
+class Trace:
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.fields = []
+        self.queries = []
+        self.statements = Counter()
+        self.sql_count = 0
+        self.sql_duration = 0.0
+        # set for allow-listed persisted queries, whose names are trusted
+        self.allowlisted = False
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def record_query(self, field, sql, params, duration):
+        self.sql_count += 1
+        self.sql_duration += duration
+        if field is not None:
+            field.sql_count += 1
+            field.sql_duration += duration
+        self.statements[sql, repr(params)] += 1
+        if self.detailed:
+            path = field.path.as_list() if field is not None else None
+            self.queries.append({"path": path, "sql": sql, "duration": _ms(duration)})
+
+    def duplicates(self):
+        return [(sql, count) for (sql, _), count in self.statements.items() if count > 1]
+
+    def finish(self, request, result, operation_ast=None):
+        """Record the request in ``metrics`` and attach the trace to ``result`` if asked for."""
+        auth = getattr(request, "auth_span", None)
+        if auth is not None:
+            self.phases["auth"] = auth["duration"]
+        operation = operation_ast.operation.value if operation_ast is not None else "unknown"
+        name = operation_ast.name.value if operation_ast is not None and operation_ast.name else ""
+        if name and not self.allowlisted and name not in metrics_operations():
+            name = "other"
+        metrics.inc("graphql_operations_total", {"type": operation, "name": name})
+        for phase, seconds in self.phases.items():
+            metrics.observe("graphql_operation_seconds", {"phase": phase}, seconds)
+        duplicates = self.duplicates()
+        if duplicates:
+            metrics.inc("graphql_duplicate_sql_queries_total", {}, sum(count - 1 for _, count in duplicates))
+
+        if result is not None and self.detailed and _may_see_trace(request):
+            result.extensions = {**(result.extensions or {}), "tracing": self.report(duplicates)}
+        return result
+
+    def report(self, duplicates):
+        return {
+            "duration": _ms(time.perf_counter() - self.started),
+            "phases": {phase: _ms(seconds) for phase, seconds in self.phases.items()},
+            "sql": {
+                "count": self.sql_count,
+                "duration": _ms(self.sql_duration),
+                "duplicates": [{"sql": sql, "count": count} for sql, count in duplicates],
+                "queries": self.queries,
+            },
+            "resolvers": [
+                {
+                    "path": field.path.as_list(),
+                    "parentType": field.parent_type,
+                    "fieldName": field.field_name,
+                    "duration": _ms(field.duration),
+                    "sqlCount": field.sql_count,
+                    "sqlDuration": _ms(field.sql_duration),
+                }
+                for field in self.fields
+            ],
+        }
+
+
+def _may_see_trace(request):
+    user = getattr(request, "user", None)
+    return settings.DEBUG or bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+@contextmanager
+def trace_request(request):
+    """Trace the GraphQL request executed in this block."""
+    trace = Trace(detailed=bool(request.headers.get(tracing_header())))
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def mark_allowlisted():
+    """Label the current request's operation by name in ``metrics``."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.allowlisted = True
+
+
+def _record_query(execute, sql, params, many, context):
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.record_query(_field.get(), sql, params, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def instrument(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class TracingMiddleware:
+    """Times every resolver and the SQL it sends; keep it last in ``GRAPHENE["MIDDLEWARE"]``."""
+
+    def resolve(self, next, root, info, **args):
+        field = FieldTrace(info)
+        started = time.perf_counter()
+        token = _field.set(field)
+        try:
+            result = next(root, info, **args)
+        finally:
+            _field.reset(token)
+        if inspect.isawaitable(result):
+            return self._await(result, field, started)
+        field.finish(started)
+        return result
+
+    async def _await(self, result, field, started):
+        token = _field.set(field)
+        try:
+            return await result
+        finally:
+            _field.reset(token)
+            field.finish(started)
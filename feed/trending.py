@@ -0,0 +1,303 @@
+"""
+"Hot" ranking of posts by time-decayed engagement.
+
+A post's score is the sum of its engagement events, each weighted by
+``FEED_TRENDING_WEIGHTS`` and decayed exponentially with
+``FEED_TRENDING_HALF_LIFE``. Instead of decaying every score as time passes,
+new events are inflated by ``2 ** ((now - base) / half_life)`` (forward
+decay), so an update touches one entry. Every ``FEED_TRENDING_REBASE_INTERVAL``
+seconds all scores are scaled back down and ``base`` moves to now, keeping the
+numbers small.
+
+Scores are updated from ``counters.incr``, so every mutation that changes
+likes, comments or shares feeds the ranking. Only the top
+``FEED_TRENDING_SIZE`` posts are kept, so a page costs the same whatever the
+size of the ``Post`` table.
+
+Stores, chosen with ``FEED_TRENDING_BACKEND``:
+
+* ``feed.trending.MemoryTrendingStore`` (default): a per-process dict with a
+  sorted snapshot for reads. Each process seeds it from the stored counters
+  of recent posts (see ``rebuild``) the first time it is used, so a restart
+  does not empty the ranking; from then on it only sees the engagement its
+  own process records, so workers drift apart. Meant for development, tests
+  and single-process deployments;
+* ``feed.trending.RedisTrendingStore``: a sorted set shared by every worker,
+  for anything with more than one process.
+
+``manage.py rebuild_trending`` recomputes the Redis ranking from the stored
+counters, e.g. after the sorted set was lost.
+"""
+import base64
+import bisect
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+from . import cache as feed_cache
+from .models import Post
+
+DEFAULT_WEIGHTS = {"likes_count": 1.0, "comments_count": 2.0, "shares_count": 3.0}
+
+
+def trending_size():
+    return getattr(settings, "FEED_TRENDING_SIZE", 1000)
+
+
+def half_life():
+    return getattr(settings, "FEED_TRENDING_HALF_LIFE", 6 * 3600)
+
+
+def rebase_interval():
+    return getattr(settings, "FEED_TRENDING_REBASE_INTERVAL", 3600)
+
+
+def weights():
+    return getattr(settings, "FEED_TRENDING_WEIGHTS", DEFAULT_WEIGHTS)
+
+
+def growth(since, now):
+    """
+    Factor applied to an event at ``now`` relative to ``since``. Decaying is
+    done with ``growth(now, since)``, which underflows to 0 instead of raising.
+    """
+    return 2 ** ((now - since) / half_life())
+
+
+class MemoryTrendingStore:
+    """Per-process top-K; trimmed back to ``size`` once it holds twice as many posts."""
+
+    def __init__(self, size=None):
+        self.size = size or trending_size()
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._seeded = False
+        self._scores = {}
+        self._base = time.time()
+        self._snapshot = None
+
+    def _seed(self):
+        """Load the ranking from the database once per process."""
+        if self._seeded:
+            return
+        with self._seed_lock:
+            if not self._seeded:
+                scores, now = recent_scores()
+                self.replace(scores, now)
+
+    def base(self):
+        self._seed()
+        return self._base
+
+    def incr_many(self, increments, now):
+        self._seed()
+        with self._lock:
+            self._rebase(now)
+            factor = growth(self._base, now)
+            for post_id, weight in increments.items():
+                score = self._scores.get(post_id, 0.0) + weight * factor
+                if score > 0:
+                    self._scores[post_id] = score
+                else:
+                    self._scores.pop(post_id, None)
+            if len(self._scores) > 2 * self.size:
+                top = sorted(self._scores.items(), key=lambda item: item[1], reverse=True)[: self.size]
+                self._scores = dict(top)
+            self._snapshot = None
+
+    def top(self, limit, below=None):
+        """``[(post_id, score)]`` best first, starting after the ``(score, post_id)`` in ``below``."""
+        self._seed()
+        with self._lock:
+            self._rebase(time.time())
+            if self._snapshot is None:
+                self._snapshot = sorted(
+                    (score, post_id) for post_id, score in self._scores.items()
+                )[-self.size:]
+            snapshot = self._snapshot
+        end = len(snapshot) if below is None else bisect.bisect_left(snapshot, below)
+        return [(post_id, score) for score, post_id in reversed(snapshot[max(0, end - limit):end])]
+
+    def remove(self, post_id):
+        with self._lock:
+            if self._scores.pop(post_id, None) is not None:
+                self._snapshot = None
+
+    def replace(self, scores, now):
+        with self._lock:
+            self._base = now
+            self._scores = dict(scores)
+            self._snapshot = None
+            self._seeded = True
+
+    def _rebase(self, now):
+        if now - self._base < rebase_interval():
+            return
+        factor = growth(now, self._base)
+        self._scores = {post_id: score * factor for post_id, score in self._scores.items()}
+        self._base = now
+        self._snapshot = None
+
+
+class RedisTrendingStore:
+    key = "trending:scores"
+    base_key = "trending:base"
+
+    def __init__(self, url=None, size=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.size = size or trending_size()
+
+    def base(self):
+        value = self.client.get(self.base_key)
+        if value is None:
+            # first use: only one process gets to pick the base
+            self.client.set(self.base_key, repr(time.time()), nx=True)
+            value = self.client.get(self.base_key)
+        return float(value)
+
+    def incr_many(self, increments, now):
+        self._rebase(now)
+        factor = growth(self.base(), now)
+        with self.client.pipeline(transaction=False) as pipe:
+            for post_id, weight in increments.items():
+                pipe.zincrby(self.key, weight * factor, post_id)
+            pipe.zremrangebyscore(self.key, "-inf", 0)
+            pipe.zremrangebyrank(self.key, 0, -self.size - 1)
+            pipe.execute()
+
+    def top(self, limit, below=None):
+        self._rebase(time.time())
+        if below is None:
+            rows = self.client.zrevrange(self.key, 0, limit - 1, withscores=True)
+        else:
+            # fetch ties on the cursor score too and drop those already served
+            rows = self.client.zrevrangebyscore(self.key, below[0], "-inf", start=0, num=limit + 64, withscores=True)
+        rows = [(member.decode(), score) for member, score in rows]
+        if below is not None:
+            rows = [(post_id, score) for post_id, score in rows if (score, post_id) < below]
+        return rows[:limit]
+
+    def remove(self, post_id):
+        self.client.zrem(self.key, post_id)
+
+    def replace(self, scores, now):
+        with self.client.pipeline() as pipe:
+            pipe.delete(self.key)
+            if scores:
+                pipe.zadd(self.key, scores)
+            pipe.set(self.base_key, repr(now))
+            pipe.execute()
+
+    def _rebase(self, now):
+        import redis
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self.base_key)
+                value = pipe.get(self.base_key)
+                if value is None or now - float(value) < rebase_interval():
+                    return
+                pipe.multi()
+                pipe.zunionstore(self.key, {self.key: growth(now, float(value))})
+                pipe.set(self.base_key, repr(now))
+                pipe.execute()
+            except redis.WatchError:
+                # another worker rebased first
+                pass
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+def get_trending_store():
+    return _load_store(getattr(settings, "FEED_TRENDING_BACKEND", "feed.trending.MemoryTrendingStore"))
+
+
+def record(deltas):
+    """
+    Add ``{(post_id, counter_field): delta}`` engagement changes to the
+    ranking once the current transaction commits.
+    """
+    table = weights()
+    increments = {}
+    for (post_id, field), delta in deltas.items():
+        weight = table.get(field, 0) * delta
+        if weight:
+            increments[post_id] = increments.get(post_id, 0) + weight
+    if increments:
+        transaction.on_commit(lambda: get_trending_store().incr_many(increments, time.time()))
+
+
+def post_deleted(post_id):
+    get_trending_store().remove(post_id)
+
+
+def encode_cursor(base, score, post_id):
+    return base64.urlsafe_b64encode(f"{base!r}|{score!r}|{post_id}".encode()).decode()
+
+
+def decode_cursor(cursor, base):
+    """Return the ``(score, post_id)`` of ``cursor`` on the current ``base``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        cursor_base, score, post_id = raw.split("|", 2)
+        cursor_base, score = float(cursor_base), float(score)
+    except (ValueError, UnicodeError):
+        raise GraphQLError("Invalid cursor")
+    if cursor_base != base:
+        # the scores were rebased since this cursor was issued
+        score *= growth(base, cursor_base)
+    return score, post_id
+
+
+def trending_page(first, after=None):
+    """Return ``(posts, cursors, has_next_page)`` for one page of trending posts."""
+    store = get_trending_store()
+    base = store.base()
+    below = decode_cursor(after, base) if after else None
+    rows = store.top(first + 1, below)
+    has_next = len(rows) > first
+    rows = rows[:first]
+    posts = feed_cache.get_posts([post_id for post_id, _ in rows])
+    page = [(posts[post_id], encode_cursor(base, score, post_id)) for post_id, score in rows if post_id in posts]
+    return [post for post, _ in page], [cursor for _, cursor in page], has_next
+
+
+def recent_scores(days=7):
+    """``({post_id: score}, base)`` for the top posts created in the last ``days``, from their counters."""
+    table = weights()
+    now = time.time()
+    scores = {}
+    since = timezone.now() - timedelta(days=days)
+    rows = Post.objects.filter(created_at__gte=since).values_list(
+        "pk", "created_at", "likes_count", "comments_count", "shares_count"
+    )
+    for post_id, created_at, likes, comments, shares in rows.iterator(chunk_size=2000):
+        engagement = (
+            table.get("likes_count", 0) * likes
+            + table.get("comments_count", 0) * comments
+            + table.get("shares_count", 0) * shares
+        )
+        if engagement > 0:
+            # treat the engagement as if it happened when the post was created
+            scores[post_id] = engagement * growth(now, created_at.timestamp())
+    top = dict(sorted(scores.items(), key=lambda item: item[1], reverse=True)[: trending_size()])
+    return top, now
+
+
+def rebuild(days=7):
+    """Recompute the ranking from the counters of posts created in the last ``days``."""
+    top, now = recent_scores(days)
+    get_trending_store().replace(top, now)
+    return len(top)
@@ -1,3 +1,36 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed
+from django.views.decorators.csrf import csrf_exempt
 
-# Create your views here.
+from . import jobs, media, tracing
+
+
+def metrics(request):
+    """GraphQL operation, resolver, SQL and job queue metrics in the Prometheus text format."""
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    jobs.export_metrics()
+    return HttpResponse(tracing.metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@csrf_exempt
+def upload(request, token):
+    """Receive the file of a ``LocalUploader`` URL, streaming it into ``default_storage``."""
+    if request.method != "PUT":
+        return HttpResponseNotAllowed(["PUT"])
+    uploader = media.get_uploader()
+    if not isinstance(uploader, media.LocalUploader):
+        return HttpResponseForbidden()
+    try:
+        grant = uploader.grant(token)
+    except signing.BadSignature:
+        return HttpResponseForbidden()
+    if request.content_type != grant["type"]:
+        return HttpResponseBadRequest("Content-Type does not match the upload.")
+    if int(request.META.get("CONTENT_LENGTH") or 0) != grant["size"]:
+        return HttpResponseBadRequest("Content-Length does not match the upload.")
+    media.store(grant["key"], File(request, name=grant["key"]))
+    return HttpResponse(status=204)